@@ -1,10 +1,93 @@
 import { NextRequest, NextResponse } from 'next/server'
+import mongoose from 'mongoose'
 import connectDB from '@/lib/mongodb'
 import Exam from '@/lib/models/Exam'
 import ExamResult from '@/lib/models/ExamResult'
 import User from '@/lib/models/User'
 import { verifyToken } from '@/lib/jwt'
 
+// JSON 批量导入时每个请求最多包含的学生数
+const MAX_BULK_SCORES = 1000
+
+interface BulkScore {
+  studentId: string
+  programmingScore: number
+}
+
+// JSON 批量导入（本地测评工具使用）：按学生ID设置编程成绩
+// 设置的是编程成绩的绝对值，重复提交同一批数据结果不变，因此可以分批上传、失败重试和重新导入
+async function importBulkScores(examId: string, body: any) {
+  const scores: BulkScore[] = Array.isArray(body?.scores) ? body.scores : []
+  if (scores.length === 0) {
+    return NextResponse.json({ error: '缺少成绩数据' }, { status: 400 })
+  }
+  if (scores.length > MAX_BULK_SCORES) {
+    return NextResponse.json(
+      { error: `每次最多导入 ${MAX_BULK_SCORES} 名学生的成绩` },
+      { status: 400 }
+    )
+  }
+
+  const errors: string[] = []
+  const valid: BulkScore[] = []
+  for (const item of scores) {
+    const programmingScore = Number(item?.programmingScore)
+    if (!item?.studentId || !mongoose.Types.ObjectId.isValid(item.studentId)) {
+      errors.push(`学生ID格式错误: ${item?.studentId}`)
+    } else if (!isFinite(programmingScore)) {
+      errors.push(`学生 ${item.studentId} 的编程得分格式错误: ${item?.programmingScore}`)
+    } else {
+      valid.push({ studentId: String(item.studentId), programmingScore })
+    }
+  }
+
+  // 一次查询本批学生的考试结果
+  const examResults = await ExamResult.find({
+    examId: examId,
+    studentId: { $in: valid.map(item => item.studentId) }
+  }).select('studentId score programmingScore programmingScoreImported')
+  const resultsByStudent = new Map(examResults.map((result: any) => [String(result.studentId), result]))
+
+  const now = new Date()
+  const operations: any[] = []
+  const imported: string[] = []
+  for (const item of valid) {
+    const examResult: any = resultsByStudent.get(item.studentId)
+    if (!examResult) {
+      errors.push(`学生 ${item.studentId} 未参加此考试`)
+      continue
+    }
+    // 已导入过时先减去上次导入的编程分数，再加上新的分数
+    const previous = examResult.programmingScoreImported ? (examResult.programmingScore || 0) : 0
+    operations.push({
+      updateOne: {
+        filter: { _id: examResult._id },
+        update: {
+          score: (examResult.score || 0) - previous + item.programmingScore,
+          isGraded: true,
+          gradedAt: now,
+          programmingScore: item.programmingScore,
+          programmingScoreImported: true,
+          programmingScoreImportedAt: now
+        }
+      }
+    })
+    imported.push(item.studentId)
+  }
+
+  if (operations.length > 0) {
+    await ExamResult.bulkWrite(operations, { ordered: false })
+  }
+
+  return NextResponse.json({
+    message: '编程成绩导入完成',
+    successCount: imported.length,
+    errorCount: scores.length - imported.length,
+    imported,
+    errors: errors.slice(0, 10)
+  })
+}
+
 // 导入编程成绩
 export async function POST(request: NextRequest, { params }: { params: { id: string } }) {
   try {
@@ -38,6 +121,10 @@ export async function POST(request: NextRequest, { params }: { params: { id: str
       )
     }
 
+    if (request.headers.get('content-type')?.includes('application/json')) {
+      return await importBulkScores(examId, await request.json())
+    }
+
     // 检查是否已经导入过编程成绩
     const existingImport = await ExamResult.findOne({
       examId: examId,
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+本地代码测评引擎
+
+不依赖tkinter，可在无图形界面的服务器上通过命令行使用：
+
+    python3 -m local_judge --help
+
+图形界面 local_judge_tool.py 也基于此包实现。
+"""
+
+from .testcases import TestCaseEntry, TestCaseIndex, TestCasePool
+from .compare import Comparison, COMPARE_MODES
+from .build import ArtifactCache, Artifact, build_program, run_program
+from .scheduler import JudgeScheduler, summarize_evaluation
+from .resultstore import ResultStore
+from .snapshot import ExamSnapshot, SnapshotError
+from .scores import ScoreAggregator, ResultExporter
+from .metrics import REGISTRY, MetricsServer, JsonMetricsDumper
+from .distributed import Coordinator, JudgeWorker
+from .engine import (
+    DEFAULT_SERVER_URL, JudgeEngine, JudgeError, JudgeTask,
+    collect_tasks, iter_tasks, format_dedup_summary, format_cache_summary
+)
+
+__all__ = [
+    'TestCaseEntry', 'TestCaseIndex', 'TestCasePool',
+    'Comparison', 'COMPARE_MODES',
+    'ArtifactCache', 'Artifact', 'build_program', 'run_program',
+    'JudgeScheduler', 'summarize_evaluation',
+    'ResultStore', 'ExamSnapshot', 'SnapshotError',
+    'ScoreAggregator', 'ResultExporter',
+    'REGISTRY', 'MetricsServer', 'JsonMetricsDumper',
+    'Coordinator', 'JudgeWorker',
+    'DEFAULT_SERVER_URL', 'JudgeEngine', 'JudgeError', 'JudgeTask',
+    'collect_tasks', 'iter_tasks', 'format_dedup_summary', 'format_cache_summary',
+]
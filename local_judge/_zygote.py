@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""
+Python 预热解释器（zygote）
+
+由 pyrunner.PythonRunnerPool 以 `python3 _zygote.py <控制套接字fd>` 启动，
+预先导入常用标准库后等待运行请求。每个请求fork出一个干净的子进程，
+将传入的三个文件描述符作为子进程的 stdin/stdout/stderr，设置资源限制后
+以 __main__ 身份运行学生代码。zygote 本身从不执行学生代码，
+子进程之间互不影响。子进程重新设置随机数种子，学生代码结束后与解释器
+正常退出一样等待非守护线程、执行 atexit 注册的函数并刷新标准输出。
+
+本文件作为独立脚本运行，不能导入 local_judge 包。
+
+请求与应答均为 4 字节长度前缀 + JSON：
+    请求: {"script": 路径, "cpu_seconds": 秒, "cpu_limit": 秒, "memory_bytes": 字节, "wall_timeout": 秒}，附带3个fd
+    应答: {"status": wait状态, "utime": 秒, "stime": 秒, "maxrss": KB, "timed_out": bool, "cpu_exceeded": bool}
+
+cpu_seconds 为 RLIMIT_CPU（整秒），cpu_limit 不足整秒时由 zygote 按子进程已用的CPU时间结束子进程。
+控制套接字关闭（读到EOF）时 zygote 退出。
+"""
+
+import io
+import os
+import sys
+import json
+import atexit
+import time
+import runpy
+import signal
+import socket
+import struct
+import resource
+import traceback
+
+# 预先导入常见的标准库模块，子进程fork后直接复用
+PRELOAD_MODULES = (
+    'math', 'cmath', 'collections', 'itertools', 'functools', 'heapq', 'bisect',
+    're', 'string', 'random', 'json', 'decimal', 'fractions', 'array', 'copy',
+    'operator', 'statistics', 'datetime', 'typing', 'dataclasses', 'queue',
+)
+
+_HEADER = struct.Struct('!I')
+
+# 检查子进程CPU时间的最短间隔（秒）
+_CPU_CHECK_INTERVAL = 0.01
+_CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+
+
+class _WallTimeout(Exception):
+    pass
+
+
+def _on_alarm(signum, frame):
+    raise _WallTimeout()
+
+
+def _recv_exact(sock, size, buf=b''):
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if not chunk:
+            raise EOFError()
+        buf += chunk
+    return buf
+
+
+def _send_message(sock, payload):
+    data = json.dumps(payload).encode('utf-8')
+    sock.sendall(_HEADER.pack(len(data)) + data)
+
+
+def _cpu_time(pid):
+    """子进程已使用的CPU时间（秒），不支持 /proc 的平台返回None"""
+    try:
+        with open(f'/proc/{pid}/stat', 'rb') as f:
+            fields = f.read().rsplit(b')', 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def _apply_limits(cpu_seconds, memory_bytes):
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1))
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+    if memory_bytes:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+        _, stack_hard = resource.getrlimit(resource.RLIMIT_STACK)
+        if stack_hard == resource.RLIM_INFINITY or stack_hard >= memory_bytes:
+            resource.setrlimit(resource.RLIMIT_STACK, (memory_bytes, stack_hard))
+
+
+def _student_traceback(script, exc):
+    """只打印学生代码中的调用栈，与直接运行 python3 script 的输出一致"""
+    tb = exc.__traceback__
+    while tb is not None and tb.tb_frame.f_code.co_filename != script:
+        tb = tb.tb_next
+    traceback.print_exception(type(exc), exc, tb or exc.__traceback__)
+
+
+def _finalize(exit_code):
+    """与解释器正常退出的顺序相同：等待非守护线程，执行 atexit 注册的函数，刷新标准输出，返回退出码"""
+    threading = sys.modules.get('threading')
+    if threading is not None:
+        try:
+            threading._shutdown()
+        except BaseException:
+            pass
+    atexit._run_exitfuncs()
+    try:
+        sys.stdout.flush()
+    except BaseException:
+        exit_code = exit_code or 1
+    try:
+        sys.stderr.flush()
+    except BaseException:
+        pass
+    return exit_code
+
+
+def _run_child(request, fds):
+    """在fork出的子进程中运行学生代码，不返回"""
+    exit_code = 1
+    try:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, signal.SIG_DFL)
+        for target, fd in enumerate(fds):
+            os.dup2(fd, target)
+            os.close(fd)
+        _apply_limits(request['cpu_seconds'], request['memory_bytes'])
+        # fork 出的子进程继承 zygote 的随机数状态，重新从 os.urandom 取种子
+        random = sys.modules.get('random')
+        if random is not None:
+            random.seed()
+
+        sys.stdin = sys.__stdin__ = io.TextIOWrapper(io.BufferedReader(io.FileIO(0, 'r', closefd=False)), encoding='utf-8')
+        sys.stdout = sys.__stdout__ = io.TextIOWrapper(io.BufferedWriter(io.FileIO(1, 'w', closefd=False)), encoding='utf-8')
+        sys.stderr = sys.__stderr__ = io.TextIOWrapper(io.FileIO(2, 'w', closefd=False), encoding='utf-8',
+                                                       errors='backslashreplace', write_through=True)
+
+        script = request['script']
+        sys.argv = [script]
+        sys.path[0] = os.path.dirname(script)
+        try:
+            runpy.run_path(script, run_name='__main__')
+            exit_code = 0
+        except SystemExit as e:
+            if e.code is None:
+                exit_code = 0
+            elif isinstance(e.code, int):
+                exit_code = e.code
+            else:
+                print(e.code, file=sys.stderr)
+                exit_code = 1
+        except BaseException as e:
+            _student_traceback(script, e)
+            exit_code = 1
+        exit_code = _finalize(exit_code)
+    except BaseException:
+        try:
+            traceback.print_exc()
+        except BaseException:
+            pass
+    finally:
+        os._exit(exit_code & 0xff)
+
+
+def serve(sock):
+    signal.signal(signal.SIGALRM, _on_alarm)
+    while True:
+        try:
+            data, fds, _, _ = socket.recv_fds(sock, 65536, 3)
+        except OSError:
+            return
+        if not data:
+            return
+        try:
+            data = _recv_exact(sock, _HEADER.size, data)
+            (length,) = _HEADER.unpack(data[:_HEADER.size])
+            request = json.loads(_recv_exact(sock, _HEADER.size + length, data)[_HEADER.size:])
+        except (EOFError, ValueError):
+            return
+
+        pid = os.fork()
+        if pid == 0:
+            sock.close()
+            _run_child(request, fds)
+        for fd in fds:
+            os.close(fd)
+
+        # 墙钟超时和不足整秒的CPU时间限制由 zygote 负责：超时后先结束子进程再回收，不存在pid复用问题
+        timed_out = False
+        cpu_exceeded = False
+        result = None
+        deadline = time.monotonic() + request['wall_timeout']
+        cpu_limit = request.get('cpu_limit') or 0
+        watch_cpu = 0 < cpu_limit < request['cpu_seconds']
+        signal.setitimer(signal.ITIMER_REAL, min(request['wall_timeout'], cpu_limit) if watch_cpu
+                         else request['wall_timeout'])
+        try:
+            while result is None:
+                try:
+                    result = os.wait4(pid, 0)
+                except _WallTimeout:
+                    remaining = deadline - time.monotonic()
+                    cpu_time = _cpu_time(pid) if watch_cpu else None
+                    if remaining <= 0:
+                        timed_out = True
+                        os.kill(pid, signal.SIGKILL)
+                    elif cpu_time is not None and cpu_time >= cpu_limit:
+                        cpu_exceeded = True
+                        os.kill(pid, signal.SIGKILL)
+                    elif cpu_time is None:
+                        watch_cpu = False
+                        signal.setitimer(signal.ITIMER_REAL, remaining)
+                    else:
+                        signal.setitimer(signal.ITIMER_REAL,
+                                         min(remaining, max(cpu_limit - cpu_time, _CPU_CHECK_INTERVAL)))
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+        _, status, usage = result
+        maxrss = usage.ru_maxrss // 1024 if sys.platform == 'darwin' else usage.ru_maxrss
+        try:
+            _send_message(sock, {
+                'status': status,
+                'utime': usage.ru_utime,
+                'stime': usage.ru_stime,
+                'maxrss': maxrss,
+                'timed_out': timed_out,
+                'cpu_exceeded': cpu_exceeded
+            })
+        except OSError:
+            return
+
+
+def main():
+    for name in PRELOAD_MODULES:
+        try:
+            __import__(name)
+        except ImportError:
+            pass
+    sock = socket.socket(fileno=int(sys.argv[1]))
+    serve(sock)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,535 @@
+# -*- coding: utf-8 -*-
+"""
+代码构建与运行：每份提交编译一次，产物按内容缓存，运行阶段对每个测试用例复用
+
+C/C++ 的编译参数可以写在考试的 language 中（见 parse_language）。以
+#include <bits/stdc++.h> 开头的C++提交使用预编译头（PrecompiledHeaders），
+每种编译器和编译参数只预编译一次，省去每次解析标准库头文件的时间。
+"""
+
+import os
+import re
+import time
+import shutil
+import logging
+import tempfile
+import threading
+import hashlib
+import functools
+import subprocess
+
+from .metrics import CACHE_REQUESTS
+from .sandbox import (
+    OutputCapture, run_limited,
+    VERDICT_OK, VERDICT_TLE, VERDICT_WTLE, VERDICT_MLE, VERDICT_OLE, VERDICT_CE, VERDICT_SE
+)
+
+logger = logging.getLogger(__name__)
+
+# 编译超时，以及未指定题目限制时的运行时间限制（秒）
+COMPILE_TIMEOUT = 10
+RUN_TIMEOUT = 5
+
+# 编译产物缓存目录及容量上限，可通过环境变量覆盖
+ARTIFACT_CACHE_DIR = os.environ.get('LOCAL_JUDGE_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.local_judge', 'artifacts'))
+ARTIFACT_CACHE_MAX_BYTES = int(os.environ.get('LOCAL_JUDGE_CACHE_MAX_MB', '512')) * 1024 * 1024
+# 预编译头目录（每个约100MB，不计入编译产物缓存的容量）
+PCH_DIR = os.environ.get('LOCAL_JUDGE_PCH_DIR', os.path.join(os.path.dirname(ARTIFACT_CACHE_DIR), 'pch'))
+# 生成预编译头的超时（秒）
+PCH_TIMEOUT = 120
+
+# language 中允许的 -f 选项：只有优化和语言选项，不接受会写出额外文件（-fdump-*、-fprofile-*）
+# 或加载共享库（-fplugin=）的选项
+_ALLOWED_F_OPTIONS = (
+    'omit-frame-pointer', 'no-omit-frame-pointer', 'unroll-loops', 'unroll-all-loops', 'inline-functions',
+    'no-inline', 'expensive-optimizations', 'strict-aliasing', 'no-strict-aliasing', 'fast-math', 'no-math-errno',
+    'wrapv', 'signed-char', 'unsigned-char', 'permissive', 'no-asm', 'exceptions', 'no-exceptions', 'rtti',
+    'no-rtti', 'stack-protector', 'no-stack-protector',
+)
+# 带数值的 -f 选项
+_ALLOWED_F_LIMITS = ('template-depth', 'constexpr-depth', 'constexpr-loop-limit', 'max-errors')
+# language 中允许的编译参数：优化级别、语言标准、宏定义、警告、上面列出的 -f 选项和常用库
+_ALLOWED_FLAG = re.compile(
+    r'-(?:O[0-3sg]?|std=[a-z0-9+]+|[DU][A-Za-z_]\w*(?:=[\w.]*)?|W[a-z][\w-]*|w|g|lm|pthread'
+    r'|f(?:' + '|'.join(map(re.escape, _ALLOWED_F_OPTIONS)) + r')'
+    r'|f(?:' + '|'.join(map(re.escape, _ALLOWED_F_LIMITS)) + r')=\d+)')
+# 'c++17'、'cpp20'、'c11' 等带标准版本的语言名称
+_LANGUAGE_STANDARD = re.compile(r'(c\+\+|cpp|c)(\d\d)')
+# 以 #include <bits/stdc++.h> 开头（之前只有空白和注释）的源码可以使用预编译头
+_PCH_INCLUDE = re.compile(r'\A(?:\s+|//[^\n]*|/\*.*?\*/)*#[ \t]*include[ \t]*<bits/stdc\+\+\.h>', re.S)
+
+
+@functools.lru_cache(maxsize=256)
+def parse_language(language):
+    """把考试的 language 拆分为 (规范化的语言名称, C/C++编译参数)
+
+    支持 'cpp'、'c++17'（即 cpp -std=c++17）以及 'cpp -O2 -std=gnu++20 -DLOCAL' 等写法。
+    只接受 _ALLOWED_FLAG 中的参数（考试数据不能借此读写任意文件），其余参数忽略并记录警告
+    （结果有缓存，同一写法只警告一次）。
+    """
+    parts = (language or '').split()
+    if not parts:
+        return '', ()
+    name, options = parts[0].lower(), parts[1:]
+    flags = []
+    match = _LANGUAGE_STANDARD.fullmatch(name)
+    if match:
+        name = 'c' if match.group(1) == 'c' else 'cpp'
+        flags.append(f'-std={"c" if name == "c" else "c++"}{match.group(2)}')
+    if name == 'c++':
+        name = 'cpp'
+    for option in options:
+        if name in ('c', 'cpp') and _ALLOWED_FLAG.fullmatch(option):
+            flags.append(option)
+        else:
+            logger.warning("忽略不支持的编译参数: %s", option)
+    return name, tuple(flags)
+
+
+def normalize_language(language):
+    """规范化语言名称（去掉 language 中的编译参数）"""
+    return parse_language(language)[0]
+
+
+def describe_language(language):
+    """规范化的语言及编译参数，用于区分编译结果不同的提交"""
+    name, flags = parse_language(language)
+    return ' '.join((name,) + flags)
+
+
+def get_file_extension(language):
+    """获取文件扩展名"""
+    extensions = {
+        'python': '.py',
+        'java': '.java',
+        'c': '.c',
+        'cpp': '.cpp',
+        'c++': '.cpp',
+        'javascript': '.js',
+        'js': '.js'
+    }
+    return extensions.get(language.lower(), '.txt')
+
+
+@functools.lru_cache(maxsize=None)
+def toolchain_version(command):
+    """获取编译器版本信息，作为编译缓存键的一部分"""
+    try:
+        result = subprocess.run([command, '--version'], capture_output=True, text=True, timeout=10)
+        return (result.stdout or result.stderr).splitlines()[0] if (result.stdout or result.stderr) else command
+    except Exception:
+        return command
+
+
+def java_main_class(code):
+    """从Java源码中找出主类名（public类优先），找不到时使用Main"""
+    match = re.search(r'public\s+(?:final\s+)?class\s+(\w+)', code) or re.search(r'\bclass\s+(\w+)', code)
+    return match.group(1) if match else 'Main'
+
+
+class ArtifactCache:
+    """编译产物缓存
+
+    以 (源码哈希, 语言, 编译参数, 编译器版本) 为键做内容寻址，
+    每个条目是缓存目录下的一个子目录。按条目的访问时间做 LRU 淘汰，
+    总大小超过上限时删除最久未使用且未被占用的条目。
+    """
+
+    def __init__(self, root=ARTIFACT_CACHE_DIR, max_bytes=ARTIFACT_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._pins = {}
+        self._total_bytes = None
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.root, exist_ok=True)
+
+    @staticmethod
+    def make_key(code, language, flags=(), toolchain=''):
+        """计算缓存键"""
+        digest = hashlib.sha256()
+        for part in (normalize_language(language), toolchain, '\x00'.join(flags), code):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\x1e')
+        return digest.hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def acquire(self, key):
+        """查找缓存条目，命中时占用该条目并返回路径，占用期间不会被淘汰"""
+        path = self.entry_path(key)
+        with self._lock:
+            if not os.path.isdir(path):
+                self.misses += 1
+                CACHE_REQUESTS.inc(cache='artifact', result='miss')
+                return None
+            self.hits += 1
+            CACHE_REQUESTS.inc(cache='artifact', result='hit')
+            self._pins[key] = self._pins.get(key, 0) + 1
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+
+    def release(self, key):
+        """释放对条目的占用"""
+        with self._lock:
+            count = self._pins.get(key, 0) - 1
+            if count > 0:
+                self._pins[key] = count
+            else:
+                self._pins.pop(key, None)
+
+    def store(self, key, source_dir):
+        """将编译输出目录移入缓存，返回占用后的条目路径"""
+        path = self.entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        staging = tempfile.mkdtemp(prefix='.staging-', dir=os.path.dirname(path))
+        try:
+            for name in os.listdir(source_dir):
+                shutil.move(os.path.join(source_dir, name), os.path.join(staging, name))
+            with self._lock:
+                try:
+                    os.rename(staging, path)
+                except OSError:
+                    # 其他线程已写入同一条目，使用已有条目
+                    shutil.rmtree(staging, ignore_errors=True)
+                self._pins[key] = self._pins.get(key, 0) + 1
+                if self._total_bytes is not None:
+                    self._total_bytes += self._dir_size(path)
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        # 只在估算的总大小超过上限时才扫描缓存目录
+        if self._total_bytes is None or self._total_bytes > self.max_bytes:
+            self.evict()
+        return path
+
+    @staticmethod
+    def _dir_size(path):
+        size = 0
+        for dirpath, _, filenames in os.walk(path):
+            for filename in filenames:
+                try:
+                    size += os.path.getsize(os.path.join(dirpath, filename))
+                except OSError:
+                    pass
+        return size
+
+    def evict(self):
+        """按LRU淘汰条目，直到总大小不超过上限"""
+        entries = []
+        total = 0
+        for bucket in os.listdir(self.root):
+            bucket_path = os.path.join(self.root, bucket)
+            if not os.path.isdir(bucket_path):
+                continue
+            for key in os.listdir(bucket_path):
+                if key.startswith('.staging-'):
+                    continue
+                path = os.path.join(bucket_path, key)
+                size = self._dir_size(path)
+                try:
+                    mtime = os.path.getmtime(path)
+                except OSError:
+                    continue
+                entries.append((mtime, key, path, size))
+                total += size
+        entries.sort()
+        with self._lock:
+            for _, key, path, size in entries:
+                if total <= self.max_bytes:
+                    break
+                if key in self._pins:
+                    continue
+                shutil.rmtree(path, ignore_errors=True)
+                total -= size
+            self._total_bytes = total
+
+
+def uses_precompiled_header(code, language):
+    """C++源码是否以 #include <bits/stdc++.h> 开头，可以使用预编译头"""
+    return language == 'cpp' and _PCH_INCLUDE.match(code) is not None
+
+
+class PrecompiledHeaders:
+    """bits/stdc++.h 的预编译头
+
+    按 (编译器版本, 编译参数) 各生成一次，保存在 root 下的子目录中，进程重启后复用。
+    编译时通过 -I 把该目录放在系统头文件目录之前，GCC 找到 bits/stdc++.h.gch 时
+    直接加载；参数不兼容等原因无法使用时GCC会忽略它，照常解析系统头文件。
+    生成失败（如编译器没有 bits/stdc++.h）时记录下来，之后不再尝试。
+    """
+
+    def __init__(self, root=PCH_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+        # 键 -> 预编译头目录（生成失败时为None）
+        self._dirs = {}
+        # 键 -> 生成锁，同一个预编译头只生成一次，其他编译线程等待
+        self._building = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(compiler, flags):
+        digest = hashlib.sha256()
+        for part in (compiler, toolchain_version(compiler), '\x00'.join(flags)):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\x1e')
+        return digest.hexdigest()[:32]
+
+    def include_dir(self, compiler, flags):
+        """返回可用于 -I 的预编译头目录，不可用时返回None"""
+        key = self.make_key(compiler, flags)
+        with self._lock:
+            if key in self._dirs:
+                return self._dirs[key]
+            building = self._building.setdefault(key, threading.Lock())
+        with building:
+            with self._lock:
+                if key in self._dirs:
+                    return self._dirs[key]
+            path = os.path.join(self.root, key)
+            if not os.path.isfile(os.path.join(path, 'bits', 'stdc++.h.gch')):
+                path = self._generate(path, compiler, flags)
+            with self._lock:
+                self._dirs[key] = path
+        return path
+
+    def _generate(self, path, compiler, flags):
+        os.makedirs(self.root, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix='.staging-', dir=self.root)
+        try:
+            header = os.path.join(staging, 'stdc++.h')
+            with open(header, 'w', encoding='utf-8') as f:
+                f.write('#include <bits/stdc++.h>\n')
+            os.makedirs(os.path.join(staging, 'bits'))
+            start_time = time.time()
+            result = subprocess.run([compiler, *flags, '-x', 'c++-header', header,
+                                     '-o', os.path.join(staging, 'bits', 'stdc++.h.gch')],
+                                    capture_output=True, text=True, timeout=PCH_TIMEOUT)
+            if result.returncode != 0:
+                logger.warning("无法生成预编译头（%s %s）: %s", compiler, ' '.join(flags), result.stderr.strip()[:500])
+                return None
+            os.remove(header)
+            try:
+                os.rename(staging, path)
+            except OSError:
+                # 其他进程已生成同一个预编译头
+                pass
+            logger.info("已生成预编译头（%s %s），用时 %.1f 秒", compiler, ' '.join(flags), time.time() - start_time)
+            return path
+        except (OSError, subprocess.SubprocessError) as e:
+            logger.warning("无法生成预编译头: %s", e)
+            return None
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    def compile_flags(self, code, language, compiler, flags):
+        """返回使用预编译头需要追加的编译参数，不能使用时返回空元组"""
+        if not uses_precompiled_header(code, language):
+            return ()
+        path = self.include_dir(compiler, flags)
+        with self._lock:
+            if path is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        CACHE_REQUESTS.inc(cache='pch', result='miss' if path is None else 'hit')
+        return ('-I', path) if path else ()
+
+    def warm_up(self, language):
+        """在后台线程中预先生成 language（可带编译参数）对应的预编译头"""
+        name, flags = parse_language(language)
+        if name != 'cpp':
+            return None
+        thread = threading.Thread(target=self.include_dir, args=('g++', flags), name='pch-warmup', daemon=True)
+        thread.start()
+        return thread
+
+
+class Artifact:
+    """一次提交的构建产物，对所有测试用例复用，提交测评结束后调用cleanup释放"""
+
+    __slots__ = ('language', 'cmd', 'error', 'workdir', 'cache', 'cache_key', 'cached')
+
+    def __init__(self, language, cmd=None, error='', workdir=None, cache=None, cache_key=None, cached=False):
+        self.language = language
+        self.cmd = cmd
+        self.error = error
+        self.workdir = workdir
+        self.cache = cache
+        self.cache_key = cache_key
+        self.cached = cached
+
+    @property
+    def success(self):
+        return self.cmd is not None
+
+    def cleanup(self):
+        """删除临时工作目录，并释放缓存条目的占用"""
+        if self.workdir:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+            self.workdir = None
+        if self.cache is not None and self.cache_key:
+            self.cache.release(self.cache_key)
+            self.cache = None
+
+
+def compile_command(language, source_file, output_dir, flags=()):
+    """返回编译命令及编译后的运行命令，无需编译的语言返回 (None, 运行命令)"""
+    if language == 'python':
+        return None, ['python3', source_file]
+    if language == 'java':
+        class_name = os.path.splitext(os.path.basename(source_file))[0]
+        return ['javac', '-d', output_dir, *flags, source_file], ['java', '-cp', output_dir, class_name]
+    if language in ('c', 'cpp'):
+        exe_file = os.path.join(output_dir, 'main.exe' if os.name == 'nt' else 'main.out')
+        compiler = 'gcc' if language == 'c' else 'g++'
+        return [compiler, source_file, '-o', exe_file, *flags], [exe_file]
+    return None, None
+
+
+def build_program(code, language, artifact_cache=None, flags=(), precompiled_headers=None):
+    """构建提交的代码：编译型语言只编译一次，产物写入缓存供后续复用
+
+    language 中的编译参数（见 parse_language）排在 flags 之前。指定 precompiled_headers
+    （PrecompiledHeaders）时，可以使用预编译头的C++提交改用预编译头编译。
+    """
+    language, language_flags = parse_language(language)
+    flags = language_flags + tuple(flags)
+    workdir = tempfile.mkdtemp(prefix='judge-')
+    try:
+        if language == 'java':
+            source_name = java_main_class(code) + '.java'
+        else:
+            source_name = 'main' + get_file_extension(language)
+        source_file = os.path.join(workdir, source_name)
+        
+        compile_cmd, run_cmd = compile_command(language, source_file, workdir, flags)
+        if run_cmd is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+            return Artifact(language, error=f'不支持的语言: {language}')
+        
+        with open(source_file, 'w', encoding='utf-8') as f:
+            f.write(code)
+        
+        if compile_cmd is None:
+            return Artifact(language, cmd=run_cmd, workdir=workdir)
+        
+        cache_key = None
+        if artifact_cache is not None:
+            cache_key = ArtifactCache.make_key(code, language, flags, toolchain_version(compile_cmd[0]))
+            cached_path = artifact_cache.acquire(cache_key)
+            if cached_path:
+                shutil.rmtree(workdir, ignore_errors=True)
+                return _artifact_from_cache(language, source_name, cached_path, artifact_cache, cache_key, flags, cached=True)
+        
+        if precompiled_headers is not None:
+            compile_cmd += precompiled_headers.compile_flags(code, language, compile_cmd[0], flags)
+        try:
+            compile_result = subprocess.run(compile_cmd, capture_output=True, text=True, timeout=COMPILE_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            shutil.rmtree(workdir, ignore_errors=True)
+            return Artifact(language, error='编译超时')
+        
+        output_dir = os.path.join(workdir, 'out')
+        os.makedirs(output_dir)
+        if compile_result.returncode != 0:
+            with open(os.path.join(output_dir, 'compile_error.txt'), 'w', encoding='utf-8') as f:
+                f.write(compile_result.stderr)
+        else:
+            for name in os.listdir(workdir):
+                if name not in (source_name, 'out'):
+                    shutil.move(os.path.join(workdir, name), os.path.join(output_dir, name))
+        
+        if artifact_cache is None:
+            return _artifact_from_cache(language, source_name, output_dir, None, None, flags, workdir=workdir)
+        cached_path = artifact_cache.store(cache_key, output_dir)
+        shutil.rmtree(workdir, ignore_errors=True)
+        return _artifact_from_cache(language, source_name, cached_path, artifact_cache, cache_key, flags)
+    except Exception as e:
+        shutil.rmtree(workdir, ignore_errors=True)
+        return Artifact(language, error=str(e))
+
+
+def _artifact_from_cache(language, source_name, artifact_dir, cache, cache_key, flags, workdir=None, cached=False):
+    """根据编译输出目录构造构建产物"""
+    error_file = os.path.join(artifact_dir, 'compile_error.txt')
+    if os.path.exists(error_file):
+        with open(error_file, encoding='utf-8') as f:
+            error = f.read()
+        if cache is not None:
+            cache.release(cache_key)
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+        return Artifact(language, error=f'编译错误: {error}')
+    _, run_cmd = compile_command(language, os.path.join(artifact_dir, source_name), artifact_dir, flags)
+    return Artifact(language, cmd=run_cmd, workdir=workdir, cache=cache, cache_key=cache_key, cached=cached)
+
+
+def run_program(artifact, input_data, time_limit=RUN_TIMEOUT, memory_limit=None, runners=None, capture=None):
+    """使用构建产物运行一个测试用例
+
+    time_limit 为CPU时间限制（秒），memory_limit 为内存限制（MB）。
+    runners 为 {语言: 运行器} 字典（如 Python 预热解释器池），没有对应运行器的语言
+    每次启动新进程运行。
+    capture 为 sandbox.OutputCapture，带比较方式时边运行边比较输出，
+    返回值中的 matched 为比较结果，output 只保留开头部分。
+    返回值中的 verdict 为 sandbox 中定义的判定结果，cpu_time、wall_time、spawn_time（启动进程）、
+    compare_time（比较输出）单位为秒，peak_memory 单位为KB（平台不支持时为None）。
+    """
+    if not artifact.success:
+        return {
+            'success': False,
+            'verdict': VERDICT_CE if artifact.error.startswith('编译') else VERDICT_SE,
+            'error': artifact.error
+        }
+    try:
+        cmd = artifact.cmd
+        limit_address_space = True
+        if artifact.language == 'java':
+            # JVM启动时会预留大量虚拟内存，改用 -Xmx 限制堆大小
+            limit_address_space = False
+            if memory_limit:
+                cmd = [cmd[0], f'-Xmx{int(memory_limit)}m', *cmd[1:]]
+        
+        capture = capture or OutputCapture()
+        runner = runners.get(artifact.language) if runners else None
+        if runner is not None:
+            result = runner.run(cmd, input_data, time_limit, memory_limit, capture=capture)
+        else:
+            result = run_limited(cmd, input_data, time_limit, memory_limit, limit_address_space, capture)
+        run_info = {
+            'verdict': result.verdict,
+            'cpu_time': result.cpu_time,
+            'wall_time': result.wall_time,
+            'peak_memory': result.peak_memory,
+            'spawn_time': result.spawn_time,
+            'compare_time': capture.compare_time
+        }
+        
+        if result.verdict == VERDICT_OK:
+            return dict(run_info, success=True, output=result.stdout, matched=capture.matched)
+        if result.verdict == VERDICT_TLE:
+            error = f'CPU时间超限（{result.cpu_time:.2f}s，限制{time_limit}s）'
+        elif result.verdict == VERDICT_WTLE:
+            error = '代码执行超时'
+        elif result.verdict == VERDICT_MLE:
+            peak = f'峰值{result.peak_memory // 1024}MB，' if result.peak_memory is not None else ''
+            error = f'内存超限（{peak}限制{memory_limit}MB）'
+        elif result.verdict == VERDICT_OLE:
+            error = f'输出超限（超过{capture.limit // (1024 * 1024)}MB）'
+        else:
+            error = result.stderr or '程序执行失败'
+        return dict(run_info, success=False, error=error)
+    except Exception as e:
+        return {
+            'success': False,
+            'verdict': VERDICT_SE,
+            'error': str(e)
+        }
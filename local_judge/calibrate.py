@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+时间限制校准：先在本机运行题目的参考解法，按其耗时为每个测试用例确定时间限制
+
+    时间限制 = min(题目的 timeLimit, max(floor, factor × 参考解法的CPU时间))
+
+向上取整到 LIMIT_STEP 秒，使同一台机器上多次测评得到的限制相同（结果存储的键不变）。
+死循环的提交在小输入上很快就被判定超时，不必每个测试用例都等满题目的时间限制。
+
+参考解法取题目的 referenceSolution 字段，没有时取 correctAnswer（题库中编程题的“参考答案”）。
+参考解法无法编译或未通过某个测试用例时（例如参考答案只是文字说明）不校准，使用题目的时间限制。
+校准后的时间限制写在测试用例的 timeLimit 中；按校准的限制超时的测试用例会重新运行一次确认
+（见 scheduler.run_test_case）。分布式测评时工作进程按本机与协调器的相对速度（host_speed）
+换算时间限制。
+"""
+
+import math
+import time
+import logging
+import functools
+import threading
+from types import MappingProxyType
+
+from .build import describe_language
+from .policy import test_case_passed
+from .scheduler import DEFAULT_COMPARISON, run_test_case, timed_build
+from .testcases import TestCaseEntry
+
+logger = logging.getLogger(__name__)
+
+# 时间限制 = 参考解法耗时的 DEFAULT_FACTOR 倍，不低于 DEFAULT_FLOOR 秒
+DEFAULT_FACTOR = 5
+DEFAULT_FLOOR = 0.2
+# 校准后的时间限制向上取整的粒度（秒）
+LIMIT_STEP = 0.1
+# 每个测试用例运行参考解法的次数，取最短耗时
+REFERENCE_RUNS = 2
+# 测量本机速度的计算量
+SPEED_LOOP = 200000
+# 分布式测评时相对速度的换算范围，以及不换算的误差范围
+MIN_SPEED_SCALE = 0.25
+MAX_SPEED_SCALE = 4
+SPEED_TOLERANCE = 0.15
+
+
+@functools.lru_cache(maxsize=None)
+def host_speed():
+    """本机完成固定计算量的耗时（秒，取三次中最短的），越大表示越慢"""
+    best = None
+    for _ in range(3):
+        start = time.perf_counter()
+        total = 0
+        for i in range(SPEED_LOOP):
+            total += i * i
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def round_limit(seconds):
+    """向上取整到 LIMIT_STEP 秒"""
+    return round(math.ceil(seconds / LIMIT_STEP - 1e-9) * LIMIT_STEP, 3)
+
+
+def scale_time_limits(entry, reference_speed):
+    """按本机与 reference_speed（测出校准结果的机器的 host_speed）的相对速度换算校准的时间限制"""
+    scale = min(MAX_SPEED_SCALE, max(MIN_SPEED_SCALE, host_speed() / reference_speed))
+    if abs(scale - 1) <= SPEED_TOLERANCE:
+        return entry
+    test_cases = tuple(
+        MappingProxyType(dict(tc, timeLimit=round_limit(tc['timeLimit'] * scale))) if 'timeLimit' in tc else tc
+        for tc in entry.test_cases
+    )
+    return TestCaseEntry(entry.question_id, entry.title, test_cases, entry.points, entry.time_limit,
+                         entry.memory_limit, entry.updated_at, entry.reference)
+
+
+def is_calibrated(entry):
+    return bool(entry.test_cases) and 'timeLimit' in entry.test_cases[0]
+
+
+class TimeLimitCalibrator:
+    """按参考解法校准时间限制，每道题目（及语言）只校准一次，可被多个线程同时使用"""
+
+    def __init__(self, factor=DEFAULT_FACTOR, floor=DEFAULT_FLOOR):
+        self.factor = factor
+        self.floor = floor
+        self._lock = threading.Lock()
+        # (题目条目, 语言) -> (题目条目, 校准后的条目)
+        self._entries = {}
+
+    def limit(self, reference_time, max_limit):
+        """由参考解法的耗时计算时间限制（秒）"""
+        return min(max_limit, round_limit(max(self.floor, self.factor * reference_time)))
+
+    def calibrate(self, entry, language, artifact_cache=None, precompiled_headers=None, runners=None,
+                  comparison=None):
+        """返回校准了时间限制的题目条目；没有参考解法或参考解法未通过时返回原条目"""
+        if entry is None or not entry.test_cases or not entry.reference.strip():
+            return entry
+        key = (id(entry), describe_language(language))
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is None or cached[0] is not entry:
+                calibrated = self._calibrate(entry, language, artifact_cache, precompiled_headers, runners,
+                                             comparison or DEFAULT_COMPARISON)
+                cached = self._entries[key] = (entry, calibrated)
+        return cached[1]
+
+    def _calibrate(self, entry, language, artifact_cache, precompiled_headers, runners, comparison):
+        artifact, _ = timed_build(entry.reference, language, artifact_cache, precompiled_headers)
+        try:
+            if not artifact.success:
+                logger.info("题目 %s 的参考解法无法编译，不校准时间限制", entry.title)
+                return entry
+            times = []
+            for i, test_case in enumerate(entry.test_cases):
+                best = None
+                for _ in range(REFERENCE_RUNS):
+                    result, _ = run_test_case(artifact, test_case, entry, runners, comparison)
+                    if not test_case_passed(test_case, result, comparison):
+                        logger.warning("题目 %s 的参考解法未通过测试用例%d（%s），不校准时间限制", entry.title, i + 1,
+                                       result.get('verdict'))
+                        return entry
+                    seconds = result.get('cpu_time')
+                    if seconds is None:
+                        seconds = result.get('wall_time', 0)
+                    best = seconds if best is None else min(best, seconds)
+                times.append(best)
+        finally:
+            artifact.cleanup()
+
+        limits = [self.limit(seconds, entry.time_limit) for seconds in times]
+        logger.info("题目 %s 按参考解法校准时间限制: %g~%g 秒（参考解法最长 %.3f 秒，题目限制 %g 秒）", entry.title,
+                    min(limits), max(limits), max(times), entry.time_limit)
+        test_cases = tuple(MappingProxyType(dict(tc, timeLimit=limit)) for tc, limit in zip(entry.test_cases, limits))
+        return TestCaseEntry(entry.question_id, entry.title, test_cases, entry.points, entry.time_limit,
+                             entry.memory_limit, entry.updated_at, entry.reference)
@@ -0,0 +1,373 @@
+# -*- coding: utf-8 -*-
+"""
+命令行测评入口（无需图形界面）
+
+示例：
+    export LOCAL_JUDGE_PASSWORD=...
+    python3 -m local_judge --server http://localhost:3000 --email teacher@example.com exams
+    python3 -m local_judge --email teacher@example.com judge <考试ID> [<考试ID> ...] -o results.jsonl
+
+    # 测评全部考试：所有考试共用一个任务队列和编译缓存，每场考试各导出一个文件
+    python3 -m local_judge --email teacher@example.com judge --all -o results.jsonl --export scores.csv
+
+    # 保存离线快照，之后不需要服务器即可重新测评
+    python3 -m local_judge --email teacher@example.com snapshot <考试ID> -o exam.db
+    python3 -m local_judge judge --snapshot exam.db -o results.jsonl
+
+    # 分布式测评：协调器监听 8700 端口，其他机器上运行工作进程
+    python3 -m local_judge judge --snapshot exam.db --coordinator 0.0.0.0:8700 --worker-token SECRET
+    python3 -m local_judge worker http://协调器地址:8700 --token SECRET -j 8
+
+    # 测评时在 http://127.0.0.1:9464/metrics 提供 Prometheus 指标
+    python3 -m local_judge --metrics-port 9464 judge --snapshot exam.db
+
+测评结果以JSON Lines格式逐条输出：每条结果一行（"type": "result"），
+每个考试结束后输出一行汇总（"type": "summary"）。日志写到标准错误。
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+
+import requests
+
+from .calibrate import DEFAULT_FACTOR, DEFAULT_FLOOR, TimeLimitCalibrator
+from .compare import COMPARE_MODES, DEFAULT_COMPARE_MODE, DEFAULT_FLOAT_TOLERANCE, Comparison
+from .policy import DEFAULT_SCORING_MODE, SCORING_MODES, ScoringPolicy
+from .similarity import DEFAULT_THRESHOLD, SimilarityDetector, format_cluster
+from .metrics import DEFAULT_DUMP_INTERVAL, JsonMetricsDumper, MetricsServer, ThroughputMeter
+from .scores import EXPORT_FORMATS, ResultExporter, ScoreAggregator, exam_export_path, export_format
+from .distributed import Coordinator, JudgeWorker, WorkerError
+from .engine import (DEFAULT_SERVER_URL, JudgeEngine, JudgeError, exam_label, format_dedup_summary,
+                     format_cache_summary)
+
+logger = logging.getLogger(__name__)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python3 -m local_judge', description='本地代码测评工具（命令行模式）')
+    parser.add_argument('--server', default=os.environ.get('LOCAL_JUDGE_SERVER', DEFAULT_SERVER_URL),
+                        help='考试系统地址（环境变量 LOCAL_JUDGE_SERVER）')
+    parser.add_argument('--email', default=os.environ.get('LOCAL_JUDGE_EMAIL', ''),
+                        help='教师账号邮箱（环境变量 LOCAL_JUDGE_EMAIL）')
+    parser.add_argument('--password', default=os.environ.get('LOCAL_JUDGE_PASSWORD', ''),
+                        help='登录密码，建议使用环境变量 LOCAL_JUDGE_PASSWORD 以免出现在进程列表中')
+    parser.add_argument('-v', '--verbose', action='store_true', help='输出调试日志')
+    parser.add_argument('--metrics-port', type=int, default=None, metavar='PORT',
+                        help='在 http://127.0.0.1:PORT/metrics 提供Prometheus格式的测评指标（/metrics.json 为JSON）')
+    parser.add_argument('--metrics-json', metavar='FILE', help='定期把测评指标以JSON写入该文件')
+    parser.add_argument('--metrics-interval', type=float, default=DEFAULT_DUMP_INTERVAL,
+                        help='--metrics-json 的写入间隔（秒），默认 %(default)s')
+
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('exams', help='同步并列出考试')
+
+    snapshot_parser = subparsers.add_parser('snapshot', help='下载考试、编程题和全部学生答案，保存为离线快照')
+    snapshot_parser.add_argument('exam_id', metavar='EXAM_ID', help='考试ID')
+    snapshot_parser.add_argument('-o', '--output', required=True, help='快照文件路径')
+
+    refresh_parser = subparsers.add_parser('refresh-snapshot', help='测试用例修正后，从服务器题库更新快照中的题目')
+    refresh_parser.add_argument('snapshot', metavar='FILE', help='快照文件路径')
+
+    judge_parser = subparsers.add_parser('judge', help='测评一个或多个考试')
+    judge_parser.add_argument('exam_ids', nargs='*', metavar='EXAM_ID', help='考试ID')
+    judge_parser.add_argument('--all', action='store_true', help='测评已同步的全部考试')
+    judge_parser.add_argument('--snapshot', action='append', default=[], metavar='FILE',
+                              help='测评离线快照（不需要登录，可重复指定）')
+    judge_parser.add_argument('--question', action='append', default=None, metavar='QUESTION_ID',
+                              help='只测评指定的编程题（可重复指定）')
+    judge_parser.add_argument('-o', '--output', default='-', help='结果输出文件（JSON Lines），默认为标准输出')
+    judge_parser.add_argument('-j', '--workers', type=int, default=None, help='运行进程数，默认为CPU核心数')
+    judge_parser.add_argument('--compile-workers', type=int, default=None, help='编译并发数，默认为运行进程数的一半')
+    judge_parser.add_argument('--no-python-zygote', action='store_true', help='不使用Python预热解释器，每个测试用例启动新的python3进程')
+    judge_parser.add_argument('--compare', choices=COMPARE_MODES, default=DEFAULT_COMPARE_MODE,
+                              help='输出比较方式：strip 去掉首尾空白后完全相同（默认），lines 忽略行尾空白，'
+                                   'tokens 按单词比较，float 按单词比较且数字允许误差')
+    judge_parser.add_argument('--float-tolerance', type=float, default=DEFAULT_FLOAT_TOLERANCE,
+                              help='float 比较方式允许的绝对或相对误差，默认 %(default)g')
+    judge_parser.add_argument('--scoring', choices=SCORING_MODES, default=DEFAULT_SCORING_MODE,
+                              help='评分策略：partial 每个测试用例按比例得分（默认），fail-fast 全部通过才得分，'
+                                   '第一个测试用例失败后不再运行其余测试用例，subtasks 按测试用例的 group 字段'
+                                   '分组，整组通过才得分，组内失败后跳过同组其余测试用例')
+    judge_parser.add_argument('--no-reorder', action='store_true',
+                              help='fail-fast / subtasks 下仍按题目中的顺序运行测试用例'
+                                   '（默认先运行耗时短、经常失败的测试用例）')
+    judge_parser.add_argument('--calibrate', action='store_true',
+                              help='先运行题目的参考解法（referenceSolution 或 correctAnswer），按其耗时确定各测试用例的'
+                                   '时间限制（不超过题目的时间限制），超时的测试用例重新运行一次确认')
+    judge_parser.add_argument('--calibrate-factor', type=float, default=DEFAULT_FACTOR,
+                              help='校准的时间限制为参考解法耗时的倍数，默认 %(default)g')
+    judge_parser.add_argument('--calibrate-floor', type=float, default=DEFAULT_FLOOR,
+                              help='校准的时间限制下限（秒），默认 %(default)g')
+    judge_parser.add_argument('--similarity', action='store_true',
+                              help='查重：找出每道题目中代码相似的提交（忽略变量名、注释和空白），'
+                                   '结果在汇总记录的 similarity 中')
+    judge_parser.add_argument('--similarity-threshold', type=float, default=DEFAULT_THRESHOLD,
+                              help='--similarity 的相似度阈值（0~1），默认 %(default)s')
+    judge_parser.add_argument('--no-pch', action='store_true',
+                              help='C++提交不使用 bits/stdc++.h 的预编译头')
+    judge_parser.add_argument('--no-java-runner', action='store_true', help='不使用常驻JVM，每个测试用例启动新的java进程')
+    judge_parser.add_argument('--export', metavar='FILE',
+                              help=f'同时把完整的测评结果导出到文件，格式由扩展名决定（{"/".join(EXPORT_FORMATS)}，xlsx 需要 openpyxl）；'
+                                   '测评多场考试时每场考试一个文件，文件名后加上考试标题和ID')
+    judge_parser.add_argument('--upload', action='store_true',
+                              help='测评完成后把每个学生的编程总分上传到服务器（只上传与上次上传不同的成绩）')
+    judge_parser.add_argument('--upload-all', action='store_true', help='与 --upload 一起使用，上传全部学生的成绩')
+    judge_parser.add_argument('--rejudge', action='store_true', help='忽略结果存储中已记录的结果，全部重新运行')
+    judge_parser.add_argument('--no-result-store', action='store_true',
+                              help='不读取也不记录测评结果（默认记录在 ~/.local_judge/results.db）')
+    judge_parser.add_argument('--no-test-data-files', action='store_true',
+                              help='较大的测试数据也保存在内存中（默认保存为 ~/.local_judge/testdata/ 中的文件）')
+    judge_parser.add_argument('--coordinator', metavar='[HOST:]PORT',
+                              help='分布式测评：在该地址启动协调器，由 worker 命令启动的工作进程执行测试用例'
+                                   '（默认只监听 127.0.0.1，其他机器连接时使用 0.0.0.0:PORT）')
+    judge_parser.add_argument('--worker-token', default=os.environ.get('LOCAL_JUDGE_WORKER_TOKEN', ''),
+                              help='工作进程须携带的共享令牌（环境变量 LOCAL_JUDGE_WORKER_TOKEN）')
+
+    worker_parser = subparsers.add_parser('worker', help='作为分布式测评的工作进程，从协调器领取并执行测试用例')
+    worker_parser.add_argument('url', metavar='URL', help='协调器地址，如 http://192.168.1.10:8700')
+    worker_parser.add_argument('-j', '--workers', type=int, default=None, help='运行进程数，默认为CPU核心数')
+    worker_parser.add_argument('--token', default=os.environ.get('LOCAL_JUDGE_WORKER_TOKEN', ''),
+                               help='协调器的共享令牌（环境变量 LOCAL_JUDGE_WORKER_TOKEN）')
+    worker_parser.add_argument('--name', default=None, help='工作进程名称，默认为 主机名:进程号')
+    worker_parser.add_argument('--no-python-zygote', action='store_true', help='不使用Python预热解释器')
+    worker_parser.add_argument('--no-java-runner', action='store_true', help='不使用常驻JVM')
+    worker_parser.add_argument('--no-pch', action='store_true', help='C++提交不使用预编译头')
+    worker_parser.add_argument('--no-test-data-files', action='store_true', help='下载的测试数据保存在内存中')
+
+    return parser
+
+
+def write_record(stream, record):
+    stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+    stream.flush()
+
+
+def cmd_exams(engine, args):
+    for exam in engine.sync_exams():
+        label = exam_label(exam)
+        if label:
+            print(label)
+    return 0
+
+
+def cmd_snapshot(engine, args):
+    engine.sync_exams()
+    exam = engine.find_exam(args.exam_id)
+    logger.info("加载考试 %s", exam_label(exam))
+    engine.load_exam(exam, stream_results=True)
+    engine.save_snapshot(exam, args.output)
+    logger.info("%s", engine.open_snapshot(args.output)['snapshot'].describe())
+    return 0
+
+
+def cmd_refresh_snapshot(engine, args):
+    exam = engine.open_snapshot(args.snapshot)
+    updated = engine.refresh_snapshot_questions(exam)
+    logger.info("已更新 %d 道题目；%s", updated, engine.test_case_index.describe())
+    return 0
+
+
+def upload_scores(engine, exam_id, aggregator, upload_all):
+    def on_progress(done, total):
+        logger.info("上传成绩 %d/%d", done, total)
+
+    summary = engine.upload_scores(exam_id, aggregator.scores(), diff=not upload_all, on_progress=on_progress)
+    logger.info("成绩上传完成: 上传 %d 名学生，%d 名未变化跳过，%d 名失败",
+                summary['uploaded'], summary['skipped'], summary['failed'])
+    for error in summary['errors']:
+        logger.warning("%s", error)
+
+
+def cmd_worker(engine, args):
+    worker = JudgeWorker(args.url, engine, args.workers, args.token, args.name)
+    try:
+        worker.run()
+    except WorkerError as e:
+        raise JudgeError(str(e))
+    except KeyboardInterrupt:
+        worker.stop()
+        return 130
+    return 0
+
+
+def start_coordinator(engine, args):
+    host, _, port = args.coordinator.rpartition(':')
+    try:
+        coordinator = Coordinator(int(port), host or '127.0.0.1', args.worker_token, engine.comparison,
+                                  engine.result_store, reuse_results=not args.rejudge, policy=engine.scoring)
+    except (ValueError, OSError) as e:
+        raise JudgeError(f"无法在 {args.coordinator} 上启动协调器: {e}")
+    return coordinator.start()
+
+
+class ExamOutput:
+    """一场考试的成绩汇总和导出文件（测评多场考试时每场考试一个导出文件）"""
+
+    def __init__(self, export_path=None):
+        self.aggregator = ScoreAggregator()
+        self.exporter = ResultExporter(export_path) if export_path else None
+
+    def add(self, row):
+        self.aggregator.add(row)
+        if self.exporter is not None:
+            self.exporter.write(row)
+
+    def close(self):
+        if self.exporter is not None:
+            self.exporter.close()
+            logger.info("已导出 %d 条测评结果到 %s", self.exporter.count, self.exporter.path)
+            self.exporter = None
+
+
+def load_exams(engine, args):
+    """按命令行参数加载考试和打开离线快照，考试的题库只获取一次"""
+    exams = []
+    if args.exam_ids or args.all:
+        engine.sync_exams()
+        exams = engine.find_exams(None if args.all else args.exam_ids)
+        logger.info("加载 %d 场考试", len(exams))
+        # 学生答案在测评时边下载边测评
+        engine.load_exams(exams, lambda exam: logger.info("已加载考试 %s", exam_label(exam)))
+        logger.info(engine.test_case_index.describe())
+    for path in args.snapshot:
+        # 离线快照：不访问服务器
+        exam = engine.open_snapshot(path)
+        logger.info("%s", exam['snapshot'].describe())
+        logger.info(exam['test_case_index'].describe())
+        exams.append(exam)
+    return exams
+
+
+def cmd_judge(engine, args):
+    if not args.exam_ids and not args.all and not args.snapshot:
+        raise JudgeError("请指定考试ID、--all 或 --snapshot 快照文件")
+    if args.all and args.exam_ids:
+        raise JudgeError("--all 与考试ID不能同时指定")
+    if args.upload and args.question:
+        raise JudgeError("只测评部分题目时不能上传成绩（上传的是所有编程题的总分）")
+    if args.export:
+        try:
+            export_format(args.export)
+        except ValueError as e:
+            raise JudgeError(str(e))
+    exams = load_exams(engine, args)
+    titles = {exam['_id']: exam.get('title', '') for exam in exams}
+    # 多场考试时每场考试各导出一个文件
+    separate_exports = len(exams) > 1
+
+    stream = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    coordinator = start_coordinator(engine, args) if args.coordinator else None
+    # 当前考试的输出：所有考试共用一个任务队列，结果按考试顺序到达
+    current = [None]
+    failed = []
+    export_paths = set()
+
+    def exam_output(exam_id):
+        if current[0] is None:
+            export_path = args.export
+            if export_path and separate_exports:
+                export_path = exam_export_path(export_path, exam_id, titles.get(exam_id))
+                # 同一考试的多个快照
+                base, number = export_path, 1
+                while export_path in export_paths:
+                    number += 1
+                    export_path = exam_export_path(base, number)
+                export_paths.add(export_path)
+            current[0] = ExamOutput(export_path)
+        return current[0]
+
+    # 测评结果逐条写出并按学生累加得分，不在内存中保存全部结果
+    def on_result(row):
+        write_record(stream, dict(row, type='result'))
+        exam_output(row['exam_id']).add(row)
+
+    meter = ThroughputMeter()
+
+    def on_progress(completed, total):
+        meter.update(completed, total)
+        if completed == total or completed % 100 == 0:
+            logger.info("进度 %s", meter.describe())
+
+    def on_summary(summary):
+        output = exam_output(summary['exam_id'])
+        current[0] = None
+        output.close()
+        write_record(stream, dict(summary, type='summary'))
+        logger.info("考试 %s 测评完成，共处理 %d 个任务，用时 %.1f 秒；%s；%s", summary['title'],
+                    summary['total_tasks'], summary['elapsed'], format_dedup_summary(summary['dedup']),
+                    format_cache_summary(summary['cache']))
+        for cluster in summary['similarity'] or ():
+            logger.warning("相似提交 %s", format_cluster(cluster))
+        if summary['error']:
+            # 结果不完整，不上传成绩
+            logger.error("考试 %s 测评出错: %s", summary['title'], summary['error'])
+            failed.append(summary['exam_id'])
+        elif args.upload:
+            upload_scores(engine, summary['exam_id'], output.aggregator, args.upload_all)
+
+    try:
+        engine.judge_exams(exams, args.workers, args.compile_workers, on_result, on_progress, args.question,
+                           args.rejudge, coordinator, on_summary)
+    finally:
+        if current[0] is not None:
+            current[0].close()
+        if coordinator is not None:
+            coordinator.close()
+        if stream is not sys.stdout:
+            stream.close()
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
+                        format='%(asctime)s %(levelname)s %(message)s', stream=sys.stderr)
+
+    engine = JudgeEngine(args.server, python_zygote=not getattr(args, 'no_python_zygote', False),
+                         java_runner=not getattr(args, 'no_java_runner', False),
+                         comparison=Comparison(getattr(args, 'compare', DEFAULT_COMPARE_MODE),
+                                               getattr(args, 'float_tolerance', DEFAULT_FLOAT_TOLERANCE)),
+                         result_store=not getattr(args, 'no_result_store', False),
+                         precompiled_headers=not getattr(args, 'no_pch', False),
+                         scoring=ScoringPolicy(getattr(args, 'scoring', DEFAULT_SCORING_MODE),
+                                               reorder=not getattr(args, 'no_reorder', False)),
+                         calibrator=TimeLimitCalibrator(args.calibrate_factor, args.calibrate_floor)
+                         if getattr(args, 'calibrate', False) else None,
+                         similarity=SimilarityDetector(args.similarity_threshold)
+                         if getattr(args, 'similarity', False) else None,
+                         test_data=not getattr(args, 'no_test_data_files', False))
+    exporters = []
+    try:
+        if args.metrics_port is not None:
+            try:
+                exporters.append(MetricsServer(args.metrics_port).start())
+            except OSError as e:
+                raise JudgeError(f"无法在端口 {args.metrics_port} 上提供指标: {e}")
+        if args.metrics_json:
+            exporters.append(JsonMetricsDumper(args.metrics_json, args.metrics_interval).start())
+        # 只测评离线快照时不需要登录
+        if args.command == 'worker':
+            return cmd_worker(engine, args)
+        if args.command != 'judge' or args.exam_ids or args.all or args.upload:
+            engine.login(args.email, args.password)
+        if args.command == 'exams':
+            return cmd_exams(engine, args)
+        if args.command == 'snapshot':
+            return cmd_snapshot(engine, args)
+        if args.command == 'refresh-snapshot':
+            return cmd_refresh_snapshot(engine, args)
+        return cmd_judge(engine, args)
+    except JudgeError as e:
+        logger.error("%s", e)
+        return 1
+    except requests.RequestException as e:
+        logger.error("无法连接到服务器: %s", e)
+        return 1
+    finally:
+        for exporter in exporters:
+            exporter.stop()
+        engine.close()
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+考试系统 HTTP 客户端
+
+所有请求共用一个 requests.Session：
+  - 保持连接复用（keep-alive 连接池），不再每次请求都重新建立 TCP/TLS 连接；
+  - 连接失败、读取超时和 5xx 响应按指数退避有限次重试（只对 GET 重试读取超时和 5xx）；
+  - 声明接受 gzip 压缩；
+  - 登录后的 token 保存在会话 cookie 中；
+  - 对考试列表、考试详情、学生答案和题库使用条件请求（If-None-Match /
+    If-Modified-Since），数据未变化时服务器（或 cloudflare-worker.js 缓存层）
+    返回 304，直接复用上次下载的内容。只缓存较小的响应内容（按 LRU 淘汰），
+    流式下载的响应不缓存。
+
+请求耗时计入 fetch 阶段指标，条件请求的命中（304）和未命中计入 http 缓存指标。
+"""
+
+import time
+import functools
+import logging
+import threading
+from collections import OrderedDict
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .metrics import CACHE_REQUESTS, span, observe_stage
+
+logger = logging.getLogger(__name__)
+
+# 重试次数和退避系数：第 n 次重试前等待 backoff * 2^(n-1) 秒
+HTTP_RETRIES = 3
+HTTP_BACKOFF = 0.5
+RETRY_STATUS = (500, 502, 503, 504)
+# 连接池大小
+HTTP_POOL_SIZE = 10
+# 条件请求缓存：单个响应内容的上限和全部缓存内容的上限（字节）
+HTTP_CACHE_MAX_BODY = 4 * 1024 * 1024
+HTTP_CACHE_SIZE = 32 * 1024 * 1024
+
+
+class _Validated:
+    """条件请求缓存的一项：校验信息和响应内容，不保留响应对象和连接"""
+    __slots__ = ('etag', 'last_modified', 'headers', 'encoding', 'content')
+
+    def __init__(self, response):
+        self.etag = response.headers.get('ETag')
+        self.last_modified = response.headers.get('Last-Modified')
+        self.headers = CaseInsensitiveDict(response.headers)
+        self.encoding = response.encoding
+        self.content = response.content
+
+    def replay(self, url):
+        """由缓存内容重建状态码为200的响应"""
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response.headers = CaseInsensitiveDict(self.headers)
+        response.encoding = self.encoding
+        response._content = self.content
+        return response
+
+
+class ApiClient:
+    """考试系统 API 会话"""
+
+    def __init__(self, retries=HTTP_RETRIES, backoff=HTTP_BACKOFF, pool_size=HTTP_POOL_SIZE):
+        self.session = requests.Session()
+        retry = Retry(
+            total=retries, connect=retries, read=retries, status=retries,
+            backoff_factor=backoff, status_forcelist=RETRY_STATUS,
+            allowed_methods=frozenset(['GET', 'HEAD']), raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers['Accept-Encoding'] = 'gzip, deflate'
+        # 条件请求缓存：URL -> 上次状态码为200的响应的 _Validated（LRU 顺序）
+        self._validated = OrderedDict()
+        self._validated_bytes = 0
+        self._lock = threading.Lock()
+        self.not_modified = 0
+
+    def set_token(self, token):
+        """设置认证token；换了账号时清空条件请求缓存"""
+        with self._lock:
+            self._validated.clear()
+            self._validated_bytes = 0
+        self.session.cookies.clear()
+        if token:
+            # 不绑定域名，切换服务器地址后仍然携带
+            self.session.cookies.set('token', token)
+
+    def post(self, url, timeout=10, **kwargs):
+        return self.session.post(url, timeout=timeout, **kwargs)
+
+    def get(self, url, timeout=30, conditional=False, **kwargs):
+        """发送GET请求
+
+        conditional 为True时带上次响应的 ETag / Last-Modified 发送条件请求，
+        服务器返回304时返回由上次内容重建的响应（内容相同）。
+        流式下载（stream=True）时忽略 conditional。
+        """
+        if not conditional or kwargs.get('stream'):
+            with span('fetch'):
+                return self.session.get(url, timeout=timeout, **kwargs)
+
+        with self._lock:
+            previous = self._validated.get(url)
+        headers = dict(kwargs.pop('headers', None) or {})
+        if previous is not None:
+            if previous.etag:
+                headers['If-None-Match'] = previous.etag
+            if previous.last_modified:
+                headers['If-Modified-Since'] = previous.last_modified
+
+        with span('fetch'):
+            response = self.session.get(url, timeout=timeout, headers=headers, **kwargs)
+            if response.status_code == 304 and previous is not None:
+                logger.debug("%s 未变化，使用上次下载的内容", url)
+                with self._lock:
+                    self.not_modified += 1
+                    if url in self._validated:
+                        self._validated.move_to_end(url)
+                CACHE_REQUESTS.inc(cache='http', result='hit')
+                return previous.replay(url)
+            CACHE_REQUESTS.inc(cache='http', result='miss')
+            if response.status_code == 200:
+                self._remember(url, response)
+            return response
+
+    def _remember(self, url, response):
+        """保存带校验信息的较小响应，下次304时直接复用；超出总上限时淘汰最久未用的"""
+        entry = None
+        if 'ETag' in response.headers or 'Last-Modified' in response.headers:
+            if len(response.content) <= HTTP_CACHE_MAX_BODY:
+                entry = _Validated(response)
+        with self._lock:
+            stale = self._validated.pop(url, None)
+            if stale is not None:
+                self._validated_bytes -= len(stale.content)
+            if entry is None:
+                return
+            self._validated[url] = entry
+            self._validated_bytes += len(entry.content)
+            while self._validated_bytes > HTTP_CACHE_SIZE:
+                _, evicted = self._validated.popitem(last=False)
+                self._validated_bytes -= len(evicted.content)
+
+    @staticmethod
+    def iter_stream(response, chunk_size):
+        """逐块读取流式响应（stream=True），数据到达后立即产出而不是凑满 chunk_size
+
+        每块的读取耗时计入 fetch 阶段指标。
+        """
+        raw = response.raw
+        if hasattr(raw, 'read1'):
+            read = functools.partial(raw.read1, chunk_size, decode_content=True)
+        else:
+            # 旧版 urllib3 没有 read1
+            read = functools.partial(next, response.iter_content(chunk_size), b'')
+        while True:
+            start = time.perf_counter()
+            data = read()
+            observe_stage('fetch', time.perf_counter() - start)
+            if not data:
+                break
+            yield data
+
+    def close(self):
+        self.session.close()
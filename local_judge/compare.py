@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+"""
+输出比较：在读取学生程序输出的同时逐块与期望输出比较
+
+比较器不保存完整输出，第一次不一致后即停止比较（failed 为 True），
+后续输出只读取丢弃。支持的比较方式：
+
+    strip   去掉首尾空白后完全相同（默认，与以前的 strip() 比较一致）
+    lines   逐行比较，忽略每行行尾空白和末尾空行
+    tokens  按空白分隔逐个单词比较
+    float   按单词比较，两边都是数字时允许误差（绝对误差或相对误差不超过 tolerance）
+
+期望输出可以是字符串，也可以是保存为文件的测试数据（testdata.TestData），
+后者通过 mmap 按块读取，比较过的部分即丢弃，不把完整的期望输出读入内存。
+"""
+
+import math
+
+from .testdata import text_chunks
+
+COMPARE_MODES = ('strip', 'lines', 'tokens', 'float')
+DEFAULT_COMPARE_MODE = 'strip'
+DEFAULT_FLOAT_TOLERANCE = 1e-6
+
+
+class _ExpectedText:
+    """按块读取的期望输出，当前位置之前的内容读过即丢弃"""
+
+    def __init__(self, expected):
+        self._chunks = iter(text_chunks(expected))
+        self._buffer = ''
+        self._pos = 0
+
+    def _fill(self, size):
+        """使缓冲区从当前位置起至少有 size 个字符，期望输出不够长时返回False"""
+        while len(self._buffer) - self._pos < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return False
+            self._buffer = self._buffer[self._pos:] + chunk
+            self._pos = 0
+        return True
+
+    def startswith(self, text):
+        """当前位置是否以 text 开头"""
+        return self._fill(len(text)) and self._buffer.startswith(text, self._pos)
+
+    def advance(self, size):
+        self._pos += size
+
+    def lstrip(self):
+        """跳过开头的空白"""
+        while self._fill(1):
+            rest = self._buffer[self._pos:].lstrip()
+            if rest:
+                self._buffer, self._pos = rest, 0
+                return
+            self._buffer, self._pos = '', 0
+
+    def rest_is_space(self):
+        """剩余内容是否只有空白"""
+        while True:
+            rest = self._buffer[self._pos:]
+            if rest and not rest.isspace():
+                return False
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return True
+            self._buffer, self._pos = chunk, 0
+
+
+def _iter_lines(expected):
+    """逐行产出期望输出（按 \n 分行）"""
+    parts = []
+    for chunk in text_chunks(expected):
+        lines = chunk.split('\n')
+        if len(lines) == 1:
+            parts.append(chunk)
+            continue
+        parts.append(lines[0])
+        yield ''.join(parts)
+        for i in range(1, len(lines) - 1):
+            yield lines[i]
+        parts = [lines[-1]]
+    yield ''.join(parts)
+
+
+def _iter_tokens(expected):
+    """逐个产出期望输出中按空白分隔的单词"""
+    partial = ''
+    for chunk in text_chunks(expected):
+        tokens = (partial + chunk).split()
+        # 块末尾不是空白时最后一个单词可能还没读完
+        partial = tokens.pop() if tokens and not chunk[-1].isspace() else ''
+        yield from tokens
+    if partial:
+        yield partial
+
+
+class StripComparator:
+    """去掉首尾空白后完全相同"""
+
+    def __init__(self, expected):
+        self.expected = _ExpectedText(expected)
+        self.expected.lstrip()
+        self.failed = False
+        self._started = False
+        self._pending = ''      # 尚未确认是否为结尾空白的空白字符
+        self._trailing = False  # 已确认进入结尾空白，之后不能再有非空白字符
+
+    def feed(self, text):
+        if self.failed:
+            return
+        if not self._started:
+            text = text.lstrip()
+            if not text:
+                return
+            self._started = True
+        body = text.rstrip()
+        if body:
+            if self._trailing:
+                self.failed = True
+                return
+            matched = self._pending + body
+            if not self.expected.startswith(matched):
+                self.failed = True
+                return
+            self.expected.advance(len(matched))
+            self._pending = ''
+        if self._trailing:
+            return
+        self._pending += text[len(body):]
+        if not self.expected.startswith(self._pending):
+            # 与期望输出对不上的空白只能是结尾空白
+            self._trailing = True
+            self._pending = ''
+
+    def finish(self):
+        return not self.failed and self.expected.rest_is_space()
+
+
+class LineComparator:
+    """逐行比较，忽略行尾空白和末尾空行"""
+
+    def __init__(self, expected):
+        self.expected = _iter_lines(expected)
+        self.failed = False
+        self._partial = ''
+
+    def _line(self, line):
+        line = line.rstrip()
+        expected_line = next(self.expected, None)
+        if expected_line is None:
+            if line:
+                self.failed = True
+        elif line != expected_line.rstrip():
+            self.failed = True
+
+    def feed(self, text):
+        if self.failed:
+            return
+        lines = (self._partial + text).split('\n')
+        self._partial = lines.pop()
+        for line in lines:
+            self._line(line)
+            if self.failed:
+                return
+
+    def finish(self):
+        if self._partial and not self.failed:
+            self._line(self._partial)
+            self._partial = ''
+        # 实际输出较短时，剩余的期望行必须都是空行
+        return not self.failed and all(not line.rstrip() for line in self.expected)
+
+
+class TokenComparator:
+    """按空白分隔逐个单词比较"""
+
+    def __init__(self, expected):
+        self.expected = _iter_tokens(expected)
+        self.failed = False
+        self._partial = ''
+
+    def _match(self, expected_token, token):
+        return expected_token == token
+
+    def _token(self, token):
+        expected_token = next(self.expected, None)
+        if expected_token is None or not self._match(expected_token, token):
+            self.failed = True
+
+    def feed(self, text):
+        if self.failed or not text:
+            return
+        tokens = (self._partial + text).split()
+        # 块末尾不是空白时最后一个单词可能还没读完
+        self._partial = tokens.pop() if tokens and not text[-1].isspace() else ''
+        for token in tokens:
+            self._token(token)
+            if self.failed:
+                return
+
+    def finish(self):
+        if self._partial and not self.failed:
+            self._token(self._partial)
+            self._partial = ''
+        return not self.failed and next(self.expected, None) is None
+
+
+class FloatComparator(TokenComparator):
+    """按单词比较，数字允许误差"""
+
+    def __init__(self, expected, tolerance=DEFAULT_FLOAT_TOLERANCE):
+        super().__init__(expected)
+        self.tolerance = tolerance
+
+    def _match(self, expected_token, token):
+        if expected_token == token:
+            return True
+        try:
+            expected_value = float(expected_token)
+            value = float(token)
+        except ValueError:
+            return False
+        if math.isnan(expected_value) or math.isnan(value):
+            return False
+        diff = abs(expected_value - value)
+        return diff <= self.tolerance or diff <= self.tolerance * abs(expected_value)
+
+
+class Comparison:
+    """比较方式配置，为每个测试用例创建比较器"""
+
+    def __init__(self, mode=DEFAULT_COMPARE_MODE, tolerance=DEFAULT_FLOAT_TOLERANCE):
+        if mode not in COMPARE_MODES:
+            raise ValueError(f'不支持的比较方式: {mode}')
+        self.mode = mode
+        self.tolerance = tolerance
+
+    def make(self, expected):
+        if self.mode == 'lines':
+            return LineComparator(expected)
+        if self.mode == 'tokens':
+            return TokenComparator(expected)
+        if self.mode == 'float':
+            return FloatComparator(expected, self.tolerance)
+        return StripComparator(expected)
+
+    def compare(self, expected, actual):
+        """比较完整的输出字符串"""
+        comparator = self.make(expected)
+        comparator.feed(actual)
+        return comparator.finish()
+
+    def describe(self):
+        if self.mode == 'float':
+            return f'float(误差{self.tolerance:g})'
+        return self.mode
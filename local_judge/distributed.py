@@ -0,0 +1,769 @@
+# -*- coding: utf-8 -*-
+"""
+分布式测评：协调器把提交拆成工作单元（一份提交 × 一个测试用例），
+其他机器上的工作进程通过 HTTP 领取、执行并交回结果
+
+  - Coordinator：JudgeScheduler 的子类，作为 judge_exam 的调度器使用，
+    去重、结果存储和评分汇总与本地测评完全相同，只是测试用例交给工作进程运行；
+  - JudgeWorker：工作进程，用本机的编译器、预热解释器池和常驻JVM执行工作单元。
+
+协议（JSON，请求头 X-Judge-Token 携带共享令牌）：
+
+    POST /register   {"name"}                           -> {"worker_id", "lease_seconds", "heartbeat_interval", "comparison"}
+    POST /lease      {"worker_id", "max_units", "wait"} -> {"units": [{"unit_id", "source", "question", "index"}], "finished"}
+    POST /heartbeat  {"worker_id"}                      -> {"ok"}
+    POST /complete   {"worker_id", "results": [{"unit_id", "result", "elapsed", "build_time"}]} -> {"accepted"}
+    GET  /blob/<哈希>                                    -> 源码 {"code", "language"} 或题目 {"time_limit", ..., "test_cases"}
+    GET  /testdata/<SHA-256>                             -> 保存为文件的测试数据（原始字节）
+
+题目中保存为文件的输入和期望输出（testdata.TestData）在 test_cases 中写为 {"testData": 哈希, "size": 字节数}，
+工作进程按哈希下载到本机的测试数据目录（已有的不再下载）。
+
+源码和题目的测试用例按内容哈希引用，工作进程各只下载一次（按参考解法校准的时间限制
+由工作进程按与协调器的相对速度换算）；同一份提交的工作单元
+尽量交给同一个工作进程，每个工作进程对每份源码只编译一次。领取的工作单元有租期，
+工作进程定期发送心跳续租；超过租期没有心跳的工作进程视为失联，其工作单元重新排队
+（同一工作单元最多重新排队 MAX_ATTEMPTS 次）。失联后才交回的结果仍然有效，
+同一工作单元只采用第一份结果。评分策略判定不必运行的工作单元在分配时直接跳过；
+会跳过测试用例的策略下，每份提交按顺序每批最多 SUBMISSION_WAVE 个工作单元排队，
+一批全部完成后才加入下一批。
+"""
+
+import os
+import hmac
+import json
+import time
+import socket
+import hashlib
+import logging
+import functools
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import requests
+
+from .calibrate import host_speed, is_calibrated, scale_time_limits
+from .compare import Comparison
+from .metrics import BUSY_WORKERS, QUEUE_DEPTH
+from .sandbox import VERDICT_SE
+from .policy import skipped_result
+from .scheduler import JudgeScheduler, run_test_case, timed_build
+from .testcases import TestCaseEntry
+from .testdata import DATA_CHUNK, TestData
+
+logger = logging.getLogger(__name__)
+
+# 工作单元的租期、工作进程的心跳间隔（秒）
+LEASE_SECONDS = 30
+HEARTBEAT_INTERVAL = 5
+# 没有工作单元时 /lease 最多等待的秒数（长轮询）
+LEASE_WAIT = 5
+# 会跳过测试用例的策略下，每份提交每批排队的工作单元数
+SUBMISSION_WAVE = 4
+# 同一工作单元最多分配的次数，超过后判定为系统错误（避免反复拖垮工作进程的提交无限重试）
+MAX_ATTEMPTS = 3
+# 协调器同时在途的提交数（决定 judge_exam 预先读取多少学生答案）
+DEFAULT_IN_FLIGHT = 256
+# 工作进程保留的构建产物数
+WORKER_ARTIFACT_SLOTS = 256
+# 工作进程连接协调器失败时的重试次数和退避系数
+WORKER_RETRIES = 8
+WORKER_BACKOFF = 0.5
+
+TOKEN_HEADER = 'X-Judge-Token'
+
+
+class UnknownWorker(Exception):
+    """工作进程未注册或已失联"""
+
+
+class _Unit:
+    __slots__ = ('unit_id', 'source', 'question', 'index', 'on_done', 'skip', 'worker', 'attempts', 'done')
+
+    def __init__(self, unit_id, source, question, index, on_done, skip=None):
+        self.unit_id = unit_id
+        self.source = source
+        self.question = question
+        self.index = index
+        self.on_done = on_done
+        self.skip = skip
+        self.worker = None
+        self.attempts = 0
+        self.done = False
+
+
+class _Submission:
+    """一份提交中尚未排队的测试用例（按运行顺序）和本批尚未完成的工作单元数"""
+    __slots__ = ('source', 'question', 'waiting', 'wave_size', 'running', 'on_unit_done', 'skip')
+
+    def __init__(self, source, question, pending, on_unit_done, skip):
+        self.source = source
+        self.question = question
+        self.waiting = iter(pending)
+        self.wave_size = len(pending) if skip is None else SUBMISSION_WAVE
+        self.running = 0
+        self.on_unit_done = on_unit_done
+        self.skip = skip
+
+
+class _WorkerState:
+    __slots__ = ('name', 'deadline', 'units', 'recent')
+
+    def __init__(self, name, deadline):
+        self.name = name
+        self.deadline = deadline
+        self.units = set()
+        # 最近分配给该工作进程的源码，优先分配同一份源码的工作单元
+        self.recent = deque(maxlen=16)
+
+
+def _blob_key(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class _CoordinatorHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _authorized(self):
+        token = self.server.coordinator.token
+        if token and not hmac.compare_digest(self.headers.get(TOKEN_HEADER, ''), token):
+            self._send_json({'error': '令牌错误'}, 403)
+            return False
+        return True
+
+    def _send_json(self, data, status=200):
+        self._send(json.dumps(data, ensure_ascii=False).encode('utf-8'), status)
+
+    def _send(self, body, status=200):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_test_data(self, data):
+        with data.open() as f:
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Content-Length', str(data.size))
+            self.end_headers()
+            self.wfile.flush()
+            self.connection.sendfile(f)
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        if self.path.startswith('/blob/'):
+            blob = self.server.coordinator.blob(self.path[len('/blob/'):])
+            if blob is not None:
+                self._send(blob)
+                return
+        elif self.path.startswith('/testdata/'):
+            data = self.server.coordinator.test_data(self.path[len('/testdata/'):])
+            if data is not None:
+                self._send_test_data(data)
+                return
+        self._send_json({'error': '不存在'}, 404)
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self._send_json({'error': '请求格式错误'}, 400)
+            return
+        coordinator = self.server.coordinator
+        try:
+            if self.path == '/register':
+                response = coordinator.register(request.get('name', ''))
+            elif self.path == '/lease':
+                response = coordinator.lease(request['worker_id'], request.get('max_units', 1),
+                                             request.get('wait', True))
+            elif self.path == '/heartbeat':
+                response = coordinator.heartbeat(request['worker_id'])
+            elif self.path == '/complete':
+                response = coordinator.complete(request.get('worker_id'), request.get('results', []))
+            else:
+                self._send_json({'error': '不存在'}, 404)
+                return
+        except UnknownWorker:
+            self._send_json({'error': '工作进程未注册或已失联'}, 410)
+            return
+        except (KeyError, TypeError) as e:
+            self._send_json({'error': f'请求格式错误: {e}'}, 400)
+            return
+        self._send_json(response)
+
+
+class Coordinator(JudgeScheduler):
+    """分布式测评的协调器，用作 JudgeEngine.judge_exam 的 scheduler"""
+
+    def __init__(self, port=0, host='127.0.0.1', token='', comparison=None, result_store=None, reuse_results=True,
+                 lease_seconds=LEASE_SECONDS, in_flight=DEFAULT_IN_FLIGHT, policy=None):
+        super().__init__(in_flight, 1, comparison=comparison, result_store=result_store, reuse_results=reuse_results,
+                         policy=policy)
+        self.token = token
+        self.lease_seconds = lease_seconds
+        self._cond = threading.Condition()
+        self._units = {}
+        # 源码哈希 -> 待分配的工作单元（按提交顺序）
+        self._pending = OrderedDict()
+        self._pending_count = 0
+        self._workers = {}
+        self._blobs = {}
+        # 测试数据哈希 -> TestData
+        self._test_data = {}
+        # 源码哈希 -> 尚未完成的工作单元数，全部完成后释放源码
+        self._source_refs = {}
+        # 题目条目 -> 哈希，同一份索引只序列化一次
+        self._question_keys = {}
+        self._next_unit = 0
+        self._next_worker = 0
+        self._finished = False
+        self._closed = threading.Event()
+        self._server = ThreadingHTTPServer((host, port), _CoordinatorHandler)
+        self._server.daemon_threads = True
+        self._server.coordinator = self
+        self._threads = [
+            threading.Thread(target=self._server.serve_forever, name='coordinator-http', daemon=True),
+            threading.Thread(target=self._reap, name='coordinator-reaper', daemon=True),
+        ]
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        if host in ('0.0.0.0', ''):
+            host = socket.gethostname()
+        return f'http://{host}:{port}'
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+        logger.info("协调器已启动: %s，等待工作进程连接（python3 -m local_judge worker %s）", self.url, self.url)
+        return self
+
+    def describe(self):
+        with self._cond:
+            return f'分布式测评，协调器 {self.url}，{len(self._workers)} 个工作进程'
+
+    def _store_blob(self, data):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        key = _blob_key(body)
+        self._blobs.setdefault(key, body)
+        return key
+
+    def _wire_value(self, value):
+        """测试用例中的字段值，TestData 改为按哈希引用"""
+        if isinstance(value, TestData):
+            self._test_data[value.digest] = value
+            return {'testData': value.digest, 'size': value.size}
+        return value
+
+    def _question_key(self, entry):
+        cached = self._question_keys.get(id(entry))
+        if cached is None or cached[0] is not entry:
+            question = {
+                'question_id': entry.question_id, 'title': entry.title, 'points': entry.points,
+                'time_limit': entry.time_limit, 'memory_limit': entry.memory_limit,
+                'test_cases': [{name: self._wire_value(value) for name, value in test_case.items()}
+                               for test_case in entry.test_cases]
+            }
+            if is_calibrated(entry):
+                # 工作进程按与本机的相对速度换算校准的时间限制
+                question['host_speed'] = host_speed()
+            key = self._store_blob(question)
+            cached = self._question_keys[id(entry)] = (entry, key)
+        return cached[1]
+
+    def dispatch(self, code, language, entry, pending, on_unit_done, on_error, skip=None):
+        """把尚无结果的测试用例作为工作单元排队，由工作进程领取（指定 skip 时见 SUBMISSION_WAVE）"""
+        try:
+            with self._cond:
+                question = self._question_key(entry)
+                source = self._store_blob({'code': code, 'language': language})
+                submission = _Submission(source, question, pending, on_unit_done, skip)
+                self._source_refs[source] = self._source_refs.get(source, 0) + len(pending)
+        except Exception as e:
+            on_error(e)
+            return
+        self._queue_wave(submission)
+
+    def _queue_wave(self, submission):
+        """把提交的下一批测试用例作为工作单元排队，已不必运行的直接记为跳过"""
+        skipped = []
+        with self._cond:
+            wave = 0
+            for index in submission.waiting:
+                if submission.skip is not None and submission.skip(index):
+                    self._release_source(submission.source)
+                    skipped.append(index)
+                    continue
+                unit = _Unit(self._next_unit, submission.source, submission.question, index,
+                             functools.partial(self._unit_done, submission, index), submission.skip)
+                self._next_unit += 1
+                self._units[unit.unit_id] = unit
+                self._pending.setdefault(submission.source, deque()).append(unit)
+                wave += 1
+                if wave >= submission.wave_size:
+                    break
+            submission.running = wave
+            if wave:
+                self._pending_count += wave
+                QUEUE_DEPTH.set(self._pending_count, queue='distributed')
+                self._cond.notify_all()
+        for index in skipped:
+            submission.on_unit_done(index, skipped_result())
+
+    def _unit_done(self, submission, index, run_result, build_time=0.0):
+        # 先记录结果（失败时 skip 随之变化），本批全部完成后再加入下一批
+        submission.on_unit_done(index, run_result, build_time)
+        with self._cond:
+            submission.running -= 1
+            wave_done = submission.running == 0
+        if wave_done:
+            self._queue_wave(submission)
+
+    def blob(self, key):
+        with self._cond:
+            return self._blobs.get(key)
+
+    def test_data(self, digest):
+        with self._cond:
+            return self._test_data.get(digest)
+
+    def register(self, name):
+        with self._cond:
+            worker_id = f'w{self._next_worker}'
+            self._next_worker += 1
+            self._workers[worker_id] = _WorkerState(name or worker_id, time.monotonic() + self.lease_seconds)
+            BUSY_WORKERS.set(len(self._workers), pool='remote')
+        logger.info("工作进程 %s（%s）已连接", worker_id, name)
+        return {
+            'worker_id': worker_id,
+            'lease_seconds': self.lease_seconds,
+            'heartbeat_interval': min(HEARTBEAT_INTERVAL, self.lease_seconds / 3),
+            'comparison': {'mode': self.comparison.mode, 'tolerance': self.comparison.tolerance},
+        }
+
+    def _take(self, source, worker_id, worker, limit, units, skipped):
+        queue = self._pending.get(source)
+        while queue and len(units) < limit:
+            unit = queue.popleft()
+            if unit.done:
+                continue
+            if unit.skip is not None and unit.skip(unit.index):
+                unit.done = True
+                del self._units[unit.unit_id]
+                self._release_source(unit.source)
+                self._pending_count -= 1
+                skipped.append(unit)
+                continue
+            unit.worker = worker_id
+            unit.attempts += 1
+            worker.units.add(unit.unit_id)
+            self._pending_count -= 1
+            units.append(unit)
+        if queue is not None and not queue:
+            del self._pending[source]
+        if units and (not worker.recent or worker.recent[-1] != source):
+            worker.recent.append(source)
+
+    def lease(self, worker_id, max_units=1, wait=True):
+        """分配至多 max_units 个工作单元；没有待分配的工作单元时最多等待 LEASE_WAIT 秒"""
+        limit = max(1, int(max_units))
+        deadline = time.monotonic() + (LEASE_WAIT if wait else 0)
+        with self._cond:
+            while True:
+                worker = self._workers.get(worker_id)
+                if worker is None:
+                    raise UnknownWorker(worker_id)
+                worker.deadline = time.monotonic() + self.lease_seconds
+                if self._pending or self._finished:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            units = []
+            skipped = []
+            # 优先分配该工作进程已经编译过的源码
+            for source in reversed(worker.recent):
+                if source in self._pending:
+                    self._take(source, worker_id, worker, limit, units, skipped)
+                if len(units) >= limit:
+                    break
+            while self._pending and len(units) < limit:
+                self._take(next(iter(self._pending)), worker_id, worker, limit, units, skipped)
+            QUEUE_DEPTH.set(self._pending_count, queue='distributed')
+            finished = self._finished and not self._pending and not units
+        for unit in skipped:
+            unit.on_done(skipped_result())
+        return {
+            'units': [{'unit_id': unit.unit_id, 'source': unit.source, 'question': unit.question,
+                       'index': unit.index} for unit in units],
+            'finished': finished,
+        }
+
+    def heartbeat(self, worker_id):
+        with self._cond:
+            worker = self._workers.get(worker_id)
+            if worker is None:
+                raise UnknownWorker(worker_id)
+            worker.deadline = time.monotonic() + self.lease_seconds
+        return {'ok': True}
+
+    def complete(self, worker_id, results):
+        """接收工作单元的结果；同一工作单元只采用第一份结果"""
+        accepted = []
+        with self._cond:
+            for item in results:
+                unit = self._units.pop(item['unit_id'], None)
+                if unit is None or unit.done:
+                    continue
+                unit.done = True
+                if unit.worker is None:
+                    # 失联后才送达的结果：工作单元已重新排队，从待分配队列中移除
+                    self._unqueue(unit)
+                owner = self._workers.get(unit.worker)
+                if owner is not None:
+                    owner.units.discard(unit.unit_id)
+                self._release_source(unit.source)
+                accepted.append((unit, item))
+            QUEUE_DEPTH.set(self._pending_count, queue='distributed')
+        for unit, item in accepted:
+            unit.on_done((item['result'], item.get('elapsed', 0)), item.get('build_time', 0))
+        return {'accepted': len(accepted)}
+
+    def _unqueue(self, unit):
+        queue = self._pending.get(unit.source)
+        if queue is None or unit not in queue:
+            return
+        queue.remove(unit)
+        self._pending_count -= 1
+        if not queue:
+            del self._pending[unit.source]
+
+    def _release_source(self, source):
+        count = self._source_refs.get(source, 0) - 1
+        if count > 0:
+            self._source_refs[source] = count
+        else:
+            self._source_refs.pop(source, None)
+            self._blobs.pop(source, None)
+
+    def _reap(self):
+        """定期检查失联的工作进程，把其工作单元重新排队"""
+        while not self._closed.wait(1):
+            failed = []
+            with self._cond:
+                now = time.monotonic()
+                for worker_id, worker in list(self._workers.items()):
+                    if worker.deadline >= now:
+                        continue
+                    del self._workers[worker_id]
+                    requeued = 0
+                    for unit_id in worker.units:
+                        unit = self._units.get(unit_id)
+                        if unit is None or unit.done:
+                            continue
+                        unit.worker = None
+                        if unit.attempts >= MAX_ATTEMPTS:
+                            unit.done = True
+                            del self._units[unit_id]
+                            self._release_source(unit.source)
+                            failed.append(unit)
+                            continue
+                        self._pending.setdefault(unit.source, deque()).appendleft(unit)
+                        self._pending.move_to_end(unit.source, last=False)
+                        self._pending_count += 1
+                        requeued += 1
+                    logger.warning("工作进程 %s（%s）失去联系，%d 个工作单元重新排队", worker_id, worker.name, requeued)
+                    BUSY_WORKERS.set(len(self._workers), pool='remote')
+                    QUEUE_DEPTH.set(self._pending_count, queue='distributed')
+                    self._cond.notify_all()
+            for unit in failed:
+                unit.on_done(({'success': False, 'verdict': VERDICT_SE,
+                               'error': f'执行该测试用例的工作进程{MAX_ATTEMPTS}次失去联系'}, 0))
+
+    def shutdown(self, wait=True):
+        """一个考试测评结束：只提交结果存储，协调器继续为后续考试服务"""
+        if self.result_store is not None:
+            self.result_store.flush()
+
+    def close(self, grace=HEARTBEAT_INTERVAL):
+        """通知工作进程测评结束并停止服务"""
+        with self._cond:
+            self._finished = True
+            self._cond.notify_all()
+        # 留出时间让等待中的工作进程收到结束通知
+        end = time.monotonic() + grace
+        while time.monotonic() < end:
+            with self._cond:
+                if not self._workers:
+                    break
+            time.sleep(0.1)
+        self._closed.set()
+        self._server.shutdown()
+        self._server.server_close()
+        super().shutdown(wait=False)
+
+
+class WorkerError(Exception):
+    """工作进程无法与协调器通信"""
+
+
+class JudgeWorker:
+    """分布式测评的工作进程
+
+    engine 为本机的 JudgeEngine，提供编译产物缓存、预编译头和常驻运行器。
+    """
+
+    def __init__(self, url, engine, workers=None, token='', name=None, retries=WORKER_RETRIES,
+                 backoff=WORKER_BACKOFF):
+        self.url = url.rstrip('/')
+        self.engine = engine
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}'
+        self.retries = retries
+        self.backoff = backoff
+        self.session = requests.Session()
+        if token:
+            self.session.headers[TOKEN_HEADER] = token
+        self.worker_id = None
+        self.comparison = None
+        self.heartbeat_interval = HEARTBEAT_INTERVAL
+        self.completed = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._sources = {}
+        self._questions = {}
+        self._fetch_locks = {}
+        # 源码哈希 -> [构建产物, 使用中的工作单元数, 构建耗时（只报告一次）]，按最近使用排序
+        self._artifacts = OrderedDict()
+        self._build_locks = {}
+        self._results = []
+        self._in_flight = 0
+
+    def _request(self, method, path, **kwargs):
+        for attempt in range(self.retries + 1):
+            try:
+                response = self.session.request(method, f'{self.url}{path}', timeout=LEASE_WAIT + 30, **kwargs)
+            except requests.RequestException as e:
+                error = e
+            else:
+                if response.status_code == 410:
+                    raise UnknownWorker(self.worker_id)
+                if response.status_code == 200:
+                    return response.json()
+                if response.status_code < 500:
+                    raise WorkerError(f"协调器返回错误: {response.status_code} {response.text[:200]}")
+                error = response.status_code
+            if attempt < self.retries and not self._stop.is_set():
+                time.sleep(self.backoff * (2 ** attempt))
+        raise WorkerError(f"无法连接到协调器 {self.url}: {error}")
+
+    def _register(self):
+        data = self._request('POST', '/register', json={'name': self.name})
+        self.worker_id = data['worker_id']
+        self.heartbeat_interval = data.get('heartbeat_interval', HEARTBEAT_INTERVAL)
+        comparison = data.get('comparison') or {}
+        self.comparison = Comparison(comparison.get('mode', 'strip'), comparison.get('tolerance', 1e-6))
+        logger.info("已连接到协调器 %s，工作进程ID %s，%d 个运行进程", self.url, self.worker_id, self.workers)
+
+    def _fetch(self, cache, key, parse):
+        """下载源码或题目（每个哈希只下载一次）"""
+        with self._lock:
+            if key in cache:
+                return cache[key]
+            lock = self._fetch_locks.setdefault(key, threading.Lock())
+        with lock:
+            with self._lock:
+                if key in cache:
+                    return cache[key]
+            value = parse(self._request('GET', f'/blob/{key}'))
+            with self._lock:
+                cache[key] = value
+                self._fetch_locks.pop(key, None)
+            return value
+
+    def _download_test_data(self, digest, size):
+        """下载测试数据：保存到引擎的测试数据目录（已有的直接使用），没有目录时读入内存"""
+        store = self.engine.test_data
+        if store is not None:
+            data = store.get(digest)
+            if data is not None and data.size == size:
+                return data
+        for attempt in range(self.retries + 1):
+            try:
+                with self.session.get(f'{self.url}/testdata/{digest}', stream=True, timeout=LEASE_WAIT + 30) as response:
+                    if response.status_code != 200:
+                        raise WorkerError(f"协调器返回错误: {response.status_code}")
+                    if store is not None:
+                        return store.put_stream(response.iter_content(DATA_CHUNK), digest)
+                    return response.content.decode('utf-8', 'surrogatepass')
+            except requests.RequestException as e:
+                error = e
+            if attempt < self.retries and not self._stop.is_set():
+                time.sleep(self.backoff * (2 ** attempt))
+        raise WorkerError(f"无法从协调器下载测试数据 {digest}: {error}")
+
+    def _parse_test_case(self, test_case):
+        return {name: self._download_test_data(value['testData'], value['size'])
+                if isinstance(value, dict) and 'testData' in value else value
+                for name, value in test_case.items()}
+
+    def _parse_question(self, data):
+        test_cases = tuple(self._parse_test_case(test_case) for test_case in data.get('test_cases', []))
+        entry = TestCaseEntry(data.get('question_id'), data.get('title', ''), test_cases,
+                              data.get('points', 0), data['time_limit'], data['memory_limit'], '')
+        if data.get('host_speed'):
+            entry = scale_time_limits(entry, data['host_speed'])
+        return entry
+
+    def _acquire_artifact(self, source):
+        """取得源码的构建产物（每份源码只构建一次），返回 (构建产物, 本次应报告的构建耗时)"""
+        with self._lock:
+            lock = self._build_locks.setdefault(source, threading.Lock())
+        with lock:
+            with self._lock:
+                slot = self._artifacts.get(source)
+                if slot is not None:
+                    slot[1] += 1
+                    self._artifacts.move_to_end(source)
+                    build_time, slot[2] = slot[2], 0
+                    return slot[0], build_time
+            code, language = self._fetch(self._sources, source, lambda data: (data['code'], data['language']))
+            artifact, build_time = timed_build(code, language, self.engine.artifact_cache,
+                                               self.engine.precompiled_headers)
+            with self._lock:
+                self._artifacts[source] = [artifact, 1, 0]
+                self._evict_artifacts()
+            return artifact, build_time
+
+    def _release_artifact(self, source):
+        with self._lock:
+            slot = self._artifacts.get(source)
+            if slot is not None:
+                slot[1] -= 1
+
+    def _evict_artifacts(self):
+        for source in list(self._artifacts):
+            if len(self._artifacts) <= WORKER_ARTIFACT_SLOTS:
+                break
+            artifact, users, _ = self._artifacts[source]
+            if users == 0:
+                del self._artifacts[source]
+                self._build_locks.pop(source, None)
+                self._sources.pop(source, None)
+                artifact.cleanup()
+
+    def _execute(self, unit):
+        try:
+            entry = self._fetch(self._questions, unit['question'], self._parse_question)
+            artifact, build_time = self._acquire_artifact(unit['source'])
+            try:
+                BUSY_WORKERS.inc(pool='run')
+                try:
+                    result, elapsed = run_test_case(artifact, entry.test_cases[unit['index']], entry,
+                                                    self.engine.get_runners(self.workers), self.comparison)
+                finally:
+                    BUSY_WORKERS.dec(pool='run')
+            finally:
+                self._release_artifact(unit['source'])
+        except Exception as e:
+            logger.exception("执行工作单元 %s 时出错", unit['unit_id'])
+            result, elapsed, build_time = {'success': False, 'verdict': VERDICT_SE, 'error': str(e)}, 0, 0
+        with self._lock:
+            self._results.append({'unit_id': unit['unit_id'], 'result': result, 'elapsed': elapsed,
+                                  'build_time': build_time})
+            self._in_flight -= 1
+        self._wake.set()
+
+    def _heartbeat(self):
+        while not self._stop.wait(self.heartbeat_interval):
+            try:
+                if self.worker_id is not None:
+                    self._request('POST', '/heartbeat', json={'worker_id': self.worker_id})
+            except UnknownWorker:
+                # 已被视为失联：由主循环重新注册
+                self.worker_id = None
+            except WorkerError as e:
+                logger.warning("%s", e)
+
+    def _flush_results(self):
+        """把已完成的结果发送给协调器；发送失败时放回待发送列表，返回是否发送成功"""
+        with self._lock:
+            results, self._results = self._results, []
+        if not results:
+            return True
+        try:
+            self._request('POST', '/complete', json={'worker_id': self.worker_id, 'results': results})
+        except UnknownWorker:
+            # 已被视为失联：这些工作单元已重新排队，结果不再需要
+            self.worker_id = None
+            return True
+        except WorkerError as e:
+            with self._lock:
+                self._results[:0] = results
+            logger.warning("发送 %d 个结果失败，稍后重试: %s", len(results), e)
+            return False
+        self.completed += len(results)
+        return True
+
+    def run(self):
+        """领取并执行工作单元，直到协调器通知测评结束"""
+        self._register()
+        heartbeat = threading.Thread(target=self._heartbeat, name='worker-heartbeat', daemon=True)
+        heartbeat.start()
+        pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='worker-run')
+        failures = 0
+        try:
+            while not self._stop.is_set():
+                if not self._flush_results():
+                    failures += 1
+                    self._stop.wait(self.backoff * (2 ** min(failures, 6)))
+                    continue
+                failures = 0
+                with self._lock:
+                    in_flight = self._in_flight
+                # 保持本地最多 2 倍运行进程数的工作单元，运行时提前领取下一批
+                if in_flight <= self.workers:
+                    try:
+                        if self.worker_id is None:
+                            self._register()
+                        data = self._request('POST', '/lease', json={
+                            'worker_id': self.worker_id, 'max_units': 2 * self.workers - in_flight,
+                            'wait': in_flight == 0})
+                    except UnknownWorker:
+                        self.worker_id = None
+                        continue
+                    if data['finished'] and in_flight == 0:
+                        break
+                    with self._lock:
+                        self._in_flight += len(data['units'])
+                    for unit in data['units']:
+                        pool.submit(self._execute, unit)
+                    if data['units']:
+                        continue
+                self._wake.wait(0.2)
+                self._wake.clear()
+        finally:
+            self._stop.set()
+            pool.shutdown(wait=True)
+            if not self._flush_results():
+                logger.error("%d 个结果未能发送给协调器", len(self._results))
+            for artifact, _, _ in self._artifacts.values():
+                artifact.cleanup()
+            self._artifacts.clear()
+        logger.info("测评结束，本工作进程共完成 %d 个工作单元", self.completed)
+        return self.completed
+
+    def stop(self):
+        self._stop.set()
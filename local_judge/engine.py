@@ -0,0 +1,782 @@
+# -*- coding: utf-8 -*-
+"""
+测评引擎：登录、同步考试、加载考试详情和批量测评
+
+不依赖tkinter，图形界面和命令行共用同一套逻辑。
+"""
+
+import os
+import json
+import queue
+import logging
+import threading
+import time
+import functools
+from collections import namedtuple
+
+from .client import ApiClient
+from .jsonstream import iter_array_items, JSONStreamError
+from .build import ArtifactCache, PrecompiledHeaders, build_program, run_program
+from .pyrunner import PythonRunnerPool
+from .javarunner import JavaRunnerPool
+from .compare import Comparison
+from .policy import ScoringPolicy, skipped_result
+from .similarity import SimilarityDetector
+from .testcases import TestCaseIndex, TestCasePool
+from .testdata import TestDataStore
+from .resultstore import ResultStore
+from .scores import ScoreUploader, ScoreUploadError
+from .metrics import QUEUE_DEPTH, span, observe_stage
+from .snapshot import SnapshotWriter, ExamSnapshot, SnapshotError
+from .scheduler import (
+    JudgeScheduler, run_test_case, timed_build, no_test_cases_result,
+    evaluation_error_result, summarize_evaluation
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SERVER_URL = "https://exam.mymarkdown.fun"
+
+# 一个待测评任务：某个学生对某道编程题的提交，code为空表示未作答
+JudgeTask = namedtuple('JudgeTask', 'student student_id question_id question language code')
+
+
+class JudgeError(Exception):
+    """可直接展示给用户的测评流程错误"""
+
+
+def parse_json(response):
+    """解析JSON响应，耗时计入 parse 阶段指标"""
+    with span('parse'):
+        return response.json()
+
+
+def iter_timed_items(chunks, parse):
+    """parse(chunks) 逐个产出解析结果，每个结果的解析耗时（不含读取数据块的时间）计入 parse 阶段指标"""
+    fetch_time = [0.0]
+
+    def timed_chunks():
+        iterator = iter(chunks)
+        while True:
+            start = time.perf_counter()
+            data = next(iterator, None)
+            fetch_time[0] += time.perf_counter() - start
+            if data is None:
+                return
+            yield data
+
+    items = parse(timed_chunks())
+    done = object()
+    while True:
+        fetch_time[0] = 0.0
+        start = time.perf_counter()
+        item = next(items, done)
+        observe_stage('parse', time.perf_counter() - start - fetch_time[0])
+        if item is done:
+            return
+        yield item
+
+
+def parse_exam_list(response_data):
+    """解析考试列表接口的返回数据"""
+    if isinstance(response_data, dict) and 'exams' in response_data:
+        # API返回格式: { exams: [...] }
+        exams_list = response_data['exams']
+        if not isinstance(exams_list, list):
+            logger.debug("exams字段内容: %s", exams_list)
+            raise JudgeError(f"exams字段不是列表格式: {type(exams_list)}")
+        return exams_list
+    if isinstance(response_data, list):
+        # 兼容直接返回数组的情况
+        return response_data
+    logger.debug("API返回数据: %s", response_data)
+    raise JudgeError(f"服务器返回数据格式错误，期望包含exams字段的对象或数组，但收到: {type(response_data)}")
+
+
+def exam_label(exam):
+    """考试在下拉框和日志中的显示名称，数据格式异常时返回None"""
+    if isinstance(exam, dict) and 'title' in exam and '_id' in exam:
+        return f"{exam['title']} (ID: {exam['_id']})"
+    logger.warning("考试数据格式异常: %s", exam)
+    return None
+
+
+def programming_questions_of(exam_details):
+    """考试中的编程题"""
+    return [q for q in exam_details.get('questions', []) if q.get('type') == 'PROGRAMMING']
+
+
+# 流式测评时已提交但尚未输出结果的任务数上限（每个运行进程），
+# 超过后暂停读取学生答案，内存占用不随学生人数增长
+PIPELINE_DEPTH_PER_WORKER = 16
+
+# 流式下载学生答案时每次读取的字节数
+RESULTS_CHUNK_SIZE = 64 * 1024
+
+
+def collect_tasks(exam_details, results_data):
+    """按学生、题目的顺序整理待测评的提交"""
+    return list(iter_tasks(exam_details, results_data))
+
+
+def iter_tasks(exam_details, results_data):
+    """按学生、题目的顺序逐个产出待测评的提交，results_data 可以是流式产出的迭代器"""
+    programming_questions = programming_questions_of(exam_details)
+    for result in results_data:
+        # 根据API返回的数据结构调整字段访问
+        if 'student' in result and isinstance(result['student'], dict):
+            student_name = result['student'].get('name', '未知学生')
+            student_id = result['student'].get('id', '')
+        else:
+            student_name = result.get('studentName', '未知学生')
+            student_id = result.get('studentId', '')
+
+        answers = result.get('answers', {})
+        # 确保answers是字典类型
+        if isinstance(answers, str):
+            try:
+                answers = json.loads(answers)
+            except ValueError:
+                answers = {}
+        elif not isinstance(answers, dict):
+            answers = {}
+
+        for question in programming_questions:
+            question_id = question['_id']
+            code = ''
+
+            if question_id in answers:
+                answer_data = answers[question_id]
+
+                # 确保answer_data是字典类型
+                if isinstance(answer_data, str):
+                    # 如果是字符串，尝试解析为JSON
+                    try:
+                        answer_data = json.loads(answer_data)
+                    except ValueError:
+                        # 解析失败，将字符串作为代码内容
+                        answer_data = {'code': answer_data, 'language': 'python'}
+
+                # 不是字典类型的答案跳过
+                if isinstance(answer_data, dict):
+                    code = answer_data.get('code', '') or ''
+
+            yield JudgeTask(
+                student=student_name,
+                student_id=str(student_id),
+                question_id=question_id,
+                question=question.get('title', '未知题目'),
+                language=exam_details.get('language', 'cpp'),
+                code=code
+            )
+
+
+class _ExamRun:
+    """批量测评中的一场考试"""
+
+    __slots__ = ('exam', 'details', 'index', 'similarity', 'start_time', 'completed', 'judged', 'error', 'summary')
+
+    def __init__(self, exam):
+        self.exam = exam
+        self.details = exam['details']
+        self.index = None
+        self.similarity = None
+        self.start_time = time.time()
+        self.completed = 0
+        self.judged = 0
+        self.error = None
+        self.summary = None
+
+    @property
+    def title(self):
+        return self.details.get('title', self.exam.get('_id'))
+
+
+class JudgeEngine:
+    """测评引擎
+
+    保存服务器地址、登录凭据、已同步的考试和测试用例索引，
+    所有方法出错时抛出JudgeError，由调用方决定如何展示。
+    """
+
+    def __init__(self, server_url=DEFAULT_SERVER_URL, artifact_cache=None, python_zygote=True, java_runner=True,
+                 comparison=None, result_store=True, precompiled_headers=True, scoring=None, calibrator=None,
+                 similarity=None, test_data=True):
+        self.server_url = server_url
+        self.auth_token = ""  # 存储登录后的token
+        self.client = ApiClient()
+        self.exams_data = []
+        self.test_case_index = TestCaseIndex()
+        self.artifact_cache = artifact_cache if artifact_cache is not None else ArtifactCache()
+        # True 表示使用默认目录的预编译头，False 表示不使用
+        if precompiled_headers is True:
+            precompiled_headers = PrecompiledHeaders()
+        self.precompiled_headers = precompiled_headers or None
+        self.python_zygote = python_zygote
+        self.java_runner = java_runner
+        self.comparison = comparison or Comparison()
+        # 评分策略（policy.ScoringPolicy），其中的运行统计在多次测评之间保留
+        self.scoring = scoring or ScoringPolicy()
+        # 按参考解法校准时间限制（calibrate.TimeLimitCalibrator），为None时使用题目的时间限制
+        self.calibrator = calibrator
+        # 查重（similarity.SimilarityDetector），True 表示使用默认阈值，为None时不查重；
+        # 代码的切分结果在多次测评之间保留
+        self.similarity = SimilarityDetector() if similarity is True else similarity
+        # 较大的测试数据保存为文件（testdata.TestDataStore），True 表示使用默认目录，False 表示全部保存在内存中
+        self.test_data = TestDataStore() if test_data is True else (test_data or None)
+        # 各测试用例索引共用的题目条目，重新加载或批量测评多场考试时相同的题目只解析一次
+        self.test_case_pool = TestCasePool(self.test_data)
+        self.runners = {}
+        # True 表示首次批量测评时打开默认位置的结果存储，False 表示不使用
+        self._result_store = result_store
+
+    @property
+    def result_store(self):
+        """持久化的测评结果存储（resultstore.ResultStore），未启用时为None"""
+        if self._result_store is True:
+            self._result_store = ResultStore()
+        return self._result_store if isinstance(self._result_store, ResultStore) else None
+
+    def get_runners(self, workers=None):
+        """按需创建常驻运行器（Python预热解释器池、Java常驻JVM池），在多次测评之间复用"""
+        size = max(1, workers or os.cpu_count() or 1)
+        pools = []
+        if self.python_zygote:
+            pools.append(('python', PythonRunnerPool))
+        if self.java_runner:
+            pools.append(('java', JavaRunnerPool))
+        for language, pool_class in pools:
+            pool = self.runners.get(language)
+            if pool is None:
+                self.runners[language] = pool_class(size)
+            elif pool.size < size:
+                pool.size = size
+        return self.runners
+
+    def close(self):
+        """关闭常驻运行器、结果存储和HTTP连接"""
+        for runner in self.runners.values():
+            runner.close()
+        self.runners = {}
+        if isinstance(self._result_store, ResultStore):
+            self._result_store.close()
+            self._result_store = False
+        self.client.close()
+
+    def _url(self, path):
+        return f"{self.server_url.rstrip('/')}{path}"
+
+    def _require_login(self):
+        if not self.auth_token:
+            raise JudgeError("请先登录")
+
+    def login(self, email, password):
+        """用户登录"""
+        if not email or not password:
+            raise JudgeError("请输入邮箱和密码")
+
+        response = self.client.post(self._url('/api/auth/login'), json={
+            "email": email,
+            "password": password
+        }, timeout=10)
+        if response.status_code != 200:
+            try:
+                error_msg = response.json().get('error', '登录失败')
+            except ValueError:
+                error_msg = f"登录失败: {response.status_code}"
+            raise JudgeError(error_msg)
+
+        # 从响应的cookies中获取token
+        if 'token' not in response.cookies:
+            raise JudgeError("未能获取认证token")
+        self.auth_token = response.cookies['token']
+        self.client.set_token(self.auth_token)
+
+    def current_user(self):
+        """获取当前登录用户，用于测试连接"""
+        response = self.client.get(self._url('/api/auth/me'), timeout=10)
+        if response.status_code != 200:
+            raise JudgeError(f"服务器返回错误: {response.status_code}")
+        return response.json()
+
+    def sync_exams(self):
+        """同步考试列表"""
+        self._require_login()
+        response = self.client.get(self._url('/api/teacher/exams'), timeout=30, conditional=True)
+        if response.status_code != 200:
+            raise JudgeError(f"服务器返回错误: {response.status_code}")
+        self.exams_data = parse_exam_list(parse_json(response))
+        return self.exams_data
+
+    def find_exam(self, exam_id):
+        """在已同步的考试中按ID查找，找不到时抛出JudgeError"""
+        for exam in self.exams_data:
+            if isinstance(exam, dict) and str(exam.get('_id')) == str(exam_id):
+                return exam
+        raise JudgeError(f"找不到考试: {exam_id}")
+
+    def fetch_question_bank(self):
+        """获取教师题库"""
+        self._require_login()
+        response = self.client.get(self._url('/api/teacher/questions/'), timeout=30, conditional=True)
+        if response.status_code != 200:
+            raise JudgeError(f"无法获取题库: {response.status_code}")
+        return parse_json(response).get('questions', [])
+
+    def rebuild_test_case_index(self, questions=None):
+        """重新从题库构建测试用例索引"""
+        if questions is None:
+            questions = self.fetch_question_bank()
+        self.test_case_index = TestCaseIndex(questions, pool=self.test_case_pool)
+        return self.test_case_index
+
+    def test_case_index_is_stale(self):
+        """与服务器题库比较，返回 (是否过期, 最新题库)"""
+        questions = self.fetch_question_bank()
+        return self.test_case_index.is_stale(questions), questions
+
+    def find_exams(self, exam_ids=None):
+        """按ID查找已同步的考试，exam_ids 为None时返回全部考试（跳过格式异常的）"""
+        if exam_ids is None:
+            return [exam for exam in self.exams_data if exam_label(exam)]
+        return [self.find_exam(exam_id) for exam_id in exam_ids]
+
+    def load_exam(self, exam, stream_results=False, rebuild_index=True):
+        """加载考试详情和学生答案，并一次性构建测试用例索引
+
+        stream_results 为True时不下载学生答案，测评时由 judge_exam
+        边下载边测评（见 iter_exam_results）。rebuild_index 为False时不重建索引（见 load_exams）。
+        """
+        self._require_login()
+        exam_id = exam['_id']
+
+        # 获取考试详情
+        response = self.client.get(self._url(f'/api/teacher/exams/{exam_id}'), timeout=30, conditional=True)
+        if response.status_code != 200:
+            raise JudgeError(f"无法获取考试详情: {response.status_code}")
+        response_data = parse_json(response)
+
+        # 验证返回的数据格式
+        if isinstance(response_data, dict) and 'exam' in response_data:
+            exam_details = response_data['exam']
+        else:
+            # 兼容直接返回考试对象的情况
+            exam_details = response_data
+
+        # 验证考试详情数据格式
+        if not isinstance(exam_details, dict) or 'title' not in exam_details:
+            logger.debug("考试详情数据: %s", exam_details)
+            raise JudgeError("考试详情数据格式错误")
+
+        exam['details'] = exam_details
+        exam.pop('results', None)
+        exam.pop('snapshot', None)
+        if not stream_results:
+            exam['results'] = self.fetch_exam_results(exam_id)
+
+        exam.pop('test_case_index', None)
+        if rebuild_index:
+            # 一次性构建测试用例索引，测评时不再逐题请求题库
+            self.rebuild_test_case_index()
+        return exam
+
+    def load_exams(self, exams, on_loaded=None):
+        """加载多场考试的详情（学生答案在测评时边下载边测评），题库只获取一次，返回 exams
+
+        on_loaded(exam) 在每场考试加载后调用。
+        """
+        for exam in exams:
+            self.load_exam(exam, stream_results=True, rebuild_index=False)
+            if on_loaded:
+                on_loaded(exam)
+        if exams:
+            self.rebuild_test_case_index()
+        return exams
+
+    def fetch_exam_results(self, exam_id):
+        """下载全部学生答案"""
+        results_response = self.client.get(self._url(f'/api/teacher/exams/{exam_id}/results'), timeout=30,
+                                           conditional=True)
+        if results_response.status_code != 200:
+            raise JudgeError("无法获取学生答案数据")
+        results_response_data = parse_json(results_response)
+
+        # 验证学生答案数据格式
+        if isinstance(results_response_data, dict) and 'exam' in results_response_data:
+            results_data = results_response_data['exam'].get('examResults', [])
+        else:
+            # 兼容直接返回数组的情况
+            results_data = results_response_data if isinstance(results_response_data, list) else []
+        return results_data
+
+    def iter_exam_results(self, exam_id):
+        """流式下载学生答案，每解析出 examResults 中的一个学生就立即产出"""
+        self._require_login()
+        response = self.client.get(self._url(f'/api/teacher/exams/{exam_id}/results'), timeout=30, stream=True)
+        try:
+            if response.status_code != 200:
+                raise JudgeError("无法获取学生答案数据")
+            yield from iter_timed_items(self.client.iter_stream(response, RESULTS_CHUNK_SIZE),
+                                        functools.partial(iter_array_items, key='examResults'))
+        except JSONStreamError as e:
+            raise JudgeError(f"学生答案数据格式错误: {e}")
+        finally:
+            response.close()
+
+    def save_snapshot(self, exam, path):
+        """把已加载的考试、编程题（含测试用例）和全部学生答案保存为离线快照，返回学生数
+
+        学生答案边下载边写入，不在内存中保存完整的答案列表。
+        """
+        if 'details' not in exam:
+            raise JudgeError("请先加载考试详情")
+        exam_details = exam['details']
+        programming_questions = programming_questions_of(exam_details)
+        if not programming_questions:
+            raise JudgeError("该考试没有编程题")
+
+        if exam.get('snapshot') is not None:
+            raise JudgeError(f"该考试已是离线快照: {exam['snapshot'].path}")
+
+        # 题库中找不到的题目使用考试详情中的题目数据
+        questions = {q['_id']: q for q in programming_questions}
+        for question in self.fetch_question_bank():
+            if isinstance(question, dict) and question.get('_id') in questions:
+                questions[question['_id']] = question
+        results = exam.get('results')
+        if results is None:
+            results = self.iter_exam_results(exam['_id'])
+
+        writer = SnapshotWriter(path, exam['_id'], exam_details, list(questions.values()), self.server_url)
+        try:
+            for result in results:
+                tasks = list(iter_tasks(exam_details, [result]))
+                data = {k: v for k, v in result.items() if k != 'answers'}
+                writer.add_student(tasks[0].student_id, tasks[0].student, data, tasks)
+            return writer.commit()
+        except Exception:
+            writer.abort()
+            raise
+
+    def open_snapshot(self, path):
+        """打开离线快照，返回可直接测评的考试（不需要登录），并用快照中的题目构建测试用例索引"""
+        try:
+            snapshot = ExamSnapshot(path)
+            exam_details = snapshot.exam_details()
+        except SnapshotError as e:
+            raise JudgeError(str(e))
+        question_ids = [q['_id'] for q in programming_questions_of(exam_details)]
+        # 只读取考试中编程题的测试用例；批量测评多个快照时各自使用自己的索引
+        self.test_case_index = TestCaseIndex(snapshot.questions(question_ids, self.test_data),
+                                             pool=self.test_case_pool)
+        return {
+            '_id': snapshot.exam_id,
+            'title': exam_details.get('title', ''),
+            'details': exam_details,
+            'snapshot': snapshot,
+            'test_case_index': self.test_case_index
+        }
+
+    def refresh_snapshot_questions(self, exam):
+        """测试用例修正后，从服务器题库更新快照中的题目并重建测试用例索引，返回更新的题目数"""
+        snapshot = exam.get('snapshot')
+        if snapshot is None:
+            raise JudgeError("当前考试不是从离线快照打开的")
+        updated = snapshot.update_questions(self.fetch_question_bank())
+        question_ids = [q['_id'] for q in programming_questions_of(exam['details'])]
+        self.test_case_index = TestCaseIndex(snapshot.questions(question_ids, self.test_data),
+                                             pool=self.test_case_pool)
+        exam['test_case_index'] = self.test_case_index
+        return updated
+
+    @staticmethod
+    def iter_snapshot_tasks(snapshot, question_ids=None, student_ids=None):
+        """从离线快照中按学生、题目顺序逐个产出待测评的提交"""
+        for row in snapshot.iter_submissions(question_ids, student_ids):
+            yield JudgeTask._make(row)
+
+    def upload_scores(self, exam_id, scores, diff=True, on_progress=None):
+        """把 {学生ID: 编程总分} 分批上传到服务器，diff 为True时只上传与上次上传不同的成绩
+
+        返回 {'uploaded', 'skipped', 'failed', 'errors'}，见 scores.ScoreUploader。
+        """
+        self._require_login()
+        uploader = ScoreUploader(self.client, self._url(f'/api/teacher/exams/{exam_id}/import-programming-scores'),
+                                 f'{self.server_url.rstrip("/")}|{exam_id}')
+        try:
+            return uploader.upload(scores, diff, on_progress)
+        except ScoreUploadError as e:
+            raise JudgeError(f"上传成绩失败: {e}")
+
+    def calibrated_entry(self, entry, language):
+        """启用时间限制校准时返回按参考解法校准的题目条目（每道题目只校准一次），否则返回原条目"""
+        if self.calibrator is None:
+            return entry
+        return self.calibrator.calibrate(entry, language, self.artifact_cache, self.precompiled_headers,
+                                         self.get_runners(1), self.comparison)
+
+    def evaluate_code(self, code, language, question_id, test_case_index=None):
+        """评测单个代码"""
+        try:
+            # 从测试用例索引中获取测试用例，无需访问网络
+            if test_case_index is None:
+                test_case_index = self.test_case_index
+            entry = self.calibrated_entry(test_case_index.get(question_id), language)
+
+            # 检查是否有有效的测试用例
+            if not entry or not entry.test_cases:
+                return no_test_cases_result()
+
+            # 每份提交只构建一次，所有测试用例复用同一个构建产物
+            artifact, build_time = timed_build(code, language, self.artifact_cache, self.precompiled_headers)
+            progress = self.scoring.progress(entry, self.comparison)
+            run_results = [None] * len(entry.test_cases)
+            try:
+                runners = self.get_runners(1)
+                for index in self.scoring.order(entry, range(len(entry.test_cases))):
+                    if progress.should_skip(index):
+                        run_results[index] = skipped_result()
+                        continue
+                    run_results[index] = run_test_case(artifact, entry.test_cases[index], entry, runners,
+                                                       self.comparison)
+                    progress.record(index, run_results[index])
+            finally:
+                artifact.cleanup()
+
+            return summarize_evaluation(entry, run_results, build_time, self.comparison, self.scoring)
+
+        except Exception as e:
+            return evaluation_error_result(e)
+
+    def execute_code(self, code, language, input_data):
+        """执行代码（构建并运行单个测试用例）"""
+        artifact = build_program(code, language, self.artifact_cache, precompiled_headers=self.precompiled_headers)
+        try:
+            return run_program(artifact, input_data, runners=self.get_runners(1))
+        finally:
+            artifact.cleanup()
+
+    def judge_exam(self, exam, workers=None, compile_workers=None, on_result=None, on_progress=None,
+                   question_ids=None, rejudge=False, scheduler=None):
+        """批量测评一个已加载的考试（或 open_snapshot 打开的离线快照）
+
+        下载（或读取已下载的）学生答案、编译、运行和输出结果组成流水线：
+        后台线程每解析出一个学生的答案就提交测评，调用线程按提交顺序等待
+        结果并输出，已提交未输出的任务数有上限，内存占用不随学生人数增长。
+
+        on_result(row) 按学生、题目顺序对每条测评结果调用一次；
+        on_progress(completed, total) 在每个任务完成后调用，
+        学生答案还在下载时 total 为目前已知的任务数。
+        question_ids 不为空时只测评这些题目。
+        启用结果存储时只运行输入有变化的测试用例（中断后再次测评即从中断处继续），
+        rejudge 为True时忽略已记录的结果，全部重新运行。
+        启用时间限制校准时，每道题目在第一份提交之前运行一次参考解法。
+        启用查重时，汇总信息的 similarity 为各题目相似提交组成的组（见 SimilaritySession.clusters）。
+        scheduler 为其他调度器（如 distributed.Coordinator）时由它执行测评，
+        此时 workers、compile_workers 和 rejudge 不起作用。
+        返回本次测评的汇总信息。
+        """
+        if 'details' not in exam:
+            raise JudgeError("请先加载考试详情")
+        if not programming_questions_of(exam['details']):
+            raise JudgeError("该考试没有编程题")
+        run = _ExamRun(exam)
+        self._judge_runs([run], workers, compile_workers, on_result, on_progress, question_ids, rejudge, scheduler)
+        if run.error is not None:
+            raise run.error
+        return run.summary
+
+    def judge_exams(self, exams, workers=None, compile_workers=None, on_result=None, on_progress=None,
+                    question_ids=None, rejudge=False, scheduler=None, on_summary=None):
+        """批量测评多场已加载的考试（见 load_exams）或离线快照，所有考试共用一个调度器和任务队列
+
+        后台线程读完一场考试的学生答案后接着读下一场，运行进程在考试之间不会空闲；
+        编译产物、常驻运行器、结果存储和相同题目的测试用例条目（及其校准结果）在各场考试之间共用。
+        参数与 judge_exam 相同，on_progress 的进度为所有考试合计；
+        on_summary(summary) 在一场考试的结果全部输出后调用。
+        某场考试出错（如下载学生答案失败）时其汇总信息的 error 为错误信息，其余考试照常测评；
+        没有编程题的考试跳过。返回各场考试的汇总信息。
+        """
+        runs = []
+        for exam in exams:
+            if 'details' not in exam:
+                raise JudgeError(f"请先加载考试详情: {exam.get('title', exam.get('_id'))}")
+            if programming_questions_of(exam['details']):
+                runs.append(_ExamRun(exam))
+            else:
+                logger.warning("考试 %s 没有编程题，跳过", exam['details'].get('title', exam.get('_id')))
+        self._judge_runs(runs, workers, compile_workers, on_result, on_progress, question_ids, rejudge, scheduler,
+                         on_summary)
+        return [run.summary for run in runs]
+
+    def _exam_tasks(self, exam, question_ids=None):
+        """考试中待测评的提交（离线快照从快照读取，否则使用已下载的或流式下载的学生答案）"""
+        snapshot = exam.get('snapshot')
+        if snapshot is not None:
+            # 离线快照：不访问服务器，筛选在快照查询中完成
+            return self.iter_snapshot_tasks(snapshot, question_ids)
+        results = exam.get('results')
+        if results is None:
+            results = self.iter_exam_results(exam['_id'])
+        tasks = iter_tasks(exam['details'], results)
+        if question_ids is not None:
+            wanted = set(question_ids)
+            tasks = (task for task in tasks if task.question_id in wanted)
+        return tasks
+
+    def _judge_runs(self, runs, workers, compile_workers, on_result, on_progress, question_ids, rejudge, scheduler,
+                    on_summary=None):
+        """依次读取各场考试的提交，交给同一个调度器测评，按提交顺序输出结果和每场考试的汇总"""
+        if not runs:
+            return
+        for run in runs:
+            # 本次测评期间固定使用同一份索引，重建索引不影响正在进行的测评
+            run.index = run.exam.get('test_case_index')
+            if run.index is None:
+                run.index = self.test_case_index
+            missing = run.index.missing([q['_id'] for q in programming_questions_of(run.details)])
+            if missing:
+                logger.warning("%s 的以下编程题不在测试用例索引中: %s", run.title, missing)
+
+        if self.precompiled_headers is not None:
+            # 下载学生答案的同时生成预编译头
+            for language in {run.details.get('language', 'cpp') for run in runs}:
+                self.precompiled_headers.warm_up(language)
+
+        # 并行测评，结果按提交顺序收集，与顺序执行的结果一致
+        if scheduler is None:
+            scheduler = JudgeScheduler(workers, compile_workers, self.artifact_cache, self.get_runners(workers),
+                                       self.comparison, self.result_store, reuse_results=not rejudge,
+                                       precompiled_headers=self.precompiled_headers, policy=self.scoring)
+        pending = queue.Queue(maxsize=scheduler.workers * PIPELINE_DEPTH_PER_WORKER)
+        stop = threading.Event()
+        discovered = [0]
+        finished = object()
+        failure = [None]
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    pending.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def produce():
+            try:
+                for run in runs:
+                    run.start_time = time.time()
+                    if self.similarity is not None:
+                        run.similarity = self.similarity.session()
+                    try:
+                        for task in self._exam_tasks(run.exam, question_ids):
+                            # 内容相同的提交只测评一次，结果分发给组内所有学生
+                            future = None
+                            if task.code.strip():
+                                entry = self.calibrated_entry(run.index.get(task.question_id), task.language)
+                                future = scheduler.submit_deduplicated(task.question_id, task.code, task.language,
+                                                                       entry, run)
+                                if run.similarity is not None:
+                                    with span('similarity'):
+                                        run.similarity.add(task)
+                            discovered[0] += 1
+                            if not put((run, task, future)):
+                                return
+                    except Exception as e:
+                        # 只影响这场考试，已读取的提交照常输出
+                        run.error = e
+                    # 这场考试的提交已全部排队，后面紧接着下一场考试的提交
+                    if not put((run, None, None)):
+                        return
+            except BaseException as e:
+                # 考试之外的错误：由调用线程重新抛出
+                failure[0] = e
+            finally:
+                # 无论如何都要让调用线程结束等待
+                put(finished)
+
+        producer = threading.Thread(target=produce, name='judge-producer', daemon=True)
+        logger.info("正在测评 %s (%s，评分策略 %s)", runs[0].title if len(runs) == 1 else f'{len(runs)} 场考试',
+                    scheduler.describe(), scheduler.policy.describe())
+        producer.start()
+        completed_tasks = 0
+        try:
+            while True:
+                item = pending.get()
+                QUEUE_DEPTH.set(pending.qsize(), queue='results')
+                if item is finished:
+                    if failure[0] is not None:
+                        raise failure[0]
+                    break
+                run, task, future = item
+                if task is None:
+                    run.summary = self._exam_summary(run, scheduler)
+                    if on_summary:
+                        on_summary(run.summary)
+                    continue
+                if future is not None:
+                    result_data = future.result()
+                    run.judged += 1
+                    if on_result:
+                        with span('export'):
+                            on_result({
+                                'exam_id': run.exam.get('_id'),
+                                'student': task.student,
+                                'student_id': task.student_id,
+                                'question': task.question,
+                                'question_id': task.question_id,
+                                'language': task.language,
+                                'status': result_data['status'],
+                                'score': result_data['score'],
+                                'execution_time': result_data['execution_time'],
+                                'error': result_data.get('error', ''),
+                                'max_cpu_time': result_data.get('max_cpu_time'),
+                                'peak_memory': result_data.get('peak_memory'),
+                                'tests': result_data.get('tests', []),
+                                'timings': result_data.get('timings')
+                            })
+
+                run.completed += 1
+                completed_tasks += 1
+                if on_progress:
+                    on_progress(completed_tasks, max(discovered[0], completed_tasks))
+        finally:
+            # 出错时让后台线程停止提交，正在下载的连接随线程结束关闭
+            stop.set()
+            scheduler.shutdown(wait=False)
+
+    def _exam_summary(self, run, scheduler):
+        """一场考试的汇总信息（该考试的结果已全部输出）"""
+        clusters = None
+        if run.similarity is not None:
+            with span('similarity'):
+                clusters = run.similarity.clusters()
+            logger.info("查重完成: %d 组相似提交（%s）", len(clusters), self.similarity.describe())
+        return {
+            'exam_id': run.exam.get('_id'),
+            'title': run.details.get('title', ''),
+            'total_tasks': run.completed,
+            'judged': run.judged,
+            'elapsed': round(time.time() - run.start_time, 3),
+            'scoring': scheduler.policy.describe(),
+            'dedup': scheduler.dedup_summary(run),
+            'cache': scheduler.cache_summary(run),
+            'similarity': clusters,
+            'error': None if run.error is None else str(run.error)
+        }
+
+
+def format_dedup_summary(dedup):
+    """去重统计的文字描述"""
+    return (f"去重: {dedup['total']} 份提交中 {dedup['duplicates']} 份重复"
+            f"（{dedup['ratio']:.1%}），实际测评 {dedup['unique']} 份，"
+            f"节省约 {dedup['saved_ms'] / 1000:.1f} 秒")
+
+
+def format_cache_summary(cache):
+    """结果存储命中统计的文字描述"""
+    if not cache['enabled']:
+        return "结果存储: 未启用"
+    return (f"结果存储: 命中 {cache['hits']} 个测试用例，运行 {cache['misses']} 个"
+            f"（命中率 {cache['ratio']:.1%}）")
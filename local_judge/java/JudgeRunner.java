@@ -0,0 +1,310 @@
+import java.io.BufferedInputStream;
+import java.io.BufferedOutputStream;
+import java.io.BufferedReader;
+import java.io.File;
+import java.io.FileDescriptor;
+import java.io.FileInputStream;
+import java.io.FileOutputStream;
+import java.io.InputStream;
+import java.io.IOException;
+import java.io.InputStreamReader;
+import java.io.OutputStream;
+import java.io.PrintStream;
+import java.lang.management.ManagementFactory;
+import java.lang.management.MemoryPoolMXBean;
+import java.lang.management.MemoryType;
+import java.lang.management.ThreadMXBean;
+import java.lang.reflect.InvocationTargetException;
+import java.lang.reflect.Method;
+import java.lang.reflect.Modifier;
+import java.net.URL;
+import java.net.URLClassLoader;
+import java.nio.charset.StandardCharsets;
+import java.util.Map;
+import java.util.concurrent.ConcurrentHashMap;
+
+/**
+ * 常驻 JVM 测评运行器（由 local_judge/javarunner.py 启动和管理）
+ *
+ * 从标准输入逐行读取请求，每个请求运行一次学生程序的 main 方法：
+ *   RUN\t类目录\t主类名\t输入文件\t输出文件\t错误输出文件\t超时毫秒\t输出上限字节
+ * 运行结束后向标准输出写一行应答：
+ *   DONE\t状态\tCPU纳秒\t墙钟纳秒\t峰值堆内存字节\t是否需要重启(0/1)
+ * 状态为 OK、EXCEPTION、OOM 或 TIMEOUT。输出文件最多写入 输出上限+1 字节，
+ * 多出的部分直接丢弃，由 Python 端判定输出超限。
+ *
+ * CPU 时间只统计学生线程（ThreadMXBean 的线程 CPU 时间），不含 JIT 编译和 GC 线程：
+ * 主线程结束时精确读取，其余学生线程在等待期间每 SAMPLE_MILLIS 毫秒采样一次，
+ * 在两次采样之间结束的线程最后不到一个采样间隔的 CPU 时间不计入。
+ * 峰值堆内存为运行期间各堆内存池的峰值之和减去运行开始时的占用，不含运行器
+ * 自身此前分配的内存；各内存池的峰值不一定同时出现，结果可能略高于实际峰值。
+ *
+ * 每次运行使用独立的类加载器，静态变量互不影响；学生线程超时、
+ * 内存溢出或留下未结束的线程时应答中标记需要重启，随后本进程退出，
+ * 由 Python 端重新启动。学生代码调用 System.exit 会直接结束本进程，
+ * Python 端检测到后改用新的 JVM 重新运行该测试用例。
+ */
+public class JudgeRunner {
+
+    private static final long STUDENT_STACK_SIZE = 64L << 20;
+    // 等待学生线程时采样线程 CPU 时间的间隔（毫秒）
+    private static final long SAMPLE_MILLIS = 10;
+
+    private static final ThreadMXBean THREADS = ManagementFactory.getThreadMXBean();
+
+    private static final class Result {
+        String status = "OK";
+        long cpuNanos = -1;
+        long wallNanos = 0;
+        long peakHeapBytes = -1;
+        boolean dirty = false;
+    }
+
+    public static void main(String[] args) throws Exception {
+        if (THREADS.isThreadCpuTimeSupported() && !THREADS.isThreadCpuTimeEnabled()) {
+            THREADS.setThreadCpuTimeEnabled(true);
+        }
+        BufferedReader control = new BufferedReader(new InputStreamReader(System.in, StandardCharsets.UTF_8));
+        PrintStream reply = new PrintStream(new FileOutputStream(FileDescriptor.out), true, "UTF-8");
+        InputStream originalIn = System.in;
+        PrintStream originalOut = System.out;
+        PrintStream originalErr = System.err;
+
+        String line;
+        while ((line = control.readLine()) != null) {
+            String[] parts = line.split("\t", -1);
+            if (parts.length != 8 || !"RUN".equals(parts[0])) {
+                reply.println("ERROR\tbad request");
+                continue;
+            }
+            Result result;
+            try {
+                result = run(parts[1], parts[2], parts[3], parts[4], parts[5], Long.parseLong(parts[6]),
+                        Long.parseLong(parts[7]));
+            } finally {
+                System.setIn(originalIn);
+                System.setOut(originalOut);
+                System.setErr(originalErr);
+            }
+            reply.println("DONE\t" + result.status + "\t" + result.cpuNanos + "\t" + result.wallNanos
+                    + "\t" + result.peakHeapBytes + "\t" + (result.dirty ? 1 : 0));
+            if (result.dirty) {
+                // 残留的学生线程无法安全结束，直接退出由 Python 端重启
+                Runtime.getRuntime().halt(0);
+            }
+        }
+    }
+
+    private static Result run(String classDir, String className, String inputFile, String outputFile,
+                              String errorFile, long timeoutMillis, long outputLimit) throws Exception {
+        Result result = new Result();
+        try (InputStream in = new BufferedInputStream(new FileInputStream(inputFile));
+             PrintStream out = new PrintStream(new BufferedOutputStream(
+                     new CappedOutputStream(new FileOutputStream(outputFile), outputLimit + 1), 1 << 16), false, "UTF-8");
+             PrintStream err = new PrintStream(new FileOutputStream(errorFile), true, "UTF-8");
+             URLClassLoader loader = new URLClassLoader(new URL[]{new File(classDir).toURI().toURL()},
+                     ClassLoader.getPlatformClassLoader())) {
+
+            System.setIn(in);
+            System.setOut(out);
+            System.setErr(err);
+
+            Method mainMethod;
+            try {
+                // 不在此线程初始化学生类，静态初始化在学生线程中执行
+                Class<?> mainClass = Class.forName(className, false, loader);
+                mainMethod = mainClass.getMethod("main", String[].class);
+                if (!Modifier.isStatic(mainMethod.getModifiers())) {
+                    throw new NoSuchMethodException("main is not static");
+                }
+                mainMethod.setAccessible(true);
+            } catch (ReflectiveOperationException | LinkageError e) {
+                err.println("错误: 找不到或无法加载主类 " + className);
+                err.println(e);
+                result.status = "EXCEPTION";
+                return result;
+            }
+
+            final Throwable[] failure = new Throwable[1];
+            ThreadGroup group = new ThreadGroup("student");
+            StudentCpu cpu = new StudentCpu(group);
+            Thread mainThread = new Thread(group, () -> {
+                try {
+                    mainMethod.invoke(null, (Object) new String[0]);
+                } catch (InvocationTargetException e) {
+                    failure[0] = e.getCause();
+                } catch (Throwable e) {
+                    failure[0] = e;
+                } finally {
+                    cpu.record(Thread.currentThread().getId(), THREADS.getCurrentThreadCpuTime());
+                }
+            }, "main", STUDENT_STACK_SIZE);
+            mainThread.setContextClassLoader(loader);
+
+            long heapStart = resetHeapPeaks();
+            long wallStart = System.nanoTime();
+            long deadline = wallStart + timeoutMillis * 1_000_000L;
+            mainThread.start();
+
+            boolean finished = joinStudentThreads(group, mainThread, deadline, cpu);
+            result.wallNanos = System.nanoTime() - wallStart;
+            // 超时时仍在运行的线程读取到此刻为止的 CPU 时间
+            cpu.sample();
+            result.cpuNanos = cpu.total();
+            result.peakHeapBytes = Math.max(0, heapPeak() - heapStart);
+
+            if (!finished) {
+                result.status = "TIMEOUT";
+                result.dirty = true;
+            } else if (failure[0] != null) {
+                Throwable cause = failure[0];
+                err.print("Exception in thread \"main\" ");
+                cause.printStackTrace(err);
+                if (cause instanceof OutOfMemoryError) {
+                    result.status = "OOM";
+                    result.dirty = true;
+                } else {
+                    result.status = "EXCEPTION";
+                }
+            }
+            if (group.activeCount() > 0) {
+                // 守护线程仍在运行，可能继续修改共享状态
+                result.dirty = true;
+            }
+            out.flush();
+        }
+        return result;
+    }
+
+    /** 最多写入 limit 字节，之后的输出直接丢弃，避免死循环输出写满磁盘 */
+    private static final class CappedOutputStream extends OutputStream {
+        private final OutputStream target;
+        private long remaining;
+
+        CappedOutputStream(OutputStream target, long limit) {
+            this.target = target;
+            this.remaining = limit;
+        }
+
+        @Override
+        public void write(int b) throws IOException {
+            if (remaining > 0) {
+                target.write(b);
+                remaining--;
+            }
+        }
+
+        @Override
+        public void write(byte[] b, int off, int len) throws IOException {
+            int allowed = (int) Math.min(len, remaining);
+            if (allowed > 0) {
+                target.write(b, off, allowed);
+                remaining -= allowed;
+            }
+        }
+
+        @Override
+        public void flush() throws IOException {
+            target.flush();
+        }
+
+        @Override
+        public void close() throws IOException {
+            target.close();
+        }
+    }
+
+    /** 学生线程的 CPU 时间：线程ID -> 读到的最大 CPU 纳秒数（主线程与控制线程都会写入） */
+    private static final class StudentCpu {
+        private final ThreadGroup group;
+        private final Map<Long, Long> nanos = new ConcurrentHashMap<>();
+
+        StudentCpu(ThreadGroup group) {
+            this.group = group;
+        }
+
+        void record(long threadId, long value) {
+            if (value >= 0) {
+                nanos.merge(threadId, value, Math::max);
+            }
+        }
+
+        void sample() {
+            Thread[] threads = new Thread[group.activeCount() + 8];
+            int count = group.enumerate(threads, true);
+            for (int i = 0; i < count; i++) {
+                long threadId = threads[i].getId();
+                record(threadId, THREADS.getThreadCpuTime(threadId));
+            }
+        }
+
+        long total() {
+            if (!THREADS.isThreadCpuTimeEnabled()) {
+                return -1;
+            }
+            long total = 0;
+            for (long value : nanos.values()) {
+                total += value;
+            }
+            return total;
+        }
+    }
+
+    /** 与 JVM 退出规则一致：等待主线程和所有非守护线程结束 */
+    private static boolean joinStudentThreads(ThreadGroup group, Thread mainThread, long deadline, StudentCpu cpu)
+            throws InterruptedException {
+        if (!joinUntil(mainThread, deadline, cpu)) {
+            return false;
+        }
+        while (true) {
+            Thread[] threads = new Thread[group.activeCount() + 8];
+            int count = group.enumerate(threads, true);
+            boolean waited = false;
+            for (int i = 0; i < count; i++) {
+                Thread thread = threads[i];
+                if (thread.isAlive() && !thread.isDaemon()) {
+                    if (!joinUntil(thread, deadline, cpu)) {
+                        return false;
+                    }
+                    waited = true;
+                }
+            }
+            if (!waited) {
+                return true;
+            }
+        }
+    }
+
+    /** 等待线程结束，期间每 SAMPLE_MILLIS 毫秒采样一次学生线程的 CPU 时间 */
+    private static boolean joinUntil(Thread thread, long deadline, StudentCpu cpu) throws InterruptedException {
+        long remaining = deadline - System.nanoTime();
+        while (thread.isAlive() && remaining > 0) {
+            thread.join(Math.max(1, Math.min(SAMPLE_MILLIS, remaining / 1_000_000L)));
+            cpu.sample();
+            remaining = deadline - System.nanoTime();
+        }
+        return !thread.isAlive();
+    }
+
+    /** 把各堆内存池的峰值重置为当前占用，返回当前占用之和 */
+    private static long resetHeapPeaks() {
+        long total = 0;
+        for (MemoryPoolMXBean pool : ManagementFactory.getMemoryPoolMXBeans()) {
+            if (pool.getType() == MemoryType.HEAP) {
+                pool.resetPeakUsage();
+                total += pool.getPeakUsage().getUsed();
+            }
+        }
+        return total;
+    }
+
+    private static long heapPeak() {
+        long total = 0;
+        for (MemoryPoolMXBean pool : ManagementFactory.getMemoryPoolMXBeans()) {
+            if (pool.getType() == MemoryType.HEAP) {
+                total += pool.getPeakUsage().getUsed();
+            }
+        }
+        return total;
+    }
+}
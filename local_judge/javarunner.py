@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+"""
+Java 常驻运行器池
+
+每个测试用例启动新的 JVM 需要数百毫秒，远超大多数学生程序的运行时间。
+这里维护一组常驻的 JVM（运行 java/JudgeRunner.java），每次运行在新的
+类加载器中加载提交的 class 目录并调用 main，System.in/System.out 重定向
+到临时文件，超时由运行器自行判断。输出文件最多写入 输出上限+1 字节，
+读取时交给 sandbox.OutputCapture 比较并判定输出超限。
+
+以下情况运行器进程退出并在下次使用时重新启动：
+  - 运行超时、内存溢出或学生代码留下未结束的线程（运行器应答中标记）；
+  - 学生代码调用 System.exit 或 JVM 崩溃（读不到应答），此时该测试用例
+    改用新的 JVM 重新运行，保证判定结果与普通方式一致。
+
+每个 JVM 以题目内存限制作为 -Xmx 启动，不同内存限制的题目使用不同的 JVM。
+CPU 时间只统计学生线程，不含常驻 JVM 的 JIT 编译和 GC 线程；峰值内存为本次运行
+堆内存的增量，不含运行器自身占用。两者都是近似值：主线程之外的学生线程在结束前
+最后不到一个采样间隔的 CPU 时间不计入，各堆内存池峰值之和可能略高于实际峰值
+（详见 JudgeRunner.java）。
+找不到 java/javac 或运行器编译失败时自动退回 sandbox.run_limited。
+"""
+
+import os
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+import subprocess
+
+from .build import ARTIFACT_CACHE_DIR, COMPILE_TIMEOUT, toolchain_version
+from .testdata import TestData
+from .sandbox import (
+    RunResult, OutputCapture, run_limited, classify, _decode,
+    WALL_TIME_FACTOR, WALL_TIME_EXTRA, STDERR_LIMIT
+)
+
+logger = logging.getLogger(__name__)
+
+RUNNER_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'java', 'JudgeRunner.java')
+RUNNER_CLASS = 'JudgeRunner'
+
+# 编译后的运行器放在产物缓存目录旁边，按源码和JDK版本区分
+RUNNER_BUILD_DIR = os.path.join(os.path.dirname(ARTIFACT_CACHE_DIR), 'javarunner')
+
+# 运行器自身超时判断失效时，Python 端在墙钟超时基础上再等待的秒数
+RUNNER_GRACE = 5
+
+# 未指定内存限制时运行器的堆大小（MB）
+DEFAULT_HEAP_MB = 512
+
+# 运行器应答状态对应的退出码；OOM 时错误输出中带有 OutOfMemoryError，由 classify 判定为内存超限
+_STATUS_RETURNCODES = {'OK': 0, 'EXCEPTION': 1, 'OOM': 1, 'TIMEOUT': None}
+
+
+class JavaRunnerError(Exception):
+    """运行器进程异常退出或通信失败"""
+
+
+def _split_java_command(cmd):
+    """从 [java, (-Xmx..), -cp, 目录, 主类] 中取出 (类目录, 主类名)"""
+    index = cmd.index('-cp')
+    return cmd[index + 1], cmd[-1]
+
+
+def prepare_runner(javac='javac'):
+    """编译运行器（已编译时直接返回），返回 class 目录，失败时返回None"""
+    if shutil.which(javac) is None:
+        return None
+    with open(RUNNER_SOURCE, 'rb') as f:
+        source = f.read()
+    digest = hashlib.sha256(source + toolchain_version(javac).encode('utf-8')).hexdigest()[:16]
+    output_dir = os.path.join(RUNNER_BUILD_DIR, digest)
+    if os.path.exists(os.path.join(output_dir, RUNNER_CLASS + '.class')):
+        return output_dir
+
+    os.makedirs(RUNNER_BUILD_DIR, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix='staging-', dir=RUNNER_BUILD_DIR)
+    try:
+        result = subprocess.run([javac, '-encoding', 'UTF-8', '-d', staging, RUNNER_SOURCE],
+                                capture_output=True, text=True, timeout=COMPILE_TIMEOUT * 3)
+        if result.returncode != 0:
+            logger.warning("Java运行器编译失败: %s", result.stderr.strip())
+            return None
+        try:
+            os.rename(staging, output_dir)
+        except OSError:
+            # 其他进程已经编译好
+            pass
+        return output_dir
+    except (OSError, subprocess.TimeoutExpired) as e:
+        logger.warning("Java运行器编译失败: %s", e)
+        return None
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+class _JavaRunner:
+    """一个常驻 JVM，同一时间只处理一个运行请求"""
+
+    def __init__(self, java, runner_dir, heap_mb):
+        self.heap_mb = heap_mb
+        self.workdir = tempfile.mkdtemp(prefix='javarunner_')
+        self.input_file = os.path.join(self.workdir, 'input.txt')
+        self.output_file = os.path.join(self.workdir, 'output.txt')
+        self.error_file = os.path.join(self.workdir, 'error.txt')
+        try:
+            self.proc = subprocess.Popen(
+                [java, f'-Xmx{heap_mb}m', '-XX:+UseSerialGC', '-Dfile.encoding=UTF-8',
+                 '-cp', runner_dir, RUNNER_CLASS],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                text=True, encoding='utf-8', bufsize=1
+            )
+        except OSError:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+            raise
+
+    def run(self, class_dir, class_name, input_data, time_limit, memory_limit, capture):
+        """运行一次，返回 (RunResult, 是否需要重启)"""
+        wall_timeout = time_limit * WALL_TIME_FACTOR + WALL_TIME_EXTRA
+        if isinstance(input_data, TestData):
+            # 保存为文件的测试数据直接交给运行器读取
+            input_file = input_data.path
+        else:
+            input_file = self.input_file
+            with open(input_file, 'w', encoding='utf-8', newline='') as f:
+                f.write(input_data)
+
+        request = '\t'.join(('RUN', os.path.abspath(class_dir), class_name, input_file,
+                             self.output_file, self.error_file, str(int(wall_timeout * 1000)), str(capture.limit)))
+        # 运行器自身卡住时由 Python 端结束进程，readline 随之返回
+        watchdog = threading.Timer(wall_timeout + RUNNER_GRACE, self.proc.kill)
+        watchdog.daemon = True
+        watchdog.start()
+        try:
+            self.proc.stdin.write(request + '\n')
+            self.proc.stdin.flush()
+            reply = self.proc.stdout.readline()
+        except OSError as e:
+            raise JavaRunnerError(f'无法与Java运行器通信: {e}')
+        finally:
+            watchdog.cancel()
+
+        parts = reply.rstrip('\n').split('\t')
+        if len(parts) != 6 or parts[0] != 'DONE':
+            raise JavaRunnerError(f'Java运行器已退出: {reply.strip() or "无应答"}')
+        try:
+            status = parts[1]
+            cpu_nanos, wall_nanos, peak_bytes = (int(value) for value in parts[2:5])
+        except ValueError:
+            raise JavaRunnerError(f'Java运行器应答格式错误: {reply.strip()}')
+
+        capture.consume(open(self.output_file, 'rb'))
+        capture.close()
+        stdout = capture.text
+        with open(self.error_file, 'rb') as f:
+            stderr = _decode(f.read(STDERR_LIMIT))
+        cpu_time = cpu_nanos / 1e9 if cpu_nanos >= 0 else None
+        wall_time = wall_nanos / 1e9
+        peak_memory = peak_bytes // 1024 if peak_bytes >= 0 else None
+        returncode = _STATUS_RETURNCODES.get(status, 1)
+        verdict = classify(returncode, stderr, cpu_time, peak_memory, time_limit, memory_limit, status == 'TIMEOUT',
+                           capture.exceeded)
+        return RunResult(verdict, returncode, stdout, stderr, cpu_time, wall_time, peak_memory), parts[5] == '1'
+
+    def close(self):
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.proc.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+            self.proc.wait()
+        self.proc.stdout.close()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+class JavaRunnerPool:
+    """Java 常驻运行器池
+
+    最多同时保持 size 个 JVM，按堆大小（题目内存限制）分组复用；
+    达到上限时关闭一个其他堆大小的空闲 JVM 再启动新的。
+    """
+
+    language = 'java'
+
+    def __init__(self, size=None, java='java', javac='javac'):
+        self.size = max(1, size or os.cpu_count() or 1)
+        self.java = java
+        self.javac = javac
+        self._runner_dir = None
+        self._prepared = False
+        self._idle = {}
+        self._created = 0
+        self._cond = threading.Condition()
+        self._closed = False
+
+    @property
+    def enabled(self):
+        if not self._prepared:
+            with self._cond:
+                if not self._prepared:
+                    if shutil.which(self.java) is not None:
+                        self._runner_dir = prepare_runner(self.javac)
+                    self._prepared = True
+        return self._runner_dir is not None
+
+    def _acquire(self, heap_mb):
+        evicted = None
+        with self._cond:
+            while True:
+                idle = self._idle.get(heap_mb)
+                if idle:
+                    return idle.pop()
+                if self._created < self.size:
+                    break
+                other = next((runners for runners in self._idle.values() if runners), None)
+                if other:
+                    evicted = other.pop()
+                    break
+                self._cond.wait()
+            if evicted is None:
+                self._created += 1
+        if evicted is not None:
+            # 被关闭的 JVM 占用的名额直接给新的 JVM
+            evicted.close()
+        try:
+            return _JavaRunner(self.java, self._runner_dir, heap_mb)
+        except OSError:
+            with self._cond:
+                self._created -= 1
+                self._cond.notify()
+            raise
+
+    def _release(self, runner, healthy):
+        if healthy and not self._closed:
+            with self._cond:
+                self._idle.setdefault(runner.heap_mb, []).append(runner)
+                self._cond.notify()
+            return
+        runner.close()
+        with self._cond:
+            self._created -= 1
+            self._cond.notify()
+
+    def run(self, cmd, input_data, time_limit, memory_limit=None, capture=None):
+        """运行 [java, (-Xmx..), -cp, 目录, 主类] 形式的命令，返回 sandbox.RunResult"""
+        if self._closed or not self.enabled:
+            return run_limited(cmd, input_data, time_limit, memory_limit, False, capture)
+        class_dir, class_name = _split_java_command(cmd)
+        heap_mb = int(memory_limit) if memory_limit else DEFAULT_HEAP_MB
+        try:
+            runner = self._acquire(heap_mb)
+        except OSError as e:
+            logger.warning("无法启动Java运行器，改用普通方式运行: %s", e)
+            return run_limited(cmd, input_data, time_limit, memory_limit, False, capture)
+        try:
+            result, dirty = runner.run(class_dir, class_name, input_data, time_limit, memory_limit,
+                                       capture or OutputCapture())
+        except JavaRunnerError as e:
+            # 多数是学生代码调用了 System.exit，用新的JVM重新运行以得到准确结果
+            logger.debug("%s，改用普通方式重新运行", e)
+            self._release(runner, healthy=False)
+            if capture is not None:
+                capture.reset()
+            return run_limited(cmd, input_data, time_limit, memory_limit, False, capture)
+        self._release(runner, healthy=not dirty)
+        return result
+
+    def close(self):
+        """关闭所有空闲的 JVM，正在使用的会在归还时关闭"""
+        self._closed = True
+        with self._cond:
+            runners = [runner for idle in self._idle.values() for runner in idle]
+            self._idle = {}
+        for runner in runners:
+            runner.close()
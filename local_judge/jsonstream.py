@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+流式解析 JSON 数组：边下载边逐个产出数组元素，不把整个响应读入内存
+
+只依赖标准库 json：扫描括号深度（跳过字符串内容）找到每个元素的结束位置，
+再用 json.JSONDecoder 解析该元素。用于 /api/teacher/exams/{id}/results
+返回的 {"exam": {..., "examResults": [...]}}，也支持顶层就是数组的响应。
+"""
+
+import re
+import json
+import codecs
+
+# 元素之间需要关注的字符：字符串开始和括号
+_STRUCTURE = re.compile(r'["\[\]{}]')
+# 字符串开始引号之后直到结束引号的内容（含转义字符）
+_STRING_BODY = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+
+
+class JSONStreamError(ValueError):
+    """响应不是预期的 JSON 结构"""
+
+
+def _key_pattern(key):
+    return re.compile(r'"' + re.escape(key) + r'"\s*:\s*\[')
+
+
+def iter_array_items(chunks, key=None):
+    """从字节块序列中逐个产出数组元素
+
+    key 不为空时查找第一个名为 key 的字段的数组值（该字段名只会以键的形式
+    出现：字符串内容中的引号都已转义）；找不到时不产出任何元素。
+    顶层就是数组时直接产出其中的元素。
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    json_decoder = json.JSONDecoder()
+    pattern = _key_pattern(key) if key else None
+    buffer = ''
+    top_level = None  # 响应顶层的第一个字符：'{' 或 '['
+    started = False   # 是否已进入目标数组
+    pos = 0           # buffer 中下一个待扫描的位置
+    item_start = None
+    depth = 0         # 当前元素内的括号深度
+
+    for chunk in chunks:
+        if not chunk:
+            continue
+        buffer += decoder.decode(chunk)
+
+        if not started:
+            if top_level is None:
+                stripped = buffer.lstrip()
+                if not stripped:
+                    continue
+                top_level = stripped[0]
+                if top_level not in '{[':
+                    raise JSONStreamError('响应不是JSON对象或数组')
+                if top_level == '[':
+                    buffer = stripped[1:]
+            if top_level == '{':
+                match = pattern.search(buffer) if pattern else None
+                if match is None:
+                    # 只保留可能被拆开的字段名部分
+                    buffer = buffer[-(len(key) + 64):] if pattern else ''
+                    continue
+                buffer = buffer[match.end():]
+            started = True
+            pos = 0
+
+        while True:
+            if item_start is None:
+                # 跳过元素之间的空白和逗号
+                while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                    pos += 1
+                if pos >= len(buffer):
+                    break
+                if buffer[pos] == ']':
+                    return
+                item_start = pos
+                depth = 0
+                if buffer[pos] not in '{["':
+                    # 数字、true/false/null 等标量元素：到下一个逗号或右括号为止
+                    ends = [i for i in (buffer.find(',', pos), buffer.find(']', pos)) if i >= 0]
+                    if not ends:
+                        # 标量还没读完，下一块从它的开头重新处理
+                        item_start = None
+                        break
+                    yield json.loads(buffer[pos:min(ends)])
+                    pos = min(ends)
+                    item_start = None
+                    continue
+
+            match = _STRUCTURE.search(buffer, pos)
+            if match is None:
+                pos = len(buffer)
+                break
+            char = match.group()
+            if char == '"':
+                body = _STRING_BODY.match(buffer, match.end())
+                if body is None:
+                    # 字符串还没读完，下一块从引号处重新扫描
+                    pos = match.start()
+                    break
+                pos = body.end()
+                complete = depth == 0
+            else:
+                pos = match.end()
+                depth += 1 if char in '[{' else -1
+                complete = depth == 0
+
+            if complete:
+                item, _ = json_decoder.raw_decode(buffer, item_start)
+                yield item
+                buffer = buffer[pos:]
+                pos = 0
+                item_start = None
+
+        # 丢弃已处理的部分，只保留未完成的元素
+        cut = pos if item_start is None else item_start
+        buffer = buffer[cut:]
+        pos -= cut
+        if item_start is not None:
+            item_start = 0
+
+    if started:
+        raise JSONStreamError('响应在数组结束前中断')
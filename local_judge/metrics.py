@@ -0,0 +1,339 @@
+# -*- coding: utf-8 -*-
+"""
+测评指标：各阶段耗时直方图、计数器和瞬时值
+
+所有指标登记在模块级的 REGISTRY 中，测评各环节直接更新，开销只是一次加锁。
+导出方式：
+
+  - MetricsServer：HTTP 端点，GET /metrics 返回 Prometheus 文本格式，
+    GET /metrics.json 返回 JSON；
+  - JsonMetricsDumper：后台线程定期把 JSON 写入文件（先写临时文件再替换）。
+
+阶段（stage 标签）：fetch 下载、parse 解析、compile 编译、spawn 启动进程、
+run 运行、compare 比较输出、export 写出结果、similarity 查重、ui 界面刷新。
+"""
+
+import os
+import json
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+logger = logging.getLogger(__name__)
+
+# 耗时直方图的桶上界（秒）
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# 定期写出 JSON 的默认间隔（秒）
+DEFAULT_DUMP_INTERVAL = 10
+
+
+def _label_key(label_names, labels):
+    if set(labels) != set(label_names):
+        raise ValueError(f"标签应为 {label_names}，实际为 {tuple(labels)}")
+    return tuple(str(labels[name]) for name in label_names)
+
+
+def _format_labels(label_names, key, extra=()):
+    pairs = list(zip(label_names, key)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape_label_value(value)}"' for name, value in pairs) + '}'
+
+
+def _escape_label_value(value):
+    """按 Prometheus 文本格式转义标签值中的反斜杠、双引号和换行"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name, documentation, label_names, lock):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = lock
+        self._values = {}
+
+    def _render_header(self):
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(_Metric):
+    """只增不减的计数"""
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.label_names, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels):
+        with self._lock:
+            return self._values.get(_label_key(self.label_names, labels), 0)
+
+    def render(self):
+        lines = self._render_header()
+        for key, value in sorted(self._values.items()):
+            lines.append(f'{self.name}{_format_labels(self.label_names, key)} {value}')
+        return lines
+
+    def snapshot(self):
+        return [dict(zip(self.label_names, key), value=value) for key, value in sorted(self._values.items())]
+
+
+class Gauge(Counter):
+    """可增可减的瞬时值"""
+
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = _label_key(self.label_names, labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """按桶统计分布，同时记录总和与次数"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, label_names, lock, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names, lock)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = _label_key(self.label_names, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [各桶计数（最后一个为 +Inf）, 总和, 次数]
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self):
+        lines = self._render_header()
+        for key, (counts, total, count) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.label_names, key, [('le', bound)])
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.label_names, key)
+            lines.append(f'{self.name}_sum{labels} {total}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+    def snapshot(self):
+        items = []
+        for key, (counts, total, count) in sorted(self._values.items()):
+            items.append(dict(zip(self.label_names, key), count=count, sum=round(total, 6),
+                              mean=round(total / count, 6) if count else 0,
+                              buckets=dict(zip([str(b) for b in self.buckets] + ['+Inf'], counts))))
+        return items
+
+
+class MetricsRegistry:
+    """指标登记表，同名指标只创建一次"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _get(self, metric_class, name, documentation, label_names, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = metric_class(name, documentation, label_names, threading.Lock(),
+                                                            **kwargs)
+        return metric
+
+    def counter(self, name, documentation, label_names=()):
+        return self._get(Counter, name, documentation, label_names)
+
+    def gauge(self, name, documentation, label_names=()):
+        return self._get(Gauge, name, documentation, label_names)
+
+    def histogram(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, documentation, label_names, buckets=buckets)
+
+    def render_prometheus(self):
+        """Prometheus 文本格式"""
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            with metric._lock:
+                lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        """所有指标的当前值（可直接序列化为JSON）"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        data = {'timestamp': time.time(), 'metrics': {}}
+        for metric in metrics:
+            with metric._lock:
+                data['metrics'][metric.name] = {'type': metric.kind, 'help': metric.documentation,
+                                                'values': metric.snapshot()}
+        return data
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram('local_judge_stage_seconds', '各阶段耗时（秒）', ('stage',))
+VERDICTS = REGISTRY.counter('local_judge_verdicts_total', '测试用例判定结果数', ('verdict',))
+SUBMISSIONS = REGISTRY.counter('local_judge_submissions_total', '测评完成的提交数（按状态）', ('status',))
+CACHE_REQUESTS = REGISTRY.counter('local_judge_cache_requests_total', '缓存查询次数（编译产物、结果存储、HTTP条件请求）',
+                                  ('cache', 'result'))
+QUEUE_DEPTH = REGISTRY.gauge('local_judge_queue_depth', '等待执行的任务数', ('queue',))
+BUSY_WORKERS = REGISTRY.gauge('local_judge_busy_workers', '正在工作的线程数', ('pool',))
+RERUNS = REGISTRY.counter('local_judge_reruns_total', '按校准的时间限制超时后重新运行的测试用例数（确认超时或推翻）',
+                          ('outcome',))
+
+
+@contextmanager
+def span(stage):
+    """记录一个阶段的耗时"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+
+def observe_stage(stage, seconds):
+    """记录已测得的阶段耗时，seconds 为None时忽略"""
+    if seconds is not None:
+        STAGE_SECONDS.observe(seconds, stage=stage)
+
+
+class ThroughputMeter:
+    """根据已完成的任务数估计吞吐量和剩余时间"""
+
+    def __init__(self):
+        self.start_time = time.monotonic()
+        self.completed = 0
+        self.total = 0
+
+    def update(self, completed, total):
+        self.completed = completed
+        self.total = total
+
+    @property
+    def rate(self):
+        """每秒完成的任务数"""
+        elapsed = time.monotonic() - self.start_time
+        return self.completed / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def eta(self):
+        """预计剩余秒数，无法估计时为None"""
+        rate = self.rate
+        if not rate:
+            return None
+        return max(0, self.total - self.completed) / rate
+
+    def describe(self):
+        percent = self.completed * 100 / self.total if self.total else 0
+        text = f"{self.completed}/{self.total} ({percent:.0f}%)，{self.rate:.1f} 个/秒"
+        eta = self.eta
+        if eta is not None and self.completed < self.total:
+            text += f"，预计剩余 {format_duration(eta)}"
+        return text
+
+
+def format_duration(seconds):
+    """格式化为 时:分:秒 或 分:秒"""
+    seconds = int(round(seconds))
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        if path in ('/metrics', '/'):
+            body = self.server.registry.render_prometheus().encode('utf-8')
+            content_type = 'text/plain; version=0.0.4; charset=utf-8'
+        elif path == '/metrics.json':
+            body = json.dumps(self.server.registry.snapshot(), ensure_ascii=False).encode('utf-8')
+            content_type = 'application/json'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class MetricsServer(ThreadingHTTPServer):
+    """在后台线程中提供 /metrics（Prometheus）和 /metrics.json"""
+
+    daemon_threads = True
+
+    def __init__(self, port, host='127.0.0.1', registry=REGISTRY):
+        super().__init__((host, port), _MetricsHandler)
+        self.registry = registry
+        self._thread = threading.Thread(target=self.serve_forever, name='metrics-server', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        logger.info("指标端点: http://%s:%d/metrics", *self.server_address[:2])
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class JsonMetricsDumper:
+    """定期把指标写入 JSON 文件，停止时再写一次"""
+
+    def __init__(self, path, interval=DEFAULT_DUMP_INTERVAL, registry=REGISTRY):
+        self.path = path
+        self.interval = interval
+        self.registry = registry
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name='metrics-dumper', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def dump(self):
+        temp_path = f'{self.path}.tmp'
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.registry.snapshot(), f, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logger.warning("无法写入指标文件 %s: %s", self.path, e)
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.dump()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.dump()
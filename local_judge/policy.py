@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+评分策略：测试用例如何计分，以及哪些测试用例可以不运行
+
+    partial    每个通过的测试用例按比例得分，全部运行（默认，与以前相同）
+    fail-fast  全部通过才得分，第一个测试用例失败后不再运行其余测试用例
+    subtasks   测试用例按 group 字段分为子任务，子任务全部通过才得到其中测试用例的分数，
+               子任务中有测试用例失败后不再运行同组其余测试用例；
+               没有 group 字段的测试用例各自为一个子任务
+
+会跳过测试用例的策略下，测试用例按“失败概率 / 预计耗时”从高到低运行，
+便宜且经常失败的测试用例先运行：死循环的提交通常在第一个小输入上就超时，
+不再为其余测试用例各等一次超时。失败概率和耗时来自之前运行的统计（TestCaseStats），
+没有统计时失败概率按一半计算，耗时按输入和期望输出的长度估计。
+"""
+
+import threading
+
+from .sandbox import VERDICT_SE, VERDICT_SKIP
+
+SCORING_MODES = ('partial', 'fail-fast', 'subtasks')
+DEFAULT_SCORING_MODE = 'partial'
+
+# 没有统计时估计的耗时（秒）：启动进程的固定开销 + 测试数据长度 / 处理速度
+ESTIMATED_START_COST = 0.01
+ESTIMATED_BYTES_PER_SECOND = 50 * 1024 * 1024
+# 耗时下限（秒），避免极短的测试用例优先级过高
+MIN_COST = 0.001
+
+
+def test_case_passed(test_case, execution_result, comparison):
+    """执行结果是否通过该测试用例，没有流式比较结果（matched）时按 comparison 比较完整输出"""
+    if not execution_result.get('success'):
+        return False
+    matched = execution_result.get('matched')
+    if matched is None:
+        matched = comparison.compare(test_case.get('expectedOutput', ''), execution_result['output'])
+    return bool(matched)
+
+
+def skipped_result():
+    """未运行的测试用例的 (执行结果, 耗时秒数)"""
+    return {'success': False, 'verdict': VERDICT_SKIP, 'error': '同组已有测试用例失败，未运行'}, 0
+
+
+class TestCaseStats:
+    """各测试用例的运行次数、失败次数和通过时的耗时，可被多个测评线程同时使用"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 测试用例键 -> [运行次数, 失败次数, 通过次数, 通过耗时合计]
+        self._stats = {}
+        # 题目条目 -> 各测试用例的键，同一份索引只计算一次
+        self._keys = {}
+
+    def keys(self, entry):
+        """题目各测试用例的键（题目ID、输入和期望输出相同的测试用例共用统计）"""
+        cached = self._keys.get(id(entry))
+        if cached is None or cached[0] is not entry:
+            cached = (entry, tuple(hash((entry.question_id, tc.get('input', ''), tc.get('expectedOutput', '')))
+                                   for tc in entry.test_cases))
+            with self._lock:
+                self._keys[id(entry)] = cached
+        return cached[1]
+
+    def record(self, key, passed, seconds):
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = [0, 0, 0, 0.0]
+            stats[0] += 1
+            if passed:
+                stats[2] += 1
+                stats[3] += seconds
+            else:
+                stats[1] += 1
+
+    def priority(self, key, test_case):
+        """失败概率 / 预计耗时，越大越应先运行"""
+        with self._lock:
+            runs, failures, passes, pass_time = self._stats.get(key) or (0, 0, 0, 0.0)
+        failure_rate = (failures + 1) / (runs + 2)
+        if passes:
+            cost = pass_time / passes
+        else:
+            size = len(test_case.get('input', '')) + len(test_case.get('expectedOutput', ''))
+            cost = ESTIMATED_START_COST + size / ESTIMATED_BYTES_PER_SECOND
+        return failure_rate / max(cost, MIN_COST)
+
+
+class ScoringPolicy:
+    """评分策略配置
+
+    reorder 为False时按题目中的顺序运行测试用例。stats 为运行统计，
+    默认每个策略对象各自统计，在同一引擎的多次测评之间保留。
+    """
+
+    def __init__(self, mode=DEFAULT_SCORING_MODE, reorder=True, stats=None):
+        if mode not in SCORING_MODES:
+            raise ValueError(f'不支持的评分策略: {mode}')
+        self.mode = mode
+        self.reorder = reorder
+        self.stats = stats if stats is not None else TestCaseStats()
+
+    @property
+    def skips(self):
+        """是否会跳过测试用例"""
+        return self.mode != 'partial'
+
+    def groups(self, entry):
+        """各测试用例所属的组：组内有测试用例失败时整组不得分"""
+        if self.mode == 'fail-fast':
+            return (0,) * len(entry.test_cases)
+        if self.mode == 'subtasks':
+            return tuple(i if tc.get('group') in (None, '') else ('group', str(tc['group']))
+                         for i, tc in enumerate(entry.test_cases))
+        return tuple(range(len(entry.test_cases)))
+
+    def order(self, entry, indexes):
+        """测试用例的运行顺序（下标）"""
+        indexes = list(indexes)
+        if not (self.skips and self.reorder):
+            return indexes
+        keys = self.stats.keys(entry)
+        priorities = {i: self.stats.priority(keys[i], entry.test_cases[i]) for i in indexes}
+        # 优先级相同时保持原顺序
+        return sorted(indexes, key=lambda i: -priorities[i])
+
+    def score(self, entry, passed):
+        """根据各测试用例是否通过计算 (得分, 计分的测试用例数)
+
+        计分的测试用例为所在组全部通过的测试用例；partial 下即通过的测试用例。
+        """
+        total = len(passed)
+        if not total:
+            return 0, 0
+        groups = self.groups(entry)
+        failed = {group for group, ok in zip(groups, passed) if not ok}
+        counted = sum(1 for group in groups if group not in failed)
+        return counted / total * entry.points, counted
+
+    def progress(self, entry, comparison):
+        """一份提交的测评进度，用于判断哪些测试用例可以跳过"""
+        return SubmissionProgress(self, entry, comparison)
+
+    def describe(self):
+        if self.skips and not self.reorder:
+            return f'{self.mode}(原顺序)'
+        return self.mode
+
+
+class SubmissionProgress:
+    """一份提交各组的通过情况，可被多个测评线程同时使用"""
+
+    def __init__(self, policy, entry, comparison):
+        self.policy = policy
+        self.entry = entry
+        self.comparison = comparison
+        self.groups = policy.groups(entry)
+        self.keys = policy.stats.keys(entry)
+        self.failed_groups = set()
+
+    def should_skip(self, index):
+        """同组已有测试用例失败时不必运行"""
+        return self.policy.skips and self.groups[index] in self.failed_groups
+
+    def record(self, index, run_result):
+        """记录一个测试用例的 (执行结果, 耗时秒数)，同时计入运行统计"""
+        execution_result, elapsed = run_result
+        verdict = execution_result.get('verdict')
+        if verdict == VERDICT_SKIP:
+            return
+        passed = test_case_passed(self.entry.test_cases[index], execution_result, self.comparison)
+        if not passed:
+            self.failed_groups.add(self.groups[index])
+        if verdict != VERDICT_SE:
+            self.policy.stats.record(self.keys[index], passed, elapsed)
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""
+Python 预热解释器池
+
+每个测试用例都启动一个新的 python3 进程时，解释器启动和 site 导入
+（约20~40ms）往往比学生程序本身还慢。这里维护一组预先启动的 zygote
+进程（见 _zygote.py），每次运行由 zygote fork 出干净的子进程执行，
+stdin/stdout/stderr 通过传递文件描述符重定向，资源限制和 rusage 统计
+与 sandbox.run_limited 相同。
+
+不支持 fork 或 fd 传递的平台上自动退回 sandbox.run_limited。
+"""
+
+import os
+import json
+import math
+import socket
+import struct
+import logging
+import threading
+import subprocess
+import time
+
+from .sandbox import (
+    RunResult, OutputCapture, run_limited, classify, open_input, start_io, finish_io,
+    WALL_TIME_FACTOR, WALL_TIME_EXTRA, VERDICT_OLE, VERDICT_TLE
+)
+
+logger = logging.getLogger(__name__)
+
+ZYGOTE_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '_zygote.py')
+
+_HEADER = struct.Struct('!I')
+
+
+def zygote_supported():
+    """当前平台是否支持预热解释器"""
+    return hasattr(os, 'fork') and hasattr(socket, 'send_fds') and hasattr(socket, 'AF_UNIX')
+
+
+class ZygoteError(Exception):
+    """zygote 进程异常退出或通信失败"""
+
+
+class _Zygote:
+    """一个 zygote 进程，同一时间只处理一个运行请求"""
+
+    def __init__(self, interpreter):
+        self.sock, child_sock = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self.proc = subprocess.Popen(
+                [interpreter, ZYGOTE_SCRIPT, str(child_sock.fileno())],
+                pass_fds=[child_sock.fileno()],
+                stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL
+            )
+        finally:
+            child_sock.close()
+
+    def run(self, script, input_data, time_limit, memory_limit, capture):
+        wall_timeout = time_limit * WALL_TIME_FACTOR + WALL_TIME_EXTRA
+        request = json.dumps({
+            'script': os.path.abspath(script),
+            'cpu_seconds': max(1, int(math.ceil(time_limit))),
+            'cpu_limit': time_limit,
+            'memory_bytes': int(memory_limit * 1024 * 1024) if memory_limit else 0,
+            'wall_timeout': wall_timeout
+        }).encode('utf-8')
+
+        # 输入为文件时把文件描述符直接交给子进程作为标准输入
+        input_file = open_input(input_data)
+        if input_file is not None:
+            stdin_r, stdin_w = os.dup(input_file.fileno()), None
+            input_file.close()
+        else:
+            stdin_r, stdin_w = os.pipe()
+        stdout_r, stdout_w = os.pipe()
+        stderr_r, stderr_w = os.pipe()
+        start_time = time.monotonic()
+        try:
+            socket.send_fds(self.sock, [_HEADER.pack(len(request)) + request], [stdin_r, stdout_w, stderr_w])
+        except OSError as e:
+            for fd in (stdin_r, stdin_w, stdout_r, stdout_w, stderr_r, stderr_w):
+                if fd is not None:
+                    os.close(fd)
+            raise ZygoteError(f'无法向zygote发送请求: {e}')
+        for fd in (stdin_r, stdout_w, stderr_w):
+            os.close(fd)
+        # 子进程由zygote派生，这里只能测得把请求交给zygote的耗时
+        spawn_time = time.monotonic() - start_time
+
+        # 输出超限时 capture 关闭管道读端，子进程写输出时因 EPIPE 退出
+        io_handle = start_io(os.fdopen(stdin_w, 'wb') if stdin_w is not None else None, os.fdopen(stdout_r, 'rb'),
+                             os.fdopen(stderr_r, 'rb'), input_data, capture)
+        try:
+            reply = self._read_reply()
+        finally:
+            stdout, stderr = finish_io(io_handle)
+        wall_time = time.monotonic() - start_time
+
+        returncode = os.waitstatus_to_exitcode(reply['status'])
+        cpu_time = reply['utime'] + reply['stime']
+        peak_memory = reply['maxrss']
+        verdict = classify(returncode, stderr, cpu_time, peak_memory, time_limit, memory_limit, reply['timed_out'],
+                           capture.exceeded)
+        if reply.get('cpu_exceeded') and verdict != VERDICT_OLE:
+            verdict = VERDICT_TLE
+        return RunResult(verdict, returncode, stdout, stderr, cpu_time, wall_time, peak_memory, spawn_time)
+
+    def _read_reply(self):
+        data = b''
+        try:
+            while len(data) < _HEADER.size:
+                chunk = self.sock.recv(_HEADER.size - len(data))
+                if not chunk:
+                    raise ZygoteError('zygote进程已退出')
+                data += chunk
+            (length,) = _HEADER.unpack(data)
+            payload = b''
+            while len(payload) < length:
+                chunk = self.sock.recv(length - len(payload))
+                if not chunk:
+                    raise ZygoteError('zygote进程已退出')
+                payload += chunk
+        except OSError as e:
+            raise ZygoteError(f'zygote通信失败: {e}')
+        return json.loads(payload)
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+        try:
+            self.proc.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+            self.proc.wait()
+
+
+class PythonRunnerPool:
+    """Python 预热解释器池
+
+    最多保持 size 个 zygote，运行时取出一个空闲的，用完放回；
+    zygote 异常时丢弃并退回普通方式运行该测试用例。
+    """
+
+    language = 'python'
+
+    def __init__(self, size=None, interpreter='python3'):
+        self.size = max(1, size or os.cpu_count() or 1)
+        self.interpreter = interpreter
+        self.enabled = zygote_supported()
+        # 空闲的 zygote（后进先出，最近用过的更可能仍在缓存中）
+        self._idle = []
+        self._cond = threading.Condition()
+        self._created = 0
+        self._closed = False
+
+    def _acquire(self):
+        """取出一个空闲的 zygote，没有时启动新的或等待归还；池已关闭时返回None"""
+        with self._cond:
+            while True:
+                if self._closed:
+                    return None
+                if self._idle:
+                    return self._idle.pop()
+                if self._created < self.size:
+                    self._created += 1
+                    break
+                self._cond.wait()
+        try:
+            return _Zygote(self.interpreter)
+        except BaseException:
+            with self._cond:
+                self._created -= 1
+                self._cond.notify()
+            raise
+
+    def _release(self, zygote, healthy):
+        if healthy:
+            with self._cond:
+                if not self._closed:
+                    self._idle.append(zygote)
+                    self._cond.notify()
+                    return
+        zygote.close()
+        with self._cond:
+            self._created -= 1
+            self._cond.notify()
+
+    def run(self, cmd, input_data, time_limit, memory_limit=None, capture=None):
+        """运行 [python3, 脚本路径] 形式的命令，返回 sandbox.RunResult"""
+        if not self.enabled or self._closed:
+            return run_limited(cmd, input_data, time_limit, memory_limit, capture=capture)
+        try:
+            zygote = self._acquire()
+        except OSError as e:
+            logger.warning("无法启动Python预热解释器，改用普通方式运行: %s", e)
+            return run_limited(cmd, input_data, time_limit, memory_limit, capture=capture)
+        if zygote is None:
+            return run_limited(cmd, input_data, time_limit, memory_limit, capture=capture)
+        healthy = False
+        try:
+            result = zygote.run(cmd[-1], input_data, time_limit, memory_limit, capture or OutputCapture())
+            healthy = True
+        except ZygoteError as e:
+            logger.warning("Python预热解释器异常，改用普通方式运行: %s", e)
+        finally:
+            # 其他异常时 zygote 的状态未知，同样丢弃，名额交给等待中的线程
+            self._release(zygote, healthy)
+        if not healthy:
+            if capture is not None:
+                capture.reset()
+            return run_limited(cmd, input_data, time_limit, memory_limit, capture=capture)
+        return result
+
+    def close(self):
+        """关闭所有空闲的 zygote，正在使用的会在归还时关闭；等待中的调用改用普通方式运行"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._created -= len(idle)
+            self._cond.notify_all()
+        for zygote in idle:
+            zygote.close()
+
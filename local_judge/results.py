@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+界面中保存的测评结果
+
+一次会话中可能有数万条结果（多次测评、多场考试），每条一个字典时键名重复保存，
+错误信息中还可能有完整的编译错误输出。ResultTable 改为：
+
+  - 每条结果一个 ResultRecord（__slots__），学生、题目、语言、状态等重复出现的字符串共用同一个对象；
+  - 错误信息在内存中只保留前 ERROR_PREVIEW_CHARS 个字符（表格显示用），
+    完整的错误信息和各测试用例的明细（tests、timings）写入临时文件，导出时再按顺序读回；
+  - 筛选、按学生汇总和导出都只遍历一遍结果。
+"""
+
+import sys
+import json
+import tempfile
+
+# 内存中保留的错误信息长度（字符）
+ERROR_PREVIEW_CHARS = 200
+
+# 需要共用字符串对象的字段
+_INTERNED_FIELDS = ('exam_id', 'student', 'student_id', 'question', 'question_id', 'language', 'status')
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+class ResultRecord:
+    """一条测评结果；error 为错误信息的开头部分，完整内容见 ResultTable.row"""
+
+    __slots__ = ('exam_id', 'student', 'student_id', 'question', 'question_id', 'language', 'status', 'score',
+                 'execution_time', 'max_cpu_time', 'peak_memory', 'error', 'detail')
+
+    def __init__(self, row, detail):
+        for field in _INTERNED_FIELDS:
+            setattr(self, field, _intern(row.get(field)))
+        self.score = row.get('score') or 0
+        self.execution_time = row.get('execution_time') or 0
+        self.max_cpu_time = row.get('max_cpu_time')
+        self.peak_memory = row.get('peak_memory')
+        error = row.get('error') or ''
+        self.error = error[:ERROR_PREVIEW_CHARS] + '…' if len(error) > ERROR_PREVIEW_CHARS else error
+        # 明细在临时文件中的 (偏移, 长度)，没有明细时为None
+        self.detail = detail
+
+    def get(self, field, default=None):
+        """与结果字典相同的读取方式（ScoreAggregator 使用）"""
+        value = getattr(self, field, None)
+        return default if value is None else value
+
+
+class ResultTable:
+    """按到达顺序保存的测评结果，在界面主线程中使用"""
+
+    def __init__(self):
+        self._records = []
+        self._spill = None
+        # 学生姓名 -> 小写形式，筛选时每个学生只转换一次
+        self._lowered = {}
+
+    def __len__(self):
+        return len(self._records)
+
+    def __getitem__(self, index):
+        return self._records[index]
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def append(self, row):
+        """追加一条结果字典，返回其下标"""
+        error = row.get('error') or ''
+        detail = {}
+        if len(error) > ERROR_PREVIEW_CHARS:
+            detail['error'] = error
+        if row.get('tests'):
+            detail['tests'] = row['tests']
+        if row.get('timings'):
+            detail['timings'] = row['timings']
+        self._records.append(ResultRecord(row, self._write_detail(detail) if detail else None))
+        return len(self._records) - 1
+
+    def extend(self, rows):
+        start = len(self._records)
+        for row in rows:
+            self.append(row)
+        return range(start, len(self._records))
+
+    def clear(self):
+        self._records = []
+        self._lowered.clear()
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+
+    def _write_detail(self, detail):
+        if self._spill is None:
+            self._spill = tempfile.TemporaryFile(prefix='judge-results-')
+        data = json.dumps(detail, ensure_ascii=False).encode('utf-8')
+        self._spill.seek(0, 2)
+        offset = self._spill.tell()
+        self._spill.write(data)
+        return offset, len(data)
+
+    def _read_detail(self, record):
+        if record.detail is None:
+            return {}
+        offset, length = record.detail
+        self._spill.seek(offset)
+        return json.loads(self._spill.read(length).decode('utf-8'))
+
+    def _full_row(self, record, detail):
+        row = {field: getattr(record, field) for field in ResultRecord.__slots__ if field != 'detail'}
+        row['error'] = detail.get('error', record.error)
+        row['tests'] = detail.get('tests', [])
+        row['timings'] = detail.get('timings')
+        return row
+
+    def row(self, index):
+        """第 index 条结果的完整字典（从临时文件读取明细）"""
+        record = self._records[index]
+        return self._full_row(record, self._read_detail(record))
+
+    def rows(self, indexes=None):
+        """按顺序产出完整的结果字典（导出用）；明细按写入顺序读取，只遍历一遍临时文件"""
+        records = self._records if indexes is None else (self._records[i] for i in indexes)
+        if self._spill is not None:
+            self._spill.flush()
+        for record in records:
+            yield self._full_row(record, self._read_detail(record))
+
+    def value(self, index, field):
+        return getattr(self._records[index], field, None)
+
+    def questions(self, start=0):
+        """start 之后的结果中出现的题目标题"""
+        return {self._records[i].question for i in range(start, len(self._records))}
+
+    def matcher(self, student='', question=None, status=None):
+        """返回判断一条结果是否符合筛选条件的函数（学生姓名包含、题目相同、状态前缀相同）
+
+        状态和题目只有少数几种取值，对每种取值的判断结果只计算一次。
+        """
+        student = student.strip().lower()
+        status_cache = {}
+        lowered = self._lowered
+
+        def matches(record):
+            if question is not None and record.question != question:
+                return False
+            if status:
+                ok = status_cache.get(record.status)
+                if ok is None:
+                    ok = status_cache[record.status] = str(record.status).startswith(status)
+                if not ok:
+                    return False
+            if student:
+                name = lowered.get(record.student)
+                if name is None:
+                    name = lowered[record.student] = str(record.student).lower()
+                if student not in name:
+                    return False
+            return True
+
+        return matches
+
+    def select(self, matches, indexes=None):
+        """符合条件的结果下标"""
+        records = self._records
+        if indexes is None:
+            return [i for i, record in enumerate(records) if matches(record)]
+        return [i for i in indexes if matches(records[i])]
+
+    def exams(self):
+        """各考试的结果下标：{考试ID: [下标]}，按考试第一次出现的顺序"""
+        indexes = {}
+        for i, record in enumerate(self._records):
+            indexes.setdefault(record.exam_id, []).append(i)
+        return indexes
+
+    def aggregate(self, aggregator, exam_id=None):
+        """把结果（只取 exam_id 考试的，为None时全部）加入 ScoreAggregator，返回 aggregator"""
+        for record in self._records:
+            if exam_id is None or record.exam_id == exam_id:
+                aggregator.add(record)
+        return aggregator
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+持久化的测评结果存储：按工作单元（一份提交 × 一个测试用例）记录执行结果
+
+工作单元的键由以下内容计算：规范化源码、语言及编译参数、测试用例的输入和期望输出、
+时间/内存/输出限制以及比较方式。任何一项变化都会得到新的键，因此：
+
+  - 修正一个测试用例后重新测评，只有该测试用例需要重新运行；
+  - 每个测试用例运行完成后立即记录，中断的批量测评再次运行时从中断处继续。
+
+系统错误（SE）、墙钟超时（WTLE，多由机器负载引起）和评分策略跳过的测试用例（SKIP）
+不记录，下次测评时重新运行（或再次跳过）。存储为 SQLite 文件，默认位于
+~/.local_judge/results.db，可通过环境变量 LOCAL_JUDGE_RESULT_STORE 修改。
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+
+from .build import ARTIFACT_CACHE_DIR, describe_language
+from .sandbox import OUTPUT_LIMIT, OUTPUT_PREVIEW, VERDICT_SE, VERDICT_SKIP, VERDICT_WTLE
+from .scheduler import normalize_source
+from .testdata import TestData
+
+logger = logging.getLogger(__name__)
+
+RESULT_STORE_PATH = os.environ.get('LOCAL_JUDGE_RESULT_STORE',
+                                   os.path.join(os.path.dirname(ARTIFACT_CACHE_DIR), 'results.db'))
+
+# 键的版本，执行结果的含义或源码规范化规则变化时递增，使旧记录全部失效
+RESULT_KEY_VERSION = 2
+
+# 两次提交事务之间最多积累的记录数和秒数；中断时最多丢失这么多已完成的工作单元
+COMMIT_EVERY = 200
+COMMIT_INTERVAL = 1.0
+
+# 不记录的判定结果：与提交本身无关，重新运行可能得到不同结果；跳过的测试用例没有运行
+_UNSTABLE_VERDICTS = (VERDICT_SE, VERDICT_WTLE, VERDICT_SKIP)
+
+# 执行结果中需要保存的字段（与 summarize_evaluation 使用的字段一致）
+_STORED_FIELDS = ('success', 'verdict', 'output', 'error', 'matched', 'cpu_time', 'wall_time', 'peak_memory')
+
+
+def _digest(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, TestData):
+            # 保存为文件的测试数据按内容哈希计算，不读取文件
+            part = f'testdata:{part.digest}'
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b'\x1e')
+    return digest.hexdigest()
+
+
+def test_case_digest(test_case):
+    """测试用例的哈希（输入和期望输出，以及校准的时间限制）"""
+    if 'timeLimit' in test_case:
+        return _digest(test_case.get('input', ''), test_case.get('expectedOutput', ''), test_case['timeLimit'])
+    return _digest(test_case.get('input', ''), test_case.get('expectedOutput', ''))
+
+
+class ResultStore:
+    """测评结果存储，可被多个测评线程同时使用"""
+
+    def __init__(self, path=RESULT_STORE_PATH):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode = WAL')
+        self._conn.execute('PRAGMA synchronous = NORMAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS results ('
+                           'key TEXT PRIMARY KEY, result TEXT NOT NULL, elapsed REAL NOT NULL, '
+                           'created_at REAL NOT NULL)')
+        self._conn.commit()
+        self._uncommitted = 0
+        self._last_commit = time.time()
+        # 题目条目 -> 各测试用例的哈希，同一份索引只计算一次
+        self._case_digests = {}
+
+    def unit_keys(self, code, language, entry, comparison):
+        """一份提交在题目各测试用例上的工作单元键（源码按去重的规则规范化）"""
+        cached = self._case_digests.get(id(entry))
+        if cached is None or cached[0] is not entry:
+            cached = (entry, tuple(test_case_digest(tc) for tc in entry.test_cases))
+            with self._lock:
+                self._case_digests[id(entry)] = cached
+        source = _digest(normalize_source(code, language))
+        prefix = _digest(RESULT_KEY_VERSION, source, describe_language(language), entry.time_limit,
+                         entry.memory_limit, OUTPUT_LIMIT, comparison.describe())
+        return [_digest(prefix, case) for case in cached[1]]
+
+    def get_many(self, keys):
+        """读取已记录的结果，返回 {键: (执行结果, 耗时秒数)}"""
+        if not keys:
+            return {}
+        with self._lock:
+            rows = self._conn.execute(
+                f'SELECT key, result, elapsed FROM results WHERE key IN ({",".join("?" * len(keys))})',
+                list(keys)).fetchall()
+        return {key: (json.loads(result), elapsed) for key, result, elapsed in rows}
+
+    def put(self, key, execution_result, elapsed):
+        """记录一个工作单元的结果，系统错误和墙钟超时不记录"""
+        if execution_result.get('verdict', VERDICT_SE) in _UNSTABLE_VERDICTS:
+            return
+        stored = {field: execution_result[field] for field in _STORED_FIELDS if field in execution_result}
+        if isinstance(stored.get('output'), str):
+            stored['output'] = stored['output'][:OUTPUT_PREVIEW]
+        data = json.dumps(stored, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO results (key, result, elapsed, created_at) VALUES (?, ?, ?, ?)',
+                               (key, data, elapsed, time.time()))
+            self._uncommitted += 1
+            if self._uncommitted >= COMMIT_EVERY or time.time() - self._last_commit >= COMMIT_INTERVAL:
+                self._commit()
+
+    def _commit(self):
+        self._conn.commit()
+        self._uncommitted = 0
+        self._last_commit = time.time()
+
+    def flush(self):
+        """提交尚未写入的记录"""
+        with self._lock:
+            self._commit()
+
+    def clear(self):
+        """删除全部记录"""
+        with self._lock:
+            self._conn.execute('DELETE FROM results')
+            self._commit()
+            self._case_digests.clear()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._commit()
+            self._conn.close()
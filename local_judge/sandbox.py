@@ -0,0 +1,423 @@
+# -*- coding: utf-8 -*-
+"""
+受限运行：按题目的 timeLimit / memoryLimit 为子进程设置资源限制，
+并通过子进程的 rusage 统计CPU时间和峰值内存
+
+在没有 resource 模块的平台（Windows）上只做墙钟超时，不统计资源占用。
+输入为保存为文件的测试数据（testdata.TestData）时，直接把文件作为子进程的标准输入。
+"""
+
+import os
+import math
+import time
+import codecs
+import signal
+import threading
+import subprocess
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from .testdata import TestData
+
+# 单个测试用例的判定结果
+VERDICT_OK = 'OK'      # 正常结束（输出是否正确由比较决定）
+VERDICT_AC = 'AC'      # 输出正确
+VERDICT_WA = 'WA'      # 输出错误
+VERDICT_RE = 'RE'      # 运行错误
+VERDICT_TLE = 'TLE'    # CPU时间超限
+VERDICT_WTLE = 'WTLE'  # 墙钟时间超限（如sleep或等待输入）
+VERDICT_MLE = 'MLE'    # 内存超限
+VERDICT_OLE = 'OLE'    # 输出超限
+VERDICT_CE = 'CE'      # 编译错误
+VERDICT_SE = 'SE'      # 测评系统错误
+VERDICT_SKIP = 'SKIP'  # 未运行（评分策略判定不影响得分）
+
+VERDICT_NAMES = {
+    VERDICT_OK: '正常',
+    VERDICT_AC: '通过',
+    VERDICT_WA: '答案错误',
+    VERDICT_RE: '运行错误',
+    VERDICT_TLE: 'CPU时间超限',
+    VERDICT_WTLE: '运行超时',
+    VERDICT_MLE: '内存超限',
+    VERDICT_OLE: '输出超限',
+    VERDICT_CE: '编译错误',
+    VERDICT_SE: '系统错误',
+    VERDICT_SKIP: '已跳过',
+}
+
+# 墙钟超时 = timeLimit * WALL_TIME_FACTOR + WALL_TIME_EXTRA（秒），
+# 用于结束不消耗CPU却一直不退出的程序
+WALL_TIME_FACTOR = 2
+WALL_TIME_EXTRA = 1
+
+# 标准输出上限（字节），超过后结束进程并判定为输出超限
+OUTPUT_LIMIT = int(os.environ.get('LOCAL_JUDGE_OUTPUT_LIMIT_MB', '16')) * 1024 * 1024
+# 错误输出只保留开头部分，其余读取后丢弃
+STDERR_LIMIT = 64 * 1024
+# 使用比较器时保留的输出开头部分（字符），用于错误信息
+OUTPUT_PREVIEW = 4096
+# 每次从管道读取的字节数
+READ_CHUNK = 64 * 1024
+# 不足整秒的CPU时间限制由监视线程检查，两次检查之间的最短间隔（秒）
+CPU_CHECK_INTERVAL = 0.01
+
+_CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+
+# 内存不足时常见的错误输出，配合峰值内存判断是否为内存超限
+_OOM_MARKERS = ('MemoryError', 'std::bad_alloc', 'Cannot allocate memory', 'OutOfMemoryError')
+
+
+class RunResult:
+    """一次受限运行的结果"""
+
+    __slots__ = ('verdict', 'returncode', 'stdout', 'stderr', 'cpu_time', 'wall_time', 'peak_memory', 'spawn_time')
+
+    def __init__(self, verdict, returncode=None, stdout='', stderr='', cpu_time=None, wall_time=0.0, peak_memory=None,
+                 spawn_time=None):
+        self.verdict = verdict
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.cpu_time = cpu_time        # 秒，不可用时为None
+        self.wall_time = wall_time      # 秒
+        self.peak_memory = peak_memory  # KB，不可用时为None
+        self.spawn_time = spawn_time    # 启动子进程的耗时（秒），不可用时为None
+
+
+def _apply_limits(cpu_seconds, memory_bytes):
+    """在子进程中（exec之前）设置资源限制
+
+    CPU时间达到软限制时内核发送SIGXCPU结束进程，硬限制多留1秒作为兜底。
+    """
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1))
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+    if memory_bytes:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+        _, stack_hard = resource.getrlimit(resource.RLIMIT_STACK)
+        if stack_hard == resource.RLIM_INFINITY or stack_hard >= memory_bytes:
+            resource.setrlimit(resource.RLIMIT_STACK, (memory_bytes, stack_hard))
+
+
+def process_cpu_time(pid):
+    """进程已使用的CPU时间（秒，读取 /proc/<pid>/stat），不支持的平台返回None"""
+    try:
+        with open(f'/proc/{pid}/stat', 'rb') as f:
+            fields = f.read().rsplit(b')', 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def _watch_cpu(pid, time_limit, kill, stopped):
+    """RLIMIT_CPU 只能精确到秒：按已用CPU时间结束超过不足整秒的限制的进程"""
+    delay = time_limit
+    while not stopped.wait(delay):
+        cpu_time = process_cpu_time(pid)
+        if cpu_time is None:
+            return
+        if cpu_time >= time_limit:
+            kill('cpu_exceeded')
+            return
+        delay = max(time_limit - cpu_time, CPU_CHECK_INTERVAL)
+
+
+def _decode(data):
+    """按文本模式解码输出（与 text=True 一致地统一换行符）"""
+    return data.decode('utf-8', errors='replace').replace('\r\n', '\n').replace('\r', '\n')
+
+
+def _peak_memory_kb(usage):
+    # macOS 上 ru_maxrss 的单位是字节，Linux 上是KB
+    if os.uname().sysname == 'Darwin':
+        return usage.ru_maxrss // 1024
+    return usage.ru_maxrss
+
+
+class OutputCapture:
+    """增量读取标准输出
+
+    按块解码（统一换行符）后交给比较器（见 compare.py 的 Comparison），
+    不保存完整输出；没有指定比较方式时保存全部输出。累计超过 limit 字节时
+    调用 on_exceed（通常是结束进程）并停止读取。compare_time 为比较器累计耗时（秒）。
+    """
+
+    def __init__(self, comparison=None, expected='', limit=OUTPUT_LIMIT):
+        self.comparison = comparison
+        self.expected = expected
+        self.limit = limit
+        self.on_exceed = None
+        self.reset()
+
+    def reset(self):
+        """丢弃已读取的内容，用于改用其他方式重新运行"""
+        self.comparator = self.comparison.make(self.expected) if self.comparison is not None else None
+        self.size = 0
+        self.exceeded = False
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._carriage_return = False
+        self._chunks = []
+        self._kept = 0
+        self.compare_time = 0.0
+
+    def feed(self, data):
+        """处理一块原始输出，超过上限时返回False"""
+        self.size += len(data)
+        if self.size > self.limit:
+            self.exceeded = True
+            if self.on_exceed is not None:
+                self.on_exceed()
+            return False
+        self._text(self._decoder.decode(data))
+        return True
+
+    def _text(self, text):
+        if self._carriage_return:
+            text = '\r' + text
+            self._carriage_return = False
+        if text.endswith('\r'):
+            # 可能是被拆开的 \r\n，等下一块再处理
+            text = text[:-1]
+            self._carriage_return = True
+        if not text:
+            return
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+        if self.comparator is not None:
+            start = time.perf_counter()
+            self.comparator.feed(text)
+            self.compare_time += time.perf_counter() - start
+            if self._kept < OUTPUT_PREVIEW:
+                text = text[:OUTPUT_PREVIEW - self._kept]
+            else:
+                return
+        self._chunks.append(text)
+        self._kept += len(text)
+
+    def consume(self, stream):
+        """从二进制流读取直到结束或超过上限，然后关闭流"""
+        try:
+            while True:
+                data = stream.read1(READ_CHUNK)
+                if not data or not self.feed(data):
+                    break
+        except (OSError, ValueError):
+            pass
+        finally:
+            try:
+                stream.close()
+            except OSError:
+                pass
+
+    def close(self):
+        """处理剩余的缓冲数据"""
+        tail = self._decoder.decode(b'', final=True)
+        if self._carriage_return:
+            tail += '\r'
+            self._carriage_return = False
+        if tail:
+            self._text(tail.replace('\r', '\n'))
+
+    @property
+    def text(self):
+        """读取到的输出（使用比较器时只有开头部分）"""
+        return ''.join(self._chunks)
+
+    @property
+    def matched(self):
+        """输出是否与期望一致，没有比较器时为None"""
+        if self.comparator is None:
+            return None
+        if self.exceeded:
+            return False
+        start = time.perf_counter()
+        matched = self.comparator.finish()
+        self.compare_time += time.perf_counter() - start
+        return matched
+
+
+def classify(returncode, stderr, cpu_time, peak_memory, time_limit, memory_limit, wall_timed_out,
+             output_exceeded=False):
+    """根据退出状态和资源占用判定结果"""
+    if output_exceeded:
+        return VERDICT_OLE
+    if wall_timed_out:
+        # 被墙钟超时结束时，若CPU时间已超限则按CPU超时处理
+        if cpu_time is not None and cpu_time > time_limit:
+            return VERDICT_TLE
+        return VERDICT_WTLE
+    if cpu_time is not None and cpu_time > time_limit:
+        return VERDICT_TLE
+    if returncode is not None and returncode < 0 and -returncode in (getattr(signal, 'SIGXCPU', -1),):
+        return VERDICT_TLE
+    if returncode != 0:
+        if memory_limit and peak_memory is not None and peak_memory >= memory_limit * 1024 * 0.9:
+            return VERDICT_MLE
+        if any(marker in stderr for marker in _OOM_MARKERS):
+            return VERDICT_MLE
+        return VERDICT_RE
+    if memory_limit and peak_memory is not None and peak_memory > memory_limit * 1024:
+        return VERDICT_MLE
+    return VERDICT_OK
+
+
+def _read_stderr(stream, outputs):
+    """读取错误输出，只保留开头 STDERR_LIMIT 字节"""
+    kept = []
+    size = 0
+    try:
+        while True:
+            data = stream.read1(READ_CHUNK)
+            if not data:
+                break
+            if size < STDERR_LIMIT:
+                kept.append(data[:STDERR_LIMIT - size])
+                size += len(kept[-1])
+    except (OSError, ValueError):
+        pass
+    finally:
+        stream.close()
+    outputs['stderr'] = b''.join(kept)
+
+
+def open_input(input_data):
+    """输入为 TestData 时打开文件（作为子进程的标准输入），否则返回None（通过管道写入）"""
+    if isinstance(input_data, TestData):
+        return input_data.open()
+    return None
+
+
+def start_io(stdin, stdout, stderr, input_data, capture):
+    """在后台线程中向子进程写入输入并读取输出，返回供 finish_io 使用的句柄
+
+    标准输出交给 capture（OutputCapture）增量处理。stdin 为None时子进程直接读取输入文件，不写入。
+    """
+    outputs = {}
+    readers = [
+        threading.Thread(target=capture.consume, args=(stdout,), daemon=True),
+        threading.Thread(target=_read_stderr, args=(stderr, outputs), daemon=True),
+    ]
+    for reader in readers:
+        reader.start()
+
+    if stdin is None:
+        return readers, outputs, capture
+    try:
+        stdin.write(input_data.encode('utf-8'))
+    except (BrokenPipeError, OSError):
+        pass
+    finally:
+        try:
+            stdin.close()
+        except OSError:
+            pass
+    return readers, outputs, capture
+
+
+def finish_io(io_handle):
+    """等待输出读取完毕，返回解码后的 (stdout, stderr)"""
+    readers, outputs, capture = io_handle
+    for reader in readers:
+        # 子进程派生的后台进程可能一直持有输出管道，不无限等待
+        reader.join(timeout=WALL_TIME_EXTRA)
+    capture.close()
+    return capture.text, _decode(outputs.get('stderr', b''))
+
+
+def run_limited(cmd, input_data, time_limit, memory_limit=None, limit_address_space=True, capture=None):
+    """运行命令并施加资源限制
+
+    time_limit 为CPU时间限制（秒），memory_limit 为内存限制（MB）。
+    limit_address_space 为False时不设置地址空间限制（如JVM会预留大量虚拟内存，
+    改由 -Xmx 控制堆大小），但仍按峰值内存判定内存超限。
+    capture 为 OutputCapture，用于流式比较输出；输出超过上限时立即结束进程。
+    """
+    wall_timeout = time_limit * WALL_TIME_FACTOR + WALL_TIME_EXTRA
+    start_time = time.monotonic()
+    capture = capture or OutputCapture()
+
+    if resource is None or not hasattr(os, 'wait4'):
+        return _run_unlimited(cmd, input_data, time_limit, wall_timeout, start_time, capture)
+
+    memory_bytes = int(memory_limit * 1024 * 1024) if memory_limit and limit_address_space else 0
+    cpu_seconds = max(1, int(math.ceil(time_limit)))
+    input_file = open_input(input_data)
+    try:
+        proc = subprocess.Popen(
+            cmd, stdin=input_file or subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            preexec_fn=lambda: _apply_limits(cpu_seconds, memory_bytes)
+        )
+    finally:
+        if input_file is not None:
+            input_file.close()
+    spawn_time = time.monotonic() - start_time
+
+    lock = threading.Lock()
+    state = {'reaped': False, 'timed_out': False, 'cpu_exceeded': False}
+
+    def kill(reason=None):
+        # 不能用 proc.kill()：它会先调用 poll() 回收子进程，导致 wait4 拿不到 rusage
+        with lock:
+            if not state['reaped']:
+                if reason:
+                    state[reason] = True
+                try:
+                    os.kill(proc.pid, signal.SIGKILL)
+                except OSError:
+                    pass
+
+    timer = threading.Timer(wall_timeout, kill, args=('timed_out',))
+    timer.daemon = True
+    timer.start()
+    stopped = threading.Event()
+    if time_limit < cpu_seconds:
+        threading.Thread(target=_watch_cpu, args=(proc.pid, time_limit, kill, stopped), daemon=True).start()
+    capture.on_exceed = kill
+
+    io_handle = start_io(proc.stdin, proc.stdout, proc.stderr, input_data, capture)
+
+    _, status, usage = os.wait4(proc.pid, 0)
+    with lock:
+        state['reaped'] = True
+        timer.cancel()
+        stopped.set()
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    wall_time = time.monotonic() - start_time
+    stdout, stderr = finish_io(io_handle)
+    cpu_time = usage.ru_utime + usage.ru_stime
+    peak_memory = _peak_memory_kb(usage)
+    verdict = classify(proc.returncode, stderr, cpu_time, peak_memory, time_limit, memory_limit, state['timed_out'],
+                       capture.exceeded)
+    if state['cpu_exceeded'] and verdict != VERDICT_OLE:
+        verdict = VERDICT_TLE
+    return RunResult(verdict, proc.returncode, stdout, stderr, cpu_time, wall_time, peak_memory, spawn_time)
+
+
+def _run_unlimited(cmd, input_data, time_limit, wall_timeout, start_time, capture):
+    """不支持资源限制的平台：只做墙钟超时"""
+    input_file = open_input(input_data)
+    try:
+        proc = subprocess.Popen(cmd, stdin=input_file or subprocess.PIPE, stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE)
+    finally:
+        if input_file is not None:
+            input_file.close()
+    spawn_time = time.monotonic() - start_time
+    capture.on_exceed = proc.kill
+    io_handle = start_io(proc.stdin, proc.stdout, proc.stderr, input_data, capture)
+    try:
+        proc.wait(timeout=wall_timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+        finish_io(io_handle)
+        return RunResult(VERDICT_WTLE, wall_time=time.monotonic() - start_time, spawn_time=spawn_time)
+    wall_time = time.monotonic() - start_time
+    stdout, stderr = finish_io(io_handle)
+    if capture.exceeded:
+        verdict = VERDICT_OLE
+    else:
+        verdict = VERDICT_OK if proc.returncode == 0 else VERDICT_RE
+    return RunResult(verdict, proc.returncode, stdout, stderr, None, wall_time, None, spawn_time)
@@ -0,0 +1,471 @@
+# -*- coding: utf-8 -*-
+"""
+测评调度：单份提交的评分汇总，以及批量测评的并行调度与去重
+"""
+
+import os
+import time
+import hashlib
+import threading
+import functools
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from .build import build_program, run_program, describe_language
+from .compare import Comparison
+from .policy import ScoringPolicy, skipped_result, test_case_passed
+from .metrics import (
+    BUSY_WORKERS, CACHE_REQUESTS, QUEUE_DEPTH, RERUNS, SUBMISSIONS, VERDICTS, observe_stage
+)
+from .testdata import preview_text
+from .sandbox import OutputCapture, VERDICT_AC, VERDICT_WA, VERDICT_SE, VERDICT_SKIP, VERDICT_TLE, VERDICT_WTLE
+
+# 未指定比较方式时使用默认的 strip 比较
+DEFAULT_COMPARISON = Comparison()
+# 未指定评分策略时每个测试用例按比例得分
+DEFAULT_POLICY = ScoringPolicy()
+
+# 按校准的时间限制超时后重新运行确认；同一时刻只有一个确认运行，减少与其他测试用例争抢CPU
+CONFIRM_VERDICTS = (VERDICT_TLE, VERDICT_WTLE)
+_confirm_lock = threading.Lock()
+
+
+def normalize_source(code, language):
+    """规范化源码，用于识别内容相同的提交
+
+    只统一换行符、去掉行尾空白和文件首尾的空行。行首缩进、中间的空行和行内空白
+    都可能位于字符串字面量中（如 C++ 原始字符串、Python 三引号字符串），一律保留，
+    避免把输出不同的程序误判为相同。各语言使用相同的规则。
+    """
+    lines = (line.rstrip() for line in code.replace('\r\n', '\n').replace('\r', '\n').split('\n'))
+    return '\n'.join(lines).strip('\n')
+
+
+def submission_fingerprint(question_id, language, code):
+    """按 (题目, 语言及编译参数, 规范化源码) 计算提交指纹"""
+    digest = hashlib.sha256()
+    for part in (str(question_id), describe_language(language), normalize_source(code, language)):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\x1e')
+    return digest.hexdigest()
+
+
+def timed_build(code, language, artifact_cache=None, precompiled_headers=None):
+    """构建程序，返回 (构建产物, 耗时秒数)，并记录编译阶段耗时"""
+    start_time = time.time()
+    artifact = build_program(code, language, artifact_cache, precompiled_headers=precompiled_headers)
+    build_time = time.time() - start_time
+    observe_stage('compile', build_time)
+    return artifact, build_time
+
+
+def _run_once(artifact, test_case, entry, runners, comparison):
+    capture = OutputCapture(comparison or DEFAULT_COMPARISON, test_case.get('expectedOutput', ''))
+    if entry is not None:
+        return run_program(artifact, test_case.get('input', ''), test_case.get('timeLimit', entry.time_limit),
+                           entry.memory_limit, runners, capture)
+    return run_program(artifact, test_case.get('input', ''), runners=runners, capture=capture)
+
+
+def run_test_case(artifact, test_case, entry=None, runners=None, comparison=None):
+    """按题目的时间和内存限制运行单个测试用例，返回 (执行结果, 耗时秒数)
+
+    输出在运行过程中按 comparison 与期望输出流式比较，结果见执行结果中的 matched。
+    测试用例带有校准的时间限制（timeLimit，见 calibrate）时按该限制运行，超时后再运行一次，
+    两次都超时才判定为超时。启动进程、运行和比较输出的耗时计入各阶段的指标。
+    """
+    start_time = time.time()
+    execution_result = _run_once(artifact, test_case, entry, runners, comparison)
+    if entry is not None and 'timeLimit' in test_case and execution_result.get('verdict') in CONFIRM_VERDICTS:
+        with _confirm_lock:
+            rerun_result = _run_once(artifact, test_case, entry, runners, comparison)
+        if rerun_result.get('verdict') in CONFIRM_VERDICTS:
+            RERUNS.inc(outcome='confirmed')
+        else:
+            RERUNS.inc(outcome='overturned')
+            execution_result = rerun_result
+    elapsed = time.time() - start_time
+    observe_stage('spawn', execution_result.get('spawn_time'))
+    observe_stage('run', execution_result.get('wall_time'))
+    observe_stage('compare', execution_result.get('compare_time'))
+    return execution_result, elapsed
+
+
+def no_test_cases_result():
+    return {
+        'status': '无测试用例',
+        'score': 0,
+        'execution_time': 0,
+        'error': '该题目没有配置测试用例，请检查题目配置。'
+    }
+
+
+def evaluation_error_result(error):
+    return {
+        'status': '评测错误',
+        'score': 0,
+        'execution_time': 0,
+        'error': str(error)
+    }
+
+
+def summarize_evaluation(entry, run_results, build_time, comparison=None, policy=None):
+    """根据各测试用例的执行结果计算状态、得分和耗时
+
+    run_results 与 entry.test_cases 一一对应，顺序执行和并行执行共用此函数，
+    保证两种方式的评测结果一致。执行结果中没有流式比较结果（matched）时
+    按 comparison 比较完整输出。得分按 policy（policy.ScoringPolicy）计算，
+    默认每个通过的测试用例按比例得分。
+    结果中的 timings 为各阶段耗时合计（毫秒）：compile 编译、spawn 启动进程、
+    run 运行、compare 比较输出。
+    """
+    comparison = comparison or DEFAULT_COMPARISON
+    passed = []
+    skipped_cases = 0
+    total_cases = len(entry.test_cases)
+    error_messages = []
+    execution_time = build_time
+    tests = []
+    timings = {'compile': build_time, 'spawn': 0.0, 'run': 0.0, 'compare': 0.0}
+    
+    for i, (test_case, (execution_result, elapsed)) in enumerate(zip(entry.test_cases, run_results)):
+        input_data = preview_text(test_case.get('input', ''))
+        expected_output = preview_text(test_case.get('expectedOutput', '')).strip()
+        execution_time += elapsed
+        verdict = execution_result.get('verdict', VERDICT_SE)
+        passed.append(test_case_passed(test_case, execution_result, comparison))
+        
+        if execution_result['success']:
+            actual_output = execution_result['output'].strip()
+            if passed[-1]:
+                verdict = VERDICT_AC
+            else:
+                verdict = VERDICT_WA
+                error_messages.append(f"测试用例{i+1}失败: 输入'{input_data}'，期望'{expected_output}'，实际'{actual_output}'")
+        elif verdict == VERDICT_SKIP:
+            skipped_cases += 1
+        else:
+            error_messages.append(f"测试用例{i+1}执行错误: 输入'{input_data}'，错误信息'{execution_result['error']}'")
+        
+        # 每个测试用例的判定结果、资源占用和各阶段耗时（时间单位毫秒，内存单位KB）
+        cpu_time = execution_result.get('cpu_time')
+        wall_time = execution_result.get('wall_time', elapsed)
+        spawn_time = execution_result.get('spawn_time')
+        compare_time = execution_result.get('compare_time')
+        timings['run'] += wall_time
+        timings['spawn'] += spawn_time or 0
+        timings['compare'] += compare_time or 0
+        VERDICTS.inc(verdict=verdict)
+        tests.append({
+            'verdict': verdict,
+            'cpu_time': round(cpu_time * 1000, 2) if cpu_time is not None else None,
+            'wall_time': round(wall_time * 1000, 2),
+            'peak_memory': execution_result.get('peak_memory'),
+            'spawn_time': round(spawn_time * 1000, 2) if spawn_time is not None else None,
+            'compare_time': round(compare_time * 1000, 2) if compare_time is not None else None
+        })
+    
+    # 计算得分：passed_cases 为计分的测试用例数（所在组全部通过）
+    score, passed_cases = (policy or DEFAULT_POLICY).score(entry, passed)
+    
+    # 确定状态
+    status = "通过" if passed_cases == total_cases else f"部分通过({passed_cases}/{total_cases})"
+    if passed_cases == 0:
+        status = "失败"
+    SUBMISSIONS.inc(status=status.split('(')[0])
+    
+    error = '; '.join(error_messages[:3])  # 只显示前3个错误
+    if skipped_cases:
+        error += f"{'; ' if error else ''}{skipped_cases}个测试用例因同组已失败未运行"
+    
+    return {
+        'status': status,
+        'score': round(score, 1),
+        'execution_time': round(execution_time * 1000, 2),  # 转换为毫秒
+        'error': error,
+        'max_cpu_time': max((t['cpu_time'] for t in tests if t['cpu_time'] is not None), default=None),
+        'peak_memory': max((t['peak_memory'] for t in tests if t['peak_memory'] is not None), default=None),
+        'tests': tests,
+        'timings': {stage: round(seconds * 1000, 2) for stage, seconds in timings.items()}
+    }
+
+
+class _Usage:
+    """一组提交（如批量测评中的一场考试）的去重和结果存储统计"""
+
+    __slots__ = ('submissions', 'duplicates', 'cache_hits', 'cache_misses')
+
+    def __init__(self):
+        self.submissions = 0
+        # 被复用的 Future -> 复用次数
+        self.duplicates = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+
+class JudgeScheduler:
+    """并行测评调度器
+
+    每份提交先进入编译队列构建一次，构建完成后按 (提交, 测试用例)
+    拆分为运行任务进入运行队列。编译与运行使用各自的并发上限，
+    因为编译器占用的内存远大于一般的学生程序。每个任务都在独立的
+    子进程中执行，调度线程只负责派发和收集，因此可以占满所有CPU核心。
+
+    指定 result_store（resultstore.ResultStore）时，已记录结果的测试用例
+    不再运行，全部命中时连编译也省去；新运行的结果完成后立即记录。
+    reuse_results 为False时不读取已记录的结果（全部重新运行），但仍然记录。
+
+    policy（policy.ScoringPolicy）决定得分计算和测试用例的运行顺序；
+    会跳过测试用例的策略下，同组已有测试用例失败后，尚未开始运行的同组测试用例不再运行。
+
+    同一个调度器可以依次测评多场考试（见 JudgeEngine.judge_exams），提交时的 tag
+    区分各场考试的去重和结果存储统计；相同题目条目上的相同代码在考试之间也只测评一次。
+    """
+
+    def __init__(self, workers=None, compile_workers=None, artifact_cache=None, runners=None, comparison=None,
+                 result_store=None, reuse_results=True, precompiled_headers=None, policy=None):
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.compile_workers = max(1, compile_workers or (self.workers + 1) // 2)
+        self.artifact_cache = artifact_cache
+        self.precompiled_headers = precompiled_headers
+        self.runners = runners
+        self.comparison = comparison or DEFAULT_COMPARISON
+        self.policy = policy or DEFAULT_POLICY
+        self._compile_pool = ThreadPoolExecutor(max_workers=self.compile_workers, thread_name_prefix='judge-compile')
+        self._run_pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='judge-run')
+        self.result_store = result_store
+        self.reuse_results = reuse_results
+        # 相同提交只测评一次：(指纹, 题目条目) -> Future
+        self._groups = {}
+        # 标签 -> 统计（_Usage）
+        self._usage = {}
+
+    def describe(self):
+        return f'{self.workers} 个运行进程，{self.compile_workers} 个编译进程'
+
+    def _tag_usage(self, tag):
+        usage = self._usage.get(tag)
+        if usage is None:
+            usage = self._usage[tag] = _Usage()
+        return usage
+
+    def _usages(self, tag):
+        """tag 的统计，tag 为None时为全部统计"""
+        if tag is None:
+            return list(self._usage.values())
+        return [self._usage[tag]] if tag in self._usage else []
+
+    def submit_deduplicated(self, question_id, code, language, entry, tag=None):
+        """提交测评，与已提交过的代码相同（忽略换行符和行尾空白的差异）时直接复用其结果；tag 相同的提交一起统计"""
+        # 题目ID相同但测试用例不同（如不同时间保存的离线快照）时不能复用
+        key = (submission_fingerprint(question_id, language, code), entry)
+        usage = self._tag_usage(tag)
+        usage.submissions += 1
+        future = self._groups.get(key)
+        if future is None:
+            future = self._groups[key] = self.submit(code, language, entry, tag)
+        else:
+            usage.duplicates[future] = usage.duplicates.get(future, 0) + 1
+        return future
+
+    def dedup_summary(self, tag=None):
+        """去重统计：提交总数、实际测评数、重复率及节省的测评时间（毫秒），tag 为None时统计全部提交"""
+        usages = self._usages(tag)
+        total = sum(usage.submissions for usage in usages)
+        duplicates = sum(sum(usage.duplicates.values()) for usage in usages)
+        unique = total - duplicates
+        saved_ms = sum(
+            future.result()['execution_time'] * count
+            for usage in usages
+            for future, count in usage.duplicates.items()
+            if future.done()
+        )
+        return {
+            'total': total,
+            'unique': unique,
+            'duplicates': duplicates,
+            'ratio': duplicates / total if total else 0,
+            'saved_ms': round(saved_ms, 2)
+        }
+
+    def cache_summary(self, tag=None):
+        """结果存储统计：命中和未命中（实际运行）的测试用例数，tag 为None时统计全部提交"""
+        usages = self._usages(tag)
+        hits = sum(usage.cache_hits for usage in usages)
+        misses = sum(usage.cache_misses for usage in usages)
+        total = hits + misses
+        return {
+            'enabled': self.result_store is not None,
+            'hits': hits,
+            'misses': misses,
+            'ratio': hits / total if total else 0
+        }
+
+    def submit(self, code, language, entry, tag=None):
+        """提交一份代码进行测评，返回Future，结果格式与evaluate_code相同；tag 见 submit_deduplicated"""
+        future = Future()
+        if not entry or not entry.test_cases:
+            future.set_result(no_test_cases_result())
+            return future
+        
+        test_cases = entry.test_cases
+        run_results = [None] * len(test_cases)
+        keys = None
+        if self.result_store is not None:
+            keys = self.result_store.unit_keys(code, language, entry, self.comparison)
+            if self.reuse_results:
+                stored = self.result_store.get_many(keys)
+                run_results = [stored.get(key) for key in keys]
+        progress = self.policy.progress(entry, self.comparison)
+        for index, run_result in enumerate(run_results):
+            if run_result is not None:
+                progress.record(index, run_result)
+        stored_count = len(test_cases) - run_results.count(None)
+        pending = []
+        for index in self.policy.order(entry, range(len(test_cases))):
+            if run_results[index] is not None:
+                continue
+            if progress.should_skip(index):
+                # 已记录的结果中同组已有失败
+                run_results[index] = skipped_result()
+            else:
+                pending.append(index)
+        usage = self._tag_usage(tag)
+        usage.cache_hits += stored_count
+        usage.cache_misses += len(pending)
+        if self.result_store is not None:
+            CACHE_REQUESTS.inc(stored_count, cache='result_store', result='hit')
+            CACHE_REQUESTS.inc(len(pending), cache='result_store', result='miss')
+        if not pending:
+            # 所有测试用例都已有结果，不需要编译
+            future.set_result(summarize_evaluation(entry, run_results, 0, self.comparison, self.policy))
+            return future
+        
+        remaining = [len(pending)]
+        build_time = [0.0]
+        lock = threading.Lock()
+        
+        def on_unit_done(index, run_result, unit_build_time=0.0):
+            if keys is not None:
+                try:
+                    self.result_store.put(keys[index], *run_result)
+                except Exception as e:
+                    run_result = ({'success': False, 'error': str(e)}, 0)
+            progress.record(index, run_result)
+            with lock:
+                run_results[index] = run_result
+                build_time[0] = max(build_time[0], unit_build_time)
+                remaining[0] -= 1
+                finished = remaining[0] == 0
+            if finished:
+                try:
+                    future.set_result(summarize_evaluation(entry, run_results, build_time[0], self.comparison,
+                                                           self.policy))
+                except Exception as e:
+                    future.set_result(evaluation_error_result(e))
+        
+        def on_error(error):
+            if not future.done():
+                future.set_result(evaluation_error_result(error))
+        
+        skip = progress.should_skip if self.policy.skips else None
+        self.dispatch(code, language, entry, pending, on_unit_done, on_error, skip)
+        return future
+
+    def dispatch(self, code, language, entry, pending, on_unit_done, on_error, skip=None):
+        """执行一份提交中尚无结果的测试用例（pending 为下标，按运行顺序排列）
+
+        每个测试用例完成后调用 on_unit_done(下标, (执行结果, 耗时秒数), 构建耗时秒数)，
+        无法执行时调用 on_error(异常)。skip(下标) 为True的测试用例不必运行，
+        以 policy.skipped_result() 作为结果。本地调度为先编译一次，再把各测试用例交给运行队列；
+        子类（如 distributed.Coordinator）可以改为交给其他机器执行。
+
+        指定 skip 时按顺序每批最多 workers 个测试用例交给运行队列，一批全部完成后
+        才检查 skip 并加入下一批：否则并行测评时第一个失败被记录之前，
+        其余测试用例几乎都已开始运行，跳过不了多少。
+        """
+        def on_built(build_future):
+            try:
+                artifact, build_time = build_future.result()
+            except Exception as e:
+                on_error(e)
+                return
+            
+            if not artifact.success:
+                # 编译失败：各测试用例的结果相同，不进入运行队列
+                artifact.cleanup()
+                for index in pending:
+                    on_unit_done(index, (run_program(artifact, ''), 0), build_time)
+                return
+            
+            remaining = [len(pending)]
+            waiting = iter(pending)
+            wave_size = len(pending) if skip is None else self.workers
+            # 本批尚未完成的测试用例数
+            running = [0]
+            lock = threading.Lock()
+            
+            def finish(index, run_result):
+                with lock:
+                    remaining[0] -= 1
+                    finished = remaining[0] == 0
+                if finished:
+                    artifact.cleanup()
+                on_unit_done(index, run_result, build_time)
+            
+            def run_wave():
+                """把下一批测试用例交给运行队列，已不必运行的直接记为跳过"""
+                wave = []
+                for index in waiting:
+                    if skip is not None and skip(index):
+                        finish(index, skipped_result())
+                        continue
+                    wave.append(index)
+                    if len(wave) >= wave_size:
+                        break
+                running[0] = len(wave)
+                for index in wave:
+                    QUEUE_DEPTH.inc(queue='run')
+                    run_future = self._run_pool.submit(self._run, artifact, entry, index, skip)
+                    run_future.add_done_callback(functools.partial(on_run_done, index))
+            
+            def on_run_done(index, run_future):
+                try:
+                    run_result = run_future.result()
+                except Exception as e:
+                    run_result = ({'success': False, 'error': str(e)}, 0)
+                # 先记录结果（失败时 skip 随之变化），本批全部完成后再加入下一批
+                finish(index, run_result)
+                with lock:
+                    running[0] -= 1
+                    wave_done = running[0] == 0
+                if wave_done:
+                    run_wave()
+            
+            run_wave()
+        
+        QUEUE_DEPTH.inc(queue='compile')
+        self._compile_pool.submit(self._build, code, language).add_done_callback(on_built)
+
+    def _build(self, code, language):
+        QUEUE_DEPTH.dec(queue='compile')
+        BUSY_WORKERS.inc(pool='compile')
+        try:
+            return timed_build(code, language, self.artifact_cache, self.precompiled_headers)
+        finally:
+            BUSY_WORKERS.dec(pool='compile')
+
+    def _run(self, artifact, entry, index, skip=None):
+        QUEUE_DEPTH.dec(queue='run')
+        if skip is not None and skip(index):
+            return skipped_result()
+        BUSY_WORKERS.inc(pool='run')
+        try:
+            return run_test_case(artifact, entry.test_cases[index], entry, self.runners, self.comparison)
+        finally:
+            BUSY_WORKERS.dec(pool='run')
+
+    def shutdown(self, wait=True):
+        self._compile_pool.shutdown(wait=wait)
+        self._run_pool.shutdown(wait=wait)
+        if self.result_store is not None:
+            self.result_store.flush()
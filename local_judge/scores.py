@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+"""
+成绩汇总、上传和导出
+
+  - ScoreAggregator：逐条读取测评结果，按学生累加编程题得分（只需一遍），
+    同一学生同一道题重复测评时只取最后一次的得分；
+  - ScoreUploader：把每个学生的编程成绩分批 POST 到
+    /api/teacher/exams/{id}/import-programming-scores（JSON 批量模式），
+    失败时按指数退避重试。服务器按学生设置成绩的绝对值，重复提交不会重复加分。
+    差异模式下只上传与上次上传不同的成绩，上次上传的成绩保存在
+    ~/.local_judge/uploads/ 中，每批成功后立即更新，中断后再次上传只补传剩余部分；
+  - ResultExporter：逐条写出完整的测评结果（CSV、JSON Lines 或 XLSX），
+    不在内存中积累全部结果。XLSX 需要安装 openpyxl（可选依赖）。
+"""
+
+import os
+import re
+import csv
+import json
+import time
+import hashlib
+import logging
+
+import requests
+
+from .build import ARTIFACT_CACHE_DIR
+from .client import HTTP_RETRIES, HTTP_BACKOFF, RETRY_STATUS
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+logger = logging.getLogger(__name__)
+
+# 每个上传请求包含的学生数（服务器上限为1000）
+UPLOAD_CHUNK_SIZE = 200
+
+UPLOAD_STATE_DIR = os.path.join(os.path.dirname(ARTIFACT_CACHE_DIR), 'uploads')
+
+EXPORT_FORMATS = ('csv', 'jsonl', 'xlsx')
+
+# XLSX 单元格中不允许出现的控制字符（学生程序输出可能包含）
+_XLSX_ILLEGAL_CHARACTERS = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+# 导出的列：(表头, 结果字段)
+EXPORT_COLUMNS = (
+    ('考试ID', 'exam_id'),
+    ('学生', 'student'),
+    ('学生ID', 'student_id'),
+    ('题目', 'question'),
+    ('题目ID', 'question_id'),
+    ('语言', 'language'),
+    ('状态', 'status'),
+    ('得分', 'score'),
+    ('执行时间(ms)', 'execution_time'),
+    ('最大CPU时间(ms)', 'max_cpu_time'),
+    ('峰值内存(KB)', 'peak_memory'),
+    ('错误信息', 'error'),
+)
+
+
+class ScoreUploadError(Exception):
+    """成绩上传失败"""
+
+
+class ScoreAggregator:
+    """按学生累加编程题得分；同一道题有多条结果（重复测评）时只取最后一条"""
+
+    def __init__(self):
+        # 学生ID -> [姓名, {(考试ID, 题目ID): 得分}]，按第一次出现的顺序
+        self._students = {}
+
+    def add(self, row):
+        key = row.get('student_id') or row.get('student', '')
+        student = self._students.get(key)
+        if student is None:
+            student = self._students[key] = [row.get('student', ''), {}]
+        question = (row.get('exam_id'), row.get('question_id') or row.get('question', ''))
+        student[1][question] = row.get('score') or 0
+
+    def __len__(self):
+        return len(self._students)
+
+    def scores(self):
+        """{学生ID: 编程总分}"""
+        return {student_id: round(sum(scores.values()), 1) for student_id, (_, scores) in self._students.items()}
+
+    def rows(self):
+        """按学生顺序产出 (学生ID, 姓名, 编程总分)"""
+        for student_id, (name, scores) in self._students.items():
+            yield student_id, name, round(sum(scores.values()), 1)
+
+    def write_csv(self, path):
+        """导出为导入页面可直接上传的 学生,得分 两列CSV（每个学生一行）"""
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['学生', '得分'])
+            for _, name, total in self.rows():
+                writer.writerow([name, total])
+
+
+class ScoreUploader:
+    """分批上传编程成绩，支持只上传有变化的成绩"""
+
+    def __init__(self, client, url, state_key, chunk_size=UPLOAD_CHUNK_SIZE, retries=HTTP_RETRIES,
+                 backoff=HTTP_BACKOFF):
+        self.client = client
+        self.url = url
+        self.chunk_size = max(1, chunk_size)
+        self.retries = retries
+        self.backoff = backoff
+        name = hashlib.sha256(state_key.encode('utf-8')).hexdigest()[:24]
+        self.state_path = os.path.join(UPLOAD_STATE_DIR, f'{name}.json')
+
+    def load_state(self):
+        """上次上传成功的成绩 {学生ID: 得分}"""
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self, state):
+        os.makedirs(UPLOAD_STATE_DIR, exist_ok=True)
+        temp_path = f'{self.state_path}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(temp_path, self.state_path)
+
+    def _post(self, chunk):
+        """发送一批成绩，连接失败和5xx时重试（服务器按绝对值设置成绩，重试是安全的）"""
+        payload = {'scores': [{'studentId': student_id, 'programmingScore': score} for student_id, score in chunk]}
+        for attempt in range(self.retries + 1):
+            try:
+                response = self.client.post(self.url, json=payload, timeout=60)
+            except requests.RequestException as e:
+                error = f"无法连接到服务器: {e}"
+            else:
+                if response.status_code == 200:
+                    return response.json()
+                try:
+                    error = response.json().get('error', f"服务器返回错误: {response.status_code}")
+                except ValueError:
+                    error = f"服务器返回错误: {response.status_code}"
+                if response.status_code not in RETRY_STATUS:
+                    raise ScoreUploadError(error)
+            if attempt < self.retries:
+                delay = self.backoff * (2 ** attempt)
+                logger.warning("上传成绩失败（%s），%.1f 秒后重试", error, delay)
+                time.sleep(delay)
+        raise ScoreUploadError(error)
+
+    def upload(self, scores, diff=True, on_progress=None):
+        """上传 {学生ID: 得分}，返回 {'uploaded', 'skipped', 'failed', 'errors'}
+
+        diff 为True时跳过与上次上传相同的成绩。on_progress(已处理, 总数) 在每批完成后调用。
+        """
+        state = self.load_state()
+        pending = [(student_id, score) for student_id, score in scores.items()
+                   if not diff or state.get(student_id) != score]
+        summary = {'uploaded': 0, 'skipped': len(scores) - len(pending), 'failed': 0, 'errors': []}
+
+        for start in range(0, len(pending), self.chunk_size):
+            chunk = pending[start:start + self.chunk_size]
+            data = self._post(chunk)
+            imported = set(data.get('imported', []))
+            for student_id, score in chunk:
+                if student_id in imported:
+                    state[student_id] = score
+            summary['uploaded'] += len(imported)
+            summary['failed'] += len(chunk) - len(imported)
+            summary['errors'].extend(data.get('errors', []))
+            # 每批成功后立即记录，中断后再次上传只补传剩余部分
+            self._save_state(state)
+            if on_progress:
+                on_progress(start + len(chunk), len(pending))
+        return summary
+
+
+def export_format(path):
+    """根据扩展名判断导出格式"""
+    extension = os.path.splitext(path)[1].lower().lstrip('.')
+    if extension == 'json':
+        extension = 'jsonl'
+    if extension not in EXPORT_FORMATS:
+        raise ValueError(f"不支持的导出格式: {extension or path}（支持 {', '.join(EXPORT_FORMATS)}）")
+    return extension
+
+
+def exam_export_path(path, exam_id, title=''):
+    """批量测评多场考试时各场考试的导出文件：在文件名后加上考试标题和ID，如 results-期中考试-abc123.csv"""
+    stem, extension = os.path.splitext(path)
+    title = re.sub(r'[\\/:*?"<>|\s]+', '_', str(title or '')).strip('_')[:40]
+    suffix = f'{title}-{exam_id}' if title else str(exam_id)
+    return f'{stem}-{suffix}{extension}'
+
+
+class ResultExporter:
+    """逐条写出完整的测评结果，用作 judge_exam 的 on_result 回调"""
+
+    def __init__(self, path, fmt=None):
+        self.path = path
+        self.format = fmt or export_format(path)
+        self.count = 0
+        self._file = None
+        self._workbook = None
+        if self.format == 'xlsx':
+            if openpyxl is None:
+                raise ValueError("导出XLSX需要安装 openpyxl: pip install openpyxl")
+            # 只写模式逐行写入临时文件，保存时再打包，不在内存中保留所有单元格
+            self._workbook = openpyxl.Workbook(write_only=True)
+            self._sheet = self._workbook.create_sheet('测评结果')
+            self._sheet.append([title for title, _ in EXPORT_COLUMNS])
+        elif self.format == 'csv':
+            self._file = open(path, 'w', newline='', encoding='utf-8')
+            self._writer = csv.writer(self._file)
+            self._writer.writerow([title for title, _ in EXPORT_COLUMNS])
+        else:
+            self._file = open(path, 'w', encoding='utf-8')
+
+    def write(self, row):
+        if self.format == 'jsonl':
+            record = {field: row.get(field) for _, field in EXPORT_COLUMNS}
+            record['tests'] = row.get('tests', [])
+            record['timings'] = row.get('timings')
+            self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        else:
+            values = [row.get(field) for _, field in EXPORT_COLUMNS]
+            if self.format == 'csv':
+                self._writer.writerow(['' if value is None else value for value in values])
+            else:
+                self._sheet.append([_XLSX_ILLEGAL_CHARACTERS.sub('', value) if isinstance(value, str) else value
+                                    for value in values])
+        self.count += 1
+
+    __call__ = write
+
+    def close(self):
+        if self._workbook is not None:
+            self._workbook.save(self.path)
+            self._workbook = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+"""
+相似提交检测（查重）
+
+每道题目的提交两两比较需要 O(n²) 次，这里改为：
+
+  1. 把代码切分为词法记号，去掉注释和空白，标识符统一为 V、数字为 N、字符串为 S，
+     只保留关键字和运算符，改变量名、调整格式不影响结果；
+  2. 取连续 SHINGLE_SIZE 个记号为一个片段，用单次哈希的 MinHash（one permutation hashing）
+     为每份提交计算 NUM_HASHES 个值的签名，签名中相同位置取值相同的比例即片段集合 Jaccard 相似度的估计；
+  3. 签名分为 LSH_BANDS 段，某一段完全相同的提交才作为候选对比较，
+     候选对的数量与提交数大致成线性关系；
+  4. 估计相似度不低于阈值的提交对用并查集合并为相似组。
+
+一道题目中大多数提交都有的片段（题目给出的模板、固定的输入输出写法）在计算签名前去掉。
+片段哈希值按代码内容缓存，同一次运行中不同题目、不同考试里内容相同的代码只切分一次。
+记号数少于 MIN_TOKENS 的提交（如空模板）不参与比较。
+"""
+
+import re
+import operator
+import hashlib
+import threading
+from array import array
+from collections import Counter
+
+# 签名长度（2的幂）、LSH分段数（每段 NUM_HASHES / LSH_BANDS 个值）和片段长度（记号数）
+NUM_HASHES = 128
+LSH_BANDS = 16
+SHINGLE_SIZE = 5
+# 默认的相似度阈值
+DEFAULT_THRESHOLD = 0.8
+MIN_TOKENS = 30
+# 超过该比例（且不少于 COMMON_SHINGLE_MIN 份）的提交都有的片段视为模板代码，不参与比较
+COMMON_SHINGLE_RATIO = 0.5
+COMMON_SHINGLE_MIN = 5
+
+_HASH_BITS = NUM_HASHES.bit_length() - 1
+_MASK = (1 << 64) - 1
+_MIX = 0x9E3779B97F4A7C15
+
+_KEYWORDS = frozenset('''
+    and as assert async await break case catch char class const continue def default del do double elif else
+    enum except extends False final finally float for from global if implements import in int interface is
+    lambda long new None nonlocal not or pass private protected public raise return short signed sizeof static
+    struct super switch this throw throws True try typedef union unsigned void volatile while with yield
+    auto bool boolean byte namespace template typename using std include define vector string map set
+    cin cout scanf printf print input range len
+'''.split())
+
+_C_TOKEN = re.compile(r'''
+    (?P<space>\s+|//[^\n]*|/\*.*?(?:\*/|\Z))
+  | (?P<string>"(?:\\.|[^"\\\n])*"?|'(?:\\.|[^'\\\n])*'?)
+  | (?P<number>\d[\w.]*)
+  | (?P<name>[A-Za-z_]\w*)
+  | (?P<op>[^\s\w])
+''', re.S | re.X)
+
+_PY_TOKEN = re.compile(r'''
+    (?P<space>\s+|\#[^\n]*)
+  | (?P<string>[rRbBuUfF]{0,2}(?:"""(?:\\.|.)*?(?:"""|\Z)|\'\'\'(?:\\.|.)*?(?:\'\'\'|\Z)|"(?:\\.|[^"\\\n])*"?|'(?:\\.|[^'\\\n])*'?))
+  | (?P<number>\d[\w.]*)
+  | (?P<name>[A-Za-z_]\w*)
+  | (?P<op>[^\s\w])
+''', re.S | re.X)
+
+_KIND_TOKENS = {'string': 'S', 'number': 'N'}
+
+
+def tokenize(code, language):
+    """去掉注释和空白、标识符统一后的记号序列"""
+    pattern = _PY_TOKEN if str(language).lower().startswith('py') else _C_TOKEN
+    tokens = []
+    for match in pattern.finditer(code):
+        kind = match.lastgroup
+        if kind == 'space':
+            continue
+        if kind == 'name':
+            text = match.group()
+            tokens.append(text if text in _KEYWORDS else 'V')
+        elif kind == 'op':
+            tokens.append(match.group())
+        else:
+            tokens.append(_KIND_TOKENS[kind])
+    return tokens
+
+
+def shingles(tokens, token_ids):
+    """记号序列中各片段的64位哈希值（去重、排序后的 array）
+
+    token_ids 把记号映射为整数，使哈希值不受字符串哈希随机化影响、每次运行相同。
+    """
+    ids = [token_ids.setdefault(token, len(token_ids)) for token in tokens]
+    values = {(hash(tuple(ids[i:i + SHINGLE_SIZE])) * _MIX) & _MASK for i in range(len(ids) - SHINGLE_SIZE + 1)}
+    return array('Q', sorted(values))
+
+
+def minhash(hashes):
+    """片段哈希值的 MinHash 签名（NUM_HASHES 个整数），没有片段时返回None
+
+    哈希值的高位决定落在签名的哪个位置，低位参与比较（每个位置取最小值）。
+    """
+    shift = 64 - _HASH_BITS
+    low = (1 << shift) - 1
+    slots = [None] * NUM_HASHES
+    for value in hashes:
+        slot = value >> shift
+        value &= low
+        current = slots[slot]
+        if current is None or value < current:
+            slots[slot] = value
+    if all(value is None for value in slots):
+        return None
+    # 没有片段落入的位置取其后第一个非空位置的值（加上距离以区分），使签名长度固定
+    for slot in range(NUM_HASHES):
+        if slots[slot] is None:
+            distance = 1
+            while slots[(slot + distance) % NUM_HASHES] is None:
+                distance += 1
+            slots[slot] = -(slots[(slot + distance) % NUM_HASHES] + distance)
+    return tuple(slots)
+
+
+def estimate_similarity(first, second):
+    """两个签名估计的相似度（0~1）"""
+    return sum(map(operator.eq, first, second)) / NUM_HASHES
+
+
+class SimilarityDetector:
+    """计算并缓存代码签名，可被多个线程同时使用，在引擎的多次测评之间保留"""
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, min_tokens=MIN_TOKENS):
+        self.threshold = threshold
+        self.min_tokens = min_tokens
+        self._lock = threading.Lock()
+        self._token_ids = {}
+        # 代码摘要 -> 片段哈希值（记号太少时为None）
+        self._fingerprints = {}
+
+    def fingerprint(self, code, language):
+        """代码的片段哈希值（shingles 的结果），按代码内容缓存"""
+        key = hashlib.sha1(f'{language}\0{code}'.encode('utf-8', 'replace')).digest()
+        with self._lock:
+            if key in self._fingerprints:
+                return self._fingerprints[key]
+        tokens = tokenize(code, language)
+        with self._lock:
+            fingerprint = shingles(tokens, self._token_ids) if len(tokens) >= self.min_tokens else None
+            self._fingerprints[key] = fingerprint
+        return fingerprint
+
+    def session(self):
+        """一次测评中收集各题目提交的对象"""
+        return SimilaritySession(self)
+
+    def describe(self):
+        return f'查重阈值 {self.threshold:.0%}，已缓存 {len(self._fingerprints)} 份代码'
+
+
+class SimilaritySession:
+    """按题目收集提交的签名，测评结束后找出相似组"""
+
+    def __init__(self, detector):
+        self.detector = detector
+        self._lock = threading.Lock()
+        # 题目ID -> (题目标题, [(学生, 学生ID, 片段哈希值)])
+        self._questions = {}
+
+    def add(self, task):
+        """加入一份提交（engine.JudgeTask）"""
+        if not task.code.strip():
+            return
+        fingerprint = self.detector.fingerprint(task.code, task.language)
+        if fingerprint is None:
+            return
+        with self._lock:
+            question = self._questions.get(task.question_id)
+            if question is None:
+                question = self._questions[task.question_id] = (task.question, [])
+            question[1].append((task.student, task.student_id, fingerprint))
+
+    def clusters(self):
+        """所有题目的相似组，按题目、相似度从高到低排列
+
+        每组为 {'question_id', 'question', 'similarity', 'min_similarity', 'students': [{'student', 'student_id'}]}，
+        similarity 和 min_similarity 为组内相似提交对的最高和最低估计相似度。
+        """
+        result = []
+        for question_id, (title, submissions) in self._questions.items():
+            for members, similarities in self._question_clusters(submissions):
+                result.append({
+                    'question_id': question_id,
+                    'question': title,
+                    'similarity': round(max(similarities), 3),
+                    'min_similarity': round(min(similarities), 3),
+                    'students': [{'student': submissions[i][0], 'student_id': submissions[i][1]} for i in members],
+                })
+        return result
+
+    def _signatures(self, submissions):
+        """各提交的签名，去掉超过 COMMON_SHINGLE_RATIO 的提交都有的片段（题目模板、固定的输入输出写法）
+
+        内容相同的提交只计一次，多人抄袭同一份代码时其中的片段不会被当作模板。
+        """
+        unique = {id(fingerprint): fingerprint for _, _, fingerprint in submissions}
+        frequency = Counter()
+        for fingerprint in unique.values():
+            frequency.update(fingerprint)
+        limit = max(COMMON_SHINGLE_MIN, COMMON_SHINGLE_RATIO * len(unique))
+        common = {value for value, count in frequency.items() if count > limit}
+        return [minhash(value for value in fingerprint if value not in common) for _, _, fingerprint in submissions]
+
+    def _question_clusters(self, submissions):
+        signatures = self._signatures(submissions)
+        parent = list(range(len(submissions)))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        # 签名相同的提交直接合并，只有不同的签名进入LSH
+        pairs = []
+        unique = {}
+        for i, signature in enumerate(signatures):
+            if signature is None:
+                continue
+            first = unique.setdefault(signature, i)
+            if first != i:
+                pairs.append((first, 1.0))
+                parent[i] = first
+
+        rows = NUM_HASHES // LSH_BANDS
+        buckets = {}
+        for signature, i in unique.items():
+            for band in range(LSH_BANDS):
+                buckets.setdefault((band, signature[band * rows:(band + 1) * rows]), []).append(i)
+
+        checked = set()
+        for members in buckets.values():
+            for a in range(len(members)):
+                for b in range(a + 1, len(members)):
+                    pair = (members[a], members[b])
+                    if pair in checked:
+                        continue
+                    checked.add(pair)
+                    similarity = estimate_similarity(signatures[pair[0]], signatures[pair[1]])
+                    if similarity >= self.detector.threshold:
+                        pairs.append((pair[0], similarity))
+                        parent[find(pair[0])] = find(pair[1])
+
+        groups = {}
+        for i in range(len(submissions)):
+            groups.setdefault(find(i), []).append(i)
+        similarities = {}
+        for first, similarity in pairs:
+            similarities.setdefault(find(first), []).append(similarity)
+        clusters = [(groups[root], values) for root, values in similarities.items()]
+        clusters.sort(key=lambda cluster: (-max(cluster[1]), -len(cluster[0])))
+        return clusters
+
+
+def format_similarity(cluster):
+    """相似组的相似度范围，如 85%~100%"""
+    if cluster['similarity'] == cluster['min_similarity']:
+        return f"{cluster['similarity']:.0%}"
+    return f"{cluster['min_similarity']:.0%}~{cluster['similarity']:.0%}"
+
+
+def format_cluster(cluster):
+    """相似组的文字描述"""
+    names = '、'.join(member['student'] for member in cluster['students'])
+    return f"{cluster['question']}（相似度 {format_similarity(cluster)}）: {names}"
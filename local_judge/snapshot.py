@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+"""
+离线考试快照：把考试详情、编程题（含测试用例）和全部学生答案保存在一个 SQLite 文件中
+
+重新测评时直接读取快照，不需要登录和访问服务器：
+
+  - 题目和测试用例按题目ID读取，只加载本次测评需要的题目；
+  - 学生答案按学生、题目顺序逐行读取，也可以只读取某道题或某个学生的提交；
+  - 读取时启用 SQLite 内存映射（PRAGMA mmap_size），大测试用例直接从
+    映射的文件页中读取，不经过额外的读缓冲。
+
+测试用例修正后可以只从题库刷新快照中的题目（ExamSnapshot.update_questions），
+学生答案无需重新下载。快照先写入临时文件，完成后再替换目标文件，
+写到一半中断不会留下损坏的快照。
+"""
+
+import os
+import json
+import time
+import sqlite3
+import logging
+from contextlib import closing
+from urllib.parse import quote
+
+logger = logging.getLogger(__name__)
+
+# 快照格式版本，表结构不兼容时递增
+SNAPSHOT_FORMAT = 1
+
+# 读取时内存映射的最大字节数（只占用地址空间，实际读到的页面才占用内存）
+MMAP_SIZE = 1 << 30
+
+_SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE questions (
+    id TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE test_cases (
+    question_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    input TEXT NOT NULL,
+    expected_output TEXT NOT NULL,
+    extra TEXT,
+    PRIMARY KEY (question_id, position)
+);
+CREATE TABLE students (
+    position INTEGER PRIMARY KEY,
+    id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX students_by_id ON students (id);
+CREATE TABLE submissions (
+    student_position INTEGER NOT NULL,
+    question_position INTEGER NOT NULL,
+    question_id TEXT NOT NULL,
+    language TEXT NOT NULL,
+    code TEXT NOT NULL,
+    PRIMARY KEY (student_position, question_position)
+);
+CREATE INDEX submissions_by_question ON submissions (question_id);
+"""
+
+
+class SnapshotError(Exception):
+    """快照文件不存在、已损坏或格式版本不兼容"""
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+def _split_test_cases(test_cases_raw):
+    """把题目的 testCases（JSON字符串或列表）拆成 (input, expectedOutput, 其余字段) 元组"""
+    if isinstance(test_cases_raw, str):
+        try:
+            test_cases_raw = json.loads(test_cases_raw)
+        except ValueError:
+            logger.warning("无法解析testCases JSON，快照中该题没有测试用例")
+            return []
+    if not isinstance(test_cases_raw, list):
+        return []
+    rows = []
+    for test_case in test_cases_raw:
+        if not isinstance(test_case, dict):
+            continue
+        extra = {k: v for k, v in test_case.items() if k not in ('input', 'expectedOutput')}
+        rows.append((str(test_case.get('input', '')), str(test_case.get('expectedOutput', '')),
+                     _dumps(extra) if extra else None))
+    return rows
+
+
+def _write_questions(conn, questions, positions):
+    """写入题目和测试用例，positions 为题目ID在考试中的顺序"""
+    for question in questions:
+        question_id = question['_id']
+        data = {k: v for k, v in question.items() if k != 'testCases'}
+        conn.execute('INSERT OR REPLACE INTO questions (id, position, data) VALUES (?, ?, ?)',
+                     (question_id, positions.get(question_id, len(positions)), _dumps(data)))
+        conn.execute('DELETE FROM test_cases WHERE question_id = ?', (question_id,))
+        conn.executemany(
+            'INSERT INTO test_cases (question_id, position, input, expected_output, extra) VALUES (?, ?, ?, ?, ?)',
+            ((question_id, i, *row) for i, row in enumerate(_split_test_cases(question.get('testCases', []))))
+        )
+
+
+class SnapshotWriter:
+    """逐个学生写入快照，commit 后才替换目标文件"""
+
+    def __init__(self, path, exam_id, exam_details, questions, source=''):
+        self.path = path
+        self._temp_path = f'{path}.tmp'
+        if os.path.exists(self._temp_path):
+            os.remove(self._temp_path)
+        self._positions = {q['_id']: i for i, q in enumerate(exam_details.get('questions', []))
+                           if isinstance(q, dict) and '_id' in q}
+        self._students = 0
+        self._conn = sqlite3.connect(self._temp_path)
+        try:
+            # 临时文件写完才会被使用，不需要回滚日志
+            self._conn.execute('PRAGMA journal_mode = OFF')
+            self._conn.execute('PRAGMA synchronous = OFF')
+            self._conn.executescript(_SCHEMA)
+            self._conn.executemany('INSERT INTO meta (key, value) VALUES (?, ?)', [
+                ('format', str(SNAPSHOT_FORMAT)),
+                ('exam_id', str(exam_id)),
+                ('exam', _dumps(exam_details)),
+                ('source', source),
+                ('created_at', str(time.time())),
+            ])
+            _write_questions(self._conn, [q for q in questions if isinstance(q, dict) and q.get('_id')],
+                             self._positions)
+        except Exception:
+            self.abort()
+            raise
+
+    def add_student(self, student_id, name, data, tasks):
+        """写入一个学生及其提交，tasks 中的每项需有 question_id、language、code 属性"""
+        position = self._students
+        self._students += 1
+        self._conn.execute('INSERT INTO students (position, id, name, data) VALUES (?, ?, ?, ?)',
+                           (position, str(student_id), name, _dumps(data)))
+        self._conn.executemany(
+            'INSERT OR REPLACE INTO submissions (student_position, question_position, question_id, language, code) '
+            'VALUES (?, ?, ?, ?, ?)',
+            ((position, self._positions.get(task.question_id, -1), task.question_id, task.language, task.code)
+             for task in tasks)
+        )
+
+    def commit(self):
+        """写入完成，替换目标文件，返回学生数"""
+        self._conn.commit()
+        self._conn.execute('VACUUM')
+        self._conn.close()
+        os.replace(self._temp_path, self.path)
+        return self._students
+
+    def abort(self):
+        """放弃写入并删除临时文件"""
+        self._conn.close()
+        try:
+            os.remove(self._temp_path)
+        except OSError:
+            pass
+
+
+class ExamSnapshot:
+    """只读打开的离线考试快照
+
+    每次读取都打开独立的连接，可以在任意线程中使用（例如测评的后台生产线程）。
+    """
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        if not os.path.isfile(self.path):
+            raise SnapshotError(f"快照文件不存在: {path}")
+        try:
+            with closing(self._connect()) as conn:
+                meta = dict(conn.execute('SELECT key, value FROM meta'))
+        except sqlite3.DatabaseError as e:
+            raise SnapshotError(f"无法读取快照文件 {path}: {e}")
+        if meta.get('format') != str(SNAPSHOT_FORMAT):
+            raise SnapshotError(f"快照格式版本不兼容: {meta.get('format')}（当前版本 {SNAPSHOT_FORMAT}）")
+        self.exam_id = meta.get('exam_id', '')
+        self.source = meta.get('source', '')
+        self.created_at = float(meta.get('created_at') or 0)
+        self._exam_json = meta.get('exam', '{}')
+
+    def _connect(self, readonly=True):
+        mode = 'ro' if readonly else 'rw'
+        conn = sqlite3.connect(f'file:{quote(self.path)}?mode={mode}', uri=True)
+        conn.execute(f'PRAGMA mmap_size = {MMAP_SIZE}')
+        return conn
+
+    def exam_details(self):
+        """考试详情（与 /api/teacher/exams/{id} 返回的 exam 相同）"""
+        return json.loads(self._exam_json)
+
+    def questions(self, question_ids=None, test_data=None):
+        """读取题目（含 testCases 列表），question_ids 为空时读取全部
+
+        test_data（testdata.TestDataStore）不为None时，较大的输入和期望输出读出后即保存为文件，
+        不同时在内存中保存所有测试数据。
+        """
+        sql = 'SELECT id, data FROM questions'
+        params = ()
+        if question_ids is not None:
+            question_ids = list(question_ids)
+            sql += f' WHERE id IN ({",".join("?" * len(question_ids))})'
+            params = question_ids
+        questions = []
+        with closing(self._connect()) as conn:
+            for question_id, data in conn.execute(sql + ' ORDER BY position', params).fetchall():
+                question = json.loads(data)
+                test_cases = []
+                for input_data, expected_output, extra in conn.execute(
+                        'SELECT input, expected_output, extra FROM test_cases WHERE question_id = ? ORDER BY position',
+                        (question_id,)):
+                    test_case = json.loads(extra) if extra else {}
+                    if test_data is not None:
+                        input_data = test_data.externalize(input_data)
+                        expected_output = test_data.externalize(expected_output)
+                    test_case['input'] = input_data
+                    test_case['expectedOutput'] = expected_output
+                    test_cases.append(test_case)
+                question['testCases'] = test_cases
+                questions.append(question)
+        return questions
+
+    def students(self):
+        """逐个产出 (学生ID, 姓名, 答卷信息)，答卷信息不含答案"""
+        conn = self._connect()
+        try:
+            for student_id, name, data in conn.execute('SELECT id, name, data FROM students ORDER BY position'):
+                yield student_id, name, json.loads(data)
+        finally:
+            conn.close()
+
+    def iter_submissions(self, question_ids=None, student_ids=None):
+        """按学生、题目顺序逐个产出 (姓名, 学生ID, 题目ID, 题目标题, 语言, 代码)
+
+        可按题目ID或学生ID筛选，筛选在查询中完成，不读取其他提交。
+        """
+        titles = {q.get('_id'): q.get('title', '未知题目') for q in self.exam_details().get('questions', [])
+                  if isinstance(q, dict)}
+        sql = ('SELECT st.name, st.id, s.question_id, s.language, s.code FROM submissions s '
+               'JOIN students st ON st.position = s.student_position')
+        conditions = []
+        params = []
+        for column, values in (('s.question_id', question_ids), ('st.id', student_ids)):
+            if values is not None:
+                values = [str(value) for value in values]
+                conditions.append(f'{column} IN ({",".join("?" * len(values))})')
+                params.extend(values)
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY s.student_position, s.question_position'
+
+        conn = self._connect()
+        try:
+            for name, student_id, question_id, language, code in conn.execute(sql, params):
+                yield name, student_id, question_id, titles.get(question_id, '未知题目'), language, code
+        finally:
+            conn.close()
+
+    def update_questions(self, questions):
+        """用题库中的最新题目替换快照中的题目和测试用例，返回更新的题目数"""
+        with closing(self._connect(readonly=False)) as conn, conn:
+            positions = dict(conn.execute('SELECT id, position FROM questions'))
+            updated = [q for q in questions if isinstance(q, dict) and q.get('_id') in positions]
+            _write_questions(conn, updated, positions)
+        return len(updated)
+
+    def describe(self):
+        """快照内容描述"""
+        with closing(self._connect()) as conn:
+            students = conn.execute('SELECT COUNT(*) FROM students').fetchone()[0]
+            submissions = conn.execute("SELECT COUNT(*) FROM submissions WHERE code != ''").fetchone()[0]
+            test_cases = conn.execute('SELECT COUNT(*) FROM test_cases').fetchone()[0]
+        created = time.strftime('%Y-%m-%d %H:%M', time.localtime(self.created_at))
+        size_kb = os.path.getsize(self.path) / 1024
+        return (f"离线快照: {students} 名学生，{submissions} 份提交，{test_cases} 个测试用例，"
+                f"{size_kb:.0f} KB（保存于 {created}）")
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+测试用例索引：按题目 _id 组织编程题的测试用例、分值和资源限制
+
+指定测试数据存储（testdata.TestDataStore）时，较大的输入和期望输出保存为文件，
+测试用例中对应字段为 testdata.TestData。多个索引（如批量测评的多场考试）可以通过
+TestCasePool 共用相同的题目条目。
+"""
+
+import json
+import time
+import threading
+import logging
+import hashlib
+from datetime import datetime
+from types import MappingProxyType
+
+from .testdata import TestData
+
+logger = logging.getLogger(__name__)
+
+class TestCaseEntry:
+    """单道编程题的测试用例及限制（只读），reference 为参考解法的源码（可能为空）"""
+
+    __slots__ = ('question_id', 'title', 'test_cases', 'points', 'time_limit', 'memory_limit', 'updated_at',
+                 'reference')
+
+    def __init__(self, question_id, title, test_cases, points, time_limit, memory_limit, updated_at, reference=''):
+        self.question_id = question_id
+        self.title = title
+        self.test_cases = test_cases
+        self.points = points
+        self.time_limit = time_limit
+        self.memory_limit = memory_limit
+        self.updated_at = updated_at
+        self.reference = reference
+
+
+class TestCaseIndex:
+    """测试用例索引
+
+    按题目 _id 建立，在加载考试时从题库一次性构建，
+    之后由所有测评线程只读共享。重建时生成新的索引对象，
+    正在进行的测评仍使用旧对象，不会读到一半新一半旧的数据。
+    """
+
+    # 与 lib/models/Question.ts 中的默认值保持一致
+    DEFAULT_TIME_LIMIT = 1
+    DEFAULT_MEMORY_LIMIT = 512
+
+    def __init__(self, questions=(), test_data=None, pool=None):
+        if pool is None:
+            pool = TestCasePool(test_data)
+        entries = {}
+        for question in questions:
+            if not isinstance(question, dict) or question.get('type') != 'PROGRAMMING':
+                continue
+            question_id = question.get('_id')
+            if not question_id:
+                continue
+            entries[question_id] = pool.entry(question)
+        self._entries = MappingProxyType(entries)
+        self.fingerprint = self.compute_fingerprint(questions)
+        self.built_at = time.time()
+
+    @staticmethod
+    def parse_test_cases(test_cases_raw, test_data=None):
+        """解析题目中的testCases字段（JSON字符串或列表），test_data 不为None时较大的测试数据保存为文件"""
+        test_cases = []
+        if isinstance(test_cases_raw, str):
+            try:
+                test_cases = json.loads(test_cases_raw)
+                if not isinstance(test_cases, list):
+                    test_cases = []
+            except json.JSONDecodeError:
+                logger.warning("无法解析testCases JSON: %s", test_cases_raw)
+        elif isinstance(test_cases_raw, list):
+            test_cases = test_cases_raw
+        parsed = []
+        for tc in test_cases:
+            if not isinstance(tc, dict):
+                continue
+            tc = dict(tc)
+            if test_data is not None:
+                for field in ('input', 'expectedOutput'):
+                    if field in tc:
+                        tc[field] = test_data.externalize(tc[field])
+            parsed.append(MappingProxyType(tc))
+        return tuple(parsed)
+
+    @staticmethod
+    def reference_of(question):
+        """题目的参考解法：referenceSolution 字段，没有时为 correctAnswer（题库中的“参考答案”）"""
+        reference = question.get('referenceSolution') or question.get('correctAnswer') or ''
+        return reference if isinstance(reference, str) else ''
+
+    @staticmethod
+    def compute_fingerprint(questions):
+        """根据编程题的 _id 和 updatedAt 计算题库指纹，用于判断索引是否过期"""
+        digest = hashlib.sha256()
+        keys = sorted(
+            (str(q.get('_id', '')), str(q.get('updatedAt', '')), str(q.get('testCases', '')))
+            for q in questions
+            if isinstance(q, dict) and q.get('type') == 'PROGRAMMING'
+        )
+        for key in keys:
+            digest.update('\x1f'.join(key).encode('utf-8'))
+            digest.update(b'\x1e')
+        return digest.hexdigest()
+
+    def get(self, question_id):
+        """获取题目的测试用例条目，不存在时返回None"""
+        return self._entries.get(question_id)
+
+    def __contains__(self, question_id):
+        return question_id in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def missing(self, question_ids):
+        """返回索引中缺失的题目ID"""
+        return [qid for qid in question_ids if qid not in self._entries]
+
+    def is_stale(self, questions):
+        """与最新题库数据比较，判断索引是否已过期"""
+        return self.compute_fingerprint(questions) != self.fingerprint
+
+    def describe(self):
+        """索引状态描述"""
+        built = datetime.fromtimestamp(self.built_at).strftime('%H:%M:%S')
+        total_cases = sum(len(entry.test_cases) for entry in self._entries.values())
+        files = {value for entry in self._entries.values() for tc in entry.test_cases
+                 for value in (tc.get('input'), tc.get('expectedOutput')) if isinstance(value, TestData)}
+        stored = ''
+        if files:
+            stored = f"，{len(files)} 份测试数据保存为文件（{sum(f.size for f in files) / 1024 / 1024:.1f} MB）"
+        return f"测试用例索引: {len(self._entries)} 道编程题，{total_cases} 个测试用例{stored}（构建于 {built}）"
+
+
+def _content_key(value):
+    """testCases 列表中已保存为文件的测试数据（离线快照）按内容哈希计入"""
+    if isinstance(value, TestData):
+        return f'testdata:{value.digest}'
+    return str(value)
+
+
+class TestCasePool:
+    """多个测试用例索引共用的题目条目，在引擎存在期间保留
+
+    多场考试引用同一道题目时共用同一个条目对象，时间限制校准、测试用例排序统计和
+    结果存储按条目对象缓存的结果在各场考试之间复用；从考试市场导入的题目 _id 不同，
+    但测试用例相同时只解析（和保存为测试数据文件）一次。
+    """
+
+    def __init__(self, test_data=None):
+        self.test_data = test_data
+        self._lock = threading.Lock()
+        # testCases 原始内容的哈希 -> 解析后的测试用例
+        self._test_cases = {}
+        # 题目各字段 -> TestCaseEntry
+        self._entries = {}
+
+    def entry(self, question):
+        """题目的测试用例条目，与之前的题目完全相同时返回同一个对象"""
+        raw = question.get('testCases', [])
+        text = raw if isinstance(raw, str) else json.dumps(raw, ensure_ascii=False, sort_keys=True,
+                                                           default=_content_key)
+        digest = hashlib.sha256(text.encode('utf-8', 'surrogatepass')).hexdigest()
+        key = (question.get('_id'), question.get('title', ''), digest, question.get('points', 0),
+               question.get('timeLimit') or TestCaseIndex.DEFAULT_TIME_LIMIT,
+               question.get('memoryLimit') or TestCaseIndex.DEFAULT_MEMORY_LIMIT,
+               question.get('updatedAt', ''), TestCaseIndex.reference_of(question))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                return entry
+            test_cases = self._test_cases.get(digest)
+            if test_cases is None:
+                test_cases = self._test_cases[digest] = TestCaseIndex.parse_test_cases(raw, self.test_data)
+            entry = self._entries[key] = TestCaseEntry(
+                question_id=key[0],
+                title=key[1],
+                test_cases=test_cases,
+                points=key[3],
+                time_limit=key[4],
+                memory_limit=key[5],
+                updated_at=key[6],
+                reference=key[7]
+            )
+        return entry
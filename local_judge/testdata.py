@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+测试数据存储：较大的输入和期望输出保存为文件，按内容的 SHA-256 去重
+
+题目的 testCases 是一个JSON字符串，解析后每个输入和期望输出都是内存中的字符串，
+再通过管道写给学生程序；几MB的测试数据在每个测评线程中都要复制一遍。
+建立测试用例索引时，超过 FILE_THRESHOLD 字节的输入和期望输出改为保存在
+~/.local_judge/testdata/ 中（内容相同的只保存一份），测试用例中对应字段为 TestData：
+
+  - 运行时直接把文件作为子进程的标准输入，不经过 Python 复制；
+  - 比较输出时通过 mmap 按块读取期望输出（见 compare.py），内存占用与测试数据大小无关。
+
+较小的测试数据仍为字符串。目录可通过环境变量 LOCAL_JUDGE_TEST_DATA_DIR 修改。
+"""
+
+import os
+import mmap
+import codecs
+import hashlib
+import tempfile
+
+TEST_DATA_DIR = os.environ.get('LOCAL_JUDGE_TEST_DATA_DIR',
+                               os.path.join(os.path.expanduser('~'), '.local_judge', 'testdata'))
+# 超过该字节数的输入和期望输出保存为文件
+FILE_THRESHOLD = int(os.environ.get('LOCAL_JUDGE_TEST_DATA_THRESHOLD_KB', '256')) * 1024
+# 按块读取（解码、比较、传输）的字节数
+DATA_CHUNK = 256 * 1024
+# 错误信息中显示的开头部分（字符）
+PREVIEW_CHARS = 200
+# 测试数据中可能有单独的代理字符（JSON允许），保存和读取时原样保留
+_ERRORS = 'surrogatepass'
+
+
+class TestData:
+    """保存为文件的一份测试数据（只读），相同内容的对象相等"""
+
+    __slots__ = ('digest', 'path', 'size')
+
+    def __init__(self, digest, path, size):
+        self.digest = digest
+        self.path = path
+        self.size = size
+
+    def __len__(self):
+        return self.size
+
+    def __eq__(self, other):
+        return isinstance(other, TestData) and other.digest == self.digest
+
+    def __hash__(self):
+        return hash(self.digest)
+
+    def __repr__(self):
+        return f'TestData({self.digest[:12]}, {self.size} 字节)'
+
+    def open(self):
+        """以二进制只读方式打开，每次调用得到独立的读取位置"""
+        return open(self.path, 'rb')
+
+    def read(self):
+        """完整内容（字符串），只在必须使用字符串时调用"""
+        with self.open() as f:
+            return f.read().decode('utf-8', _ERRORS)
+
+    def iter_text(self, chunk_size=DATA_CHUNK):
+        """通过 mmap 按块解码内容，逐块产出字符串"""
+        if not self.size:
+            return
+        decoder = codecs.getincrementaldecoder('utf-8')(_ERRORS)
+        with self.open() as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for start in range(0, len(data), chunk_size):
+                text = decoder.decode(data[start:start + chunk_size])
+                if text:
+                    yield text
+        tail = decoder.decode(b'', final=True)
+        if tail:
+            yield tail
+
+    def preview(self, limit=PREVIEW_CHARS):
+        """开头部分，用于错误信息"""
+        with self.open() as f:
+            head = f.read(limit * 4).decode('utf-8', 'replace')[:limit]
+        return f'{head}…（共 {self.size} 字节）'
+
+
+def preview_text(value, limit=PREVIEW_CHARS):
+    """错误信息中显示的测试数据：字符串原样返回，TestData 只取开头部分"""
+    if isinstance(value, TestData):
+        return value.preview(limit)
+    return value
+
+
+def text_chunks(value):
+    """逐块产出测试数据的内容（字符串只有一块）"""
+    if isinstance(value, TestData):
+        return value.iter_text()
+    return (value,) if value else ()
+
+
+class TestDataStore:
+    """按内容哈希保存测试数据文件，可被多个线程和进程同时使用（写入先写临时文件再改名）"""
+
+    def __init__(self, root=TEST_DATA_DIR, threshold=FILE_THRESHOLD):
+        self.root = root
+        self.threshold = threshold
+
+    def _path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def get(self, digest):
+        """已保存的测试数据，不存在时返回None"""
+        path = self._path(digest)
+        try:
+            return TestData(digest, path, os.path.getsize(path))
+        except OSError:
+            return None
+
+    def put_stream(self, chunks, digest=None):
+        """保存逐块产出的字节内容，digest 不为None时校验内容的哈希"""
+        os.makedirs(self.root, exist_ok=True)
+        hasher = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(prefix='.tmp-', dir=self.root)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    hasher.update(chunk)
+                    f.write(chunk)
+            actual = hasher.hexdigest()
+            if digest is not None and actual != digest:
+                raise ValueError(f'测试数据内容与哈希不符: {digest}')
+            path = self._path(actual)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            raise
+        return TestData(actual, path, os.path.getsize(path))
+
+    def put(self, text):
+        """保存字符串内容，内容相同的文件已存在时不再写入"""
+        return self._put_bytes(text.encode('utf-8', _ERRORS))
+
+    def _put_bytes(self, data):
+        digest = hashlib.sha256(data).hexdigest()
+        stored = self.get(digest)
+        if stored is not None and stored.size == len(data):
+            return stored
+        return self.put_stream((data,), digest)
+
+    def externalize(self, value):
+        """超过阈值的字符串保存为文件并返回 TestData，否则原样返回"""
+        # UTF-8 编码每个字符最多4字节，字符数较少时不必编码
+        if not isinstance(value, str) or len(value) * 4 <= self.threshold:
+            return value
+        data = value.encode('utf-8', _ERRORS)
+        return self._put_bytes(data) if len(data) > self.threshold else value
@@ -6,20 +6,53 @@
 1. 同步网站的学生编程题数据和测试样例
 2. 本地执行学生代码并进行测评
 3. 提供图形化界面操作
+
+测评逻辑位于 local_judge 包中，本文件只负责图形界面；
+无图形界面的服务器请使用命令行模式：python3 -m local_judge --help
 """
 
 import tkinter as tk
-from tkinter import ttk, messagebox, filedialog, scrolledtext
-import requests
-import json
-import subprocess
-import tempfile
+from tkinter import ttk, messagebox, filedialog
 import os
-import threading
-from datetime import datetime
+import queue
 import time
-import re
-import logging
+import bisect
+import threading
+
+from local_judge import JudgeEngine, JudgeError, DEFAULT_SERVER_URL, format_dedup_summary, format_cache_summary
+from local_judge.engine import exam_label, programming_questions_of
+from local_judge.scores import ScoreAggregator, ResultExporter, exam_export_path
+from local_judge.results import ResultTable
+from local_judge.similarity import SimilarityDetector, format_cluster, format_similarity
+from local_judge.metrics import ThroughputMeter, observe_stage
+
+# 后台线程提交的界面更新按固定帧率统一处理（毫秒）
+UI_REFRESH_MS = 100
+# 每帧最多处理的界面更新数，避免一次处理太多导致界面卡顿
+UI_MAX_UPDATES_PER_FRAME = 5000
+# 筛选或排序后重建表格时每帧插入的行数
+VIEW_REBUILD_CHUNK = 2000
+# 输入筛选条件后等待多久再刷新（毫秒）
+FILTER_DELAY_MS = 200
+# 测评时状态栏显示吞吐量和剩余时间的刷新间隔（秒）
+PROGRESS_STATUS_INTERVAL = 0.5
+# 测评多场考试完成后提示框中最多列出的考试数
+SUMMARY_MAX_LINES = 20
+
+RESULT_COLUMNS = ('学生', '题目', '语言', '状态', '得分', '执行时间', '错误信息')
+# 点击列标题排序时使用的字段
+SORT_FIELDS = {
+    '学生': 'student',
+    '题目': 'question',
+    '语言': 'language',
+    '状态': 'status',
+    '得分': 'score',
+    '执行时间': 'execution_time',
+}
+STATUS_FILTERS = ('全部', '通过', '部分通过', '失败', '评测错误', '无测试用例')
+ALL_QUESTIONS = '全部'
+SIMILARITY_COLUMNS = ('题目', '相似度', '人数', '学生')
+
 
 class LocalJudgeApp:
     def __init__(self, root):
@@ -28,17 +61,48 @@ class LocalJudgeApp:
         self.root.geometry("1200x800")
         
         # 配置变量
-        self.server_url = tk.StringVar(value="https://exam.mymarkdown.fun")
+        self.server_url = tk.StringVar(value=DEFAULT_SERVER_URL)
         self.email = tk.StringVar()
         self.password = tk.StringVar()
-        self.auth_token = ""  # 存储登录后的token
+        
+        # 测评引擎（登录状态、考试数据、测试用例索引和编译缓存）
+        self.engine = JudgeEngine(self.server_url.get())
         
         # 数据存储
-        self.exams_data = []
         self.current_exam = None
-        self.student_results = []
+        # 测评结果（紧凑存储，完整错误信息和明细在临时文件中）
+        self.student_results = ResultTable()
+        # 考试ID -> 标题，结果中有多场考试时按考试分别导出，标题用于文件名
+        self.exam_titles = {}
+        
+        # 后台线程通过队列提交界面更新，主线程按固定帧率处理
+        self.ui_queue = queue.Queue()
+        
+        # 结果表格的筛选和排序状态；view_keys 与表格中的行一一对应（按升序）
+        self.filter_student = tk.StringVar()
+        self.filter_question = tk.StringVar(value=ALL_QUESTIONS)
+        self.filter_status = tk.StringVar(value=STATUS_FILTERS[0])
+        self.sort_column = None
+        self.sort_descending = False
+        self.view_keys = []
+        self.view_generation = 0
+        self.view_rebuilding = False
+        self.deferred_results = []
+        self.question_titles = set()
+        self.filter_after_id = None
+        
+        # 并行测评配置
+        default_workers = os.cpu_count() or 1
+        self.worker_count = tk.IntVar(value=default_workers)
+        self.compile_worker_count = tk.IntVar(value=(default_workers + 1) // 2)
+        
+        # 查重：代码切分结果在多次测评之间保留，similarity_clusters 为最近一次测评的相似组
+        self.check_similarity = tk.BooleanVar(value=False)
+        self.similarity_detector = SimilarityDetector()
+        self.similarity_clusters = []
         
         self.setup_ui()
+        self.root.after(UI_REFRESH_MS, self.process_ui_queue)
         
     def setup_ui(self):
         """设置用户界面"""
@@ -81,33 +145,66 @@ class LocalJudgeApp:
         self.exam_combo.bind('<<ComboboxSelected>>', self.on_exam_selected)
         
         ttk.Button(exam_frame, text="加载考试", command=self.load_exam_details).grid(row=0, column=2, padx=(5, 0))
+        ttk.Button(exam_frame, text="检查测试用例", command=self.check_test_case_index).grid(row=0, column=3, padx=(5, 0))
+        ttk.Button(exam_frame, text="重建测试用例索引", command=self.rebuild_test_case_index).grid(row=0, column=4, padx=(5, 0))
+        ttk.Button(exam_frame, text="保存快照", command=self.save_snapshot).grid(row=0, column=5, padx=(5, 0))
+        ttk.Button(exam_frame, text="打开快照", command=self.open_snapshot).grid(row=0, column=6, padx=(5, 0))
         
         # 测评控制区域
         control_frame = ttk.LabelFrame(main_frame, text="测评控制", padding="5")
         control_frame.grid(row=2, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 10))
         
         ttk.Button(control_frame, text="开始批量测评", command=self.start_batch_evaluation).grid(row=0, column=0, padx=(0, 10))
-        ttk.Button(control_frame, text="导出结果", command=self.export_results).grid(row=0, column=1, padx=(0, 10))
-        ttk.Button(control_frame, text="清空结果", command=self.clear_results).grid(row=0, column=2, padx=(0, 10))
+        ttk.Button(control_frame, text="测评全部考试", command=self.start_all_exams_evaluation).grid(row=0, column=1, padx=(0, 10))
+        ttk.Button(control_frame, text="导出成绩", command=self.export_results).grid(row=0, column=2, padx=(0, 10))
+        ttk.Button(control_frame, text="导出明细", command=self.export_details).grid(row=0, column=3, padx=(0, 10))
+        ttk.Button(control_frame, text="上传成绩", command=self.upload_scores).grid(row=0, column=4, padx=(0, 10))
+        ttk.Button(control_frame, text="清空结果", command=self.clear_results).grid(row=0, column=5, padx=(0, 10))
+        
+        ttk.Label(control_frame, text="运行进程数:").grid(row=0, column=6, padx=(10, 5))
+        ttk.Spinbox(control_frame, from_=1, to=256, width=5, textvariable=self.worker_count).grid(row=0, column=7)
+        ttk.Label(control_frame, text="编译并发数:").grid(row=0, column=8, padx=(10, 5))
+        ttk.Spinbox(control_frame, from_=1, to=256, width=5, textvariable=self.compile_worker_count).grid(row=0, column=9)
+        ttk.Checkbutton(control_frame, text="查重", variable=self.check_similarity).grid(row=0, column=10, padx=(10, 5))
+        ttk.Button(control_frame, text="相似提交", command=self.show_similarity).grid(row=0, column=11)
         
         # 进度条
         self.progress_var = tk.DoubleVar()
         self.progress_bar = ttk.Progressbar(control_frame, variable=self.progress_var, maximum=100)
-        self.progress_bar.grid(row=1, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=(10, 0))
+        self.progress_bar.grid(row=1, column=0, columnspan=12, sticky=(tk.W, tk.E), pady=(10, 0))
         
         # 结果显示区域
         result_frame = ttk.LabelFrame(main_frame, text="测评结果", padding="5")
         result_frame.grid(row=3, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S))
         result_frame.columnconfigure(0, weight=1)
-        result_frame.rowconfigure(0, weight=1)
+        result_frame.rowconfigure(1, weight=1)
+        
+        # 筛选条件
+        filter_frame = ttk.Frame(result_frame)
+        filter_frame.grid(row=0, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 5))
+        ttk.Label(filter_frame, text="学生:").grid(row=0, column=0, padx=(0, 5))
+        ttk.Entry(filter_frame, textvariable=self.filter_student, width=20).grid(row=0, column=1, padx=(0, 10))
+        ttk.Label(filter_frame, text="题目:").grid(row=0, column=2, padx=(0, 5))
+        self.question_filter_combo = ttk.Combobox(filter_frame, textvariable=self.filter_question, state="readonly",
+                                                  values=[ALL_QUESTIONS], width=30)
+        self.question_filter_combo.grid(row=0, column=3, padx=(0, 10))
+        ttk.Label(filter_frame, text="状态:").grid(row=0, column=4, padx=(0, 5))
+        ttk.Combobox(filter_frame, textvariable=self.filter_status, state="readonly",
+                     values=STATUS_FILTERS, width=12).grid(row=0, column=5, padx=(0, 10))
+        self.view_count_var = tk.StringVar()
+        ttk.Label(filter_frame, textvariable=self.view_count_var).grid(row=0, column=6)
+        for var in (self.filter_student, self.filter_question, self.filter_status):
+            var.trace_add('write', self.on_filter_changed)
         
         # 创建Treeview显示结果
-        columns = ('学生', '题目', '语言', '状态', '得分', '执行时间', '错误信息')
-        self.result_tree = ttk.Treeview(result_frame, columns=columns, show='headings', height=15)
+        self.result_tree = ttk.Treeview(result_frame, columns=RESULT_COLUMNS, show='headings', height=15)
         
-        # 设置列标题和宽度
-        for col in columns:
-            self.result_tree.heading(col, text=col)
+        # 设置列标题和宽度，点击可排序的列标题切换排序
+        for col in RESULT_COLUMNS:
+            if col in SORT_FIELDS:
+                self.result_tree.heading(col, text=col, command=lambda col=col: self.sort_by(col))
+            else:
+                self.result_tree.heading(col, text=col)
             if col == '学生':
                 self.result_tree.column(col, width=100)
             elif col == '题目':
@@ -128,121 +225,58 @@ class LocalJudgeApp:
         scrollbar_x = ttk.Scrollbar(result_frame, orient=tk.HORIZONTAL, command=self.result_tree.xview)
         self.result_tree.configure(yscrollcommand=scrollbar_y.set, xscrollcommand=scrollbar_x.set)
         
-        self.result_tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
-        scrollbar_y.grid(row=0, column=1, sticky=(tk.N, tk.S))
-        scrollbar_x.grid(row=1, column=0, sticky=(tk.W, tk.E))
+        self.result_tree.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        scrollbar_y.grid(row=1, column=1, sticky=(tk.N, tk.S))
+        scrollbar_x.grid(row=2, column=0, sticky=(tk.W, tk.E))
         
         # 状态栏
         self.status_var = tk.StringVar(value="就绪")
         status_bar = ttk.Label(main_frame, textvariable=self.status_var, relief=tk.SUNKEN)
         status_bar.grid(row=4, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(10, 0))
         
+    def sync_engine_config(self):
+        """将界面上的服务器地址同步到测评引擎"""
+        self.engine.server_url = self.server_url.get()
+        
     def login(self):
         """用户登录"""
-        if not self.email.get() or not self.password.get():
-            messagebox.showerror("登录失败", "请输入邮箱和密码")
-            return
-            
+        self.sync_engine_config()
         try:
-            url = f"{self.server_url.get()}/api/auth/login"
-            data = {
-                "email": self.email.get(),
-                "password": self.password.get()
-            }
-            
-            response = requests.post(url, json=data, timeout=10)
-            if response.status_code == 200:
-                # 从响应的cookies中获取token
-                if 'token' in response.cookies:
-                    self.auth_token = response.cookies['token']
-                    messagebox.showinfo("登录成功", "用户登录成功")
-                    self.status_var.set("用户已登录")
-                else:
-                    messagebox.showerror("登录失败", "未能获取认证token")
-            else:
-                error_msg = response.json().get('error', '登录失败')
-                messagebox.showerror("登录失败", error_msg)
+            self.engine.login(self.email.get(), self.password.get())
+            messagebox.showinfo("登录成功", "用户登录成功")
+            self.status_var.set("用户已登录")
+        except JudgeError as e:
+            messagebox.showerror("登录失败", str(e))
         except Exception as e:
             messagebox.showerror("登录失败", f"登录时出错: {str(e)}")
             
     def test_connection(self):
         """测试服务器连接"""
+        self.sync_engine_config()
         try:
-            url = f"{self.server_url.get()}/api/auth/me"
-            headers = {}
-            cookies = {}
-            if self.auth_token:
-                cookies['token'] = self.auth_token
-            
-            response = requests.get(url, headers=headers, cookies=cookies, timeout=10)
-            if response.status_code == 200:
-                user_data = response.json()
-                messagebox.showinfo("连接成功", f"服务器连接正常\n当前用户: {user_data.get('name', 'Unknown')} ({user_data.get('email', 'Unknown')})")
-                self.status_var.set("服务器连接正常")
-            else:
-                messagebox.showerror("连接失败", f"服务器返回错误: {response.status_code}")
+            user_data = self.engine.current_user()
+            messagebox.showinfo("连接成功", f"服务器连接正常\n当前用户: {user_data.get('name', 'Unknown')} ({user_data.get('email', 'Unknown')})")
+            self.status_var.set("服务器连接正常")
+        except JudgeError as e:
+            messagebox.showerror("连接失败", str(e))
         except Exception as e:
             messagebox.showerror("连接失败", f"无法连接到服务器: {str(e)}")
             
     def sync_data(self):
         """同步考试数据"""
-        if not self.auth_token:
-            messagebox.showerror("同步失败", "请先登录")
-            return
-            
+        self.sync_engine_config()
         try:
             self.status_var.set("正在同步数据...")
-            url = f"{self.server_url.get()}/api/teacher/exams"
-            headers = {}
-            cookies = {'token': self.auth_token}
+            exams = self.engine.sync_exams()
             
-            response = requests.get(url, headers=headers, cookies=cookies, timeout=30)
-            if response.status_code == 200:
-                response_data = response.json()
-                
-                # 验证返回的数据格式
-                if isinstance(response_data, dict) and 'exams' in response_data:
-                    # API返回格式: { exams: [...] }
-                    exams_list = response_data['exams']
-                    if isinstance(exams_list, list):
-                        self.exams_data = exams_list
-                        
-                        # 更新考试下拉框
-                        exam_names = []
-                        for exam in self.exams_data:
-                            if isinstance(exam, dict) and 'title' in exam and '_id' in exam:
-                                exam_names.append(f"{exam['title']} (ID: {exam['_id']})")
-                            else:
-                                print(f"警告：考试数据格式异常: {exam}")
-                        
-                        self.exam_combo['values'] = exam_names
-                        
-                        messagebox.showinfo("同步成功", f"成功同步 {len(self.exams_data)} 个考试")
-                        self.status_var.set(f"已同步 {len(self.exams_data)} 个考试")
-                    else:
-                        messagebox.showerror("同步失败", f"exams字段不是列表格式: {type(exams_list)}")
-                        print(f"exams字段内容: {exams_list}")
-                elif isinstance(response_data, list):
-                    # 兼容直接返回数组的情况
-                    self.exams_data = response_data
-                    
-                    # 更新考试下拉框
-                    exam_names = []
-                    for exam in self.exams_data:
-                        if isinstance(exam, dict) and 'title' in exam and '_id' in exam:
-                            exam_names.append(f"{exam['title']} (ID: {exam['_id']})")
-                        else:
-                            print(f"警告：考试数据格式异常: {exam}")
-                    
-                    self.exam_combo['values'] = exam_names
-                    
-                    messagebox.showinfo("同步成功", f"成功同步 {len(self.exams_data)} 个考试")
-                    self.status_var.set(f"已同步 {len(self.exams_data)} 个考试")
-                else:
-                    messagebox.showerror("同步失败", f"服务器返回数据格式错误，期望包含exams字段的对象或数组，但收到: {type(response_data)}")
-                    print(f"API返回数据: {response_data}")
-            else:
-                messagebox.showerror("同步失败", f"服务器返回错误: {response.status_code}")
+            # 更新考试下拉框（格式异常的考试显示占位文字，使下标与exams_data保持一致）
+            self.exam_combo['values'] = [exam_label(exam) or "（数据格式异常）" for exam in exams]
+            
+            messagebox.showinfo("同步成功", f"成功同步 {len(exams)} 个考试")
+            self.status_var.set(f"已同步 {len(exams)} 个考试")
+        except JudgeError as e:
+            messagebox.showerror("同步失败", str(e))
+            self.status_var.set("同步失败")
         except Exception as e:
             messagebox.showerror("同步失败", f"同步数据时出错: {str(e)}")
             self.status_var.set("同步失败")
@@ -250,13 +284,13 @@ class LocalJudgeApp:
     def on_exam_selected(self, event):
         """考试选择事件"""
         selection = self.exam_combo.current()
-        if selection >= 0 and selection < len(self.exams_data):
-            self.current_exam = self.exams_data[selection]
+        exams = self.engine.exams_data
+        if selection >= 0 and selection < len(exams):
+            self.current_exam = exams[selection]
             if isinstance(self.current_exam, dict) and 'title' in self.current_exam:
                 self.status_var.set(f"已选择考试: {self.current_exam['title']}")
             else:
                 self.status_var.set("已选择考试，但数据格式异常")
-                print(f"考试数据格式异常: {self.current_exam}")
             
     def load_exam_details(self):
         """加载考试详细信息"""
@@ -264,74 +298,102 @@ class LocalJudgeApp:
             messagebox.showwarning("警告", "请先选择一个考试")
             return
             
-        if not self.auth_token:
-            messagebox.showerror("加载失败", "请先登录")
+        self.sync_engine_config()
+        try:
+            self.status_var.set("正在加载考试详情...")
+            # 学生答案在测评时边下载边测评，不在这里整体下载
+            self.engine.load_exam(self.current_exam, stream_results=True)
+            
+            exam_details = self.current_exam['details']
+            programming_questions = programming_questions_of(exam_details)
+            missing = self.engine.test_case_index.missing([q['_id'] for q in programming_questions])
+            
+            messagebox.showinfo("加载成功", 
+                              f"考试: {exam_details['title']}\n"
+                              f"编程题数量: {len(programming_questions)}\n"
+                              f"学生答案: 开始测评后边下载边测评\n"
+                              f"{self.engine.test_case_index.describe()}"
+                              + (f"\n警告: {len(missing)} 道编程题不在题库中" if missing else ""))
+            
+            self.status_var.set(f"已加载考试详情，{len(programming_questions)} 道编程题")
+        except JudgeError as e:
+            messagebox.showerror("加载失败", str(e))
+            self.status_var.set("加载失败")
+        except Exception as e:
+            messagebox.showerror("加载失败", f"加载考试详情时出错: {str(e)}")
+            self.status_var.set("加载失败")
+            
+    def save_snapshot(self):
+        """把已加载的考试保存为离线快照"""
+        if not self.current_exam or 'details' not in self.current_exam:
+            messagebox.showwarning("警告", "请先加载考试详情")
             return
             
+        filename = filedialog.asksaveasfilename(
+            defaultextension=".db",
+            filetypes=[("考试快照", "*.db"), ("All files", "*.*")]
+        )
+        if not filename:
+            return
+            
+        self.sync_engine_config()
         try:
-            self.status_var.set("正在加载考试详情...")
-            exam_id = self.current_exam['_id']
+            self.status_var.set("正在下载学生答案并保存快照...")
+            self.root.update_idletasks()
+            students = self.engine.save_snapshot(self.current_exam, filename)
+            messagebox.showinfo("保存成功", f"已保存 {students} 名学生的答案到: {filename}")
+            self.status_var.set(f"快照已保存，{students} 名学生")
+        except JudgeError as e:
+            messagebox.showerror("保存失败", str(e))
+            self.status_var.set("保存快照失败")
+        except Exception as e:
+            messagebox.showerror("保存失败", f"保存快照时出错: {str(e)}")
+            self.status_var.set("保存快照失败")
             
-            # 获取考试详情
-            url = f"{self.server_url.get()}/api/teacher/exams/{exam_id}"
-            headers = {}
-            cookies = {'token': self.auth_token}
+    def open_snapshot(self):
+        """打开离线快照，不需要登录即可测评"""
+        filename = filedialog.askopenfilename(filetypes=[("考试快照", "*.db"), ("All files", "*.*")])
+        if not filename:
+            return
             
-            response = requests.get(url, headers=headers, cookies=cookies, timeout=30)
-            if response.status_code == 200:
-                response_data = response.json()
-                
-                # 验证返回的数据格式
-                if isinstance(response_data, dict) and 'exam' in response_data:
-                    self.exam_details = response_data['exam']
-                    with open('exam_details.log', 'w') as f:
-                        f.write(str(response_data))
-                else:
-                    # 兼容直接返回考试对象的情况
-                    self.exam_details = response_data
-                
-                # 验证考试详情数据格式
-                if not isinstance(self.exam_details, dict) or 'title' not in self.exam_details:
-                    messagebox.showerror("加载失败", "考试详情数据格式错误")
-                    print(f"考试详情数据: {self.exam_details}")
-                    return
-                
-                # 获取学生答案
-                results_url = f"{self.server_url.get()}/api/teacher/exams/{exam_id}/results"
-                results_response = requests.get(results_url, headers=headers, cookies=cookies, timeout=30)
-                
-                if results_response.status_code == 200:
-                    results_response_data = results_response.json()
-                    
-                    # 验证学生答案数据格式
-                    if isinstance(results_response_data, dict) and 'exam' in results_response_data:
-                        exam_with_results = results_response_data['exam']
-                        results_data = exam_with_results.get('examResults', [])
-                    else:
-                        # 兼容直接返回数组的情况
-                        results_data = results_response_data if isinstance(results_response_data, list) else []
-                    
-                    # 保存数据
-                    self.current_exam['details'] = self.exam_details
-                    self.current_exam['results'] = results_data
-                    
-                    # 统计编程题数量
-                    programming_questions = [q for q in self.exam_details.get('questions', []) if q.get('type') == 'PROGRAMMING']
-                    
-                    messagebox.showinfo("加载成功", 
-                                      f"考试: {self.exam_details['title']}\n"
-                                      f"编程题数量: {len(programming_questions)}\n"
-                                      f"学生答案数量: {len(results_data)}")
-                    
-                    self.status_var.set(f"已加载考试详情，{len(programming_questions)} 道编程题，{len(results_data)} 份答案")
-                else:
-                    messagebox.showerror("加载失败", "无法获取学生答案数据")
+        try:
+            self.current_exam = self.engine.open_snapshot(filename)
+            snapshot = self.current_exam['snapshot']
+            self.exam_combo.set(f"{self.current_exam['title']} (快照: {os.path.basename(filename)})")
+            messagebox.showinfo("打开成功",
+                              f"考试: {self.current_exam['title']}\n"
+                              f"{snapshot.describe()}\n"
+                              f"{self.engine.test_case_index.describe()}")
+            self.status_var.set(f"已打开离线快照: {self.current_exam['title']}")
+        except JudgeError as e:
+            messagebox.showerror("打开失败", str(e))
+            
+    def check_test_case_index(self):
+        """检查测试用例索引是否过期"""
+        self.sync_engine_config()
+        try:
+            stale, questions = self.engine.test_case_index_is_stale()
+            index = self.engine.test_case_index
+            if stale:
+                if messagebox.askyesno("索引已过期", f"{index.describe()}\n\n题库中的测试用例已发生变化，是否立即重建索引？"):
+                    self.status_var.set(self.engine.rebuild_test_case_index(questions).describe())
             else:
-                messagebox.showerror("加载失败", f"无法获取考试详情: {response.status_code}")
-                
+                messagebox.showinfo("索引有效", f"{index.describe()}\n\n与服务器题库一致")
         except Exception as e:
-            messagebox.showerror("加载失败", f"加载考试详情时出错: {str(e)}")
-            self.status_var.set("加载失败")
+            messagebox.showerror("检查失败", f"检查测试用例索引时出错: {str(e)}")
+            
+    def rebuild_test_case_index(self):
+        """重新从题库构建测试用例索引"""
+        self.sync_engine_config()
+        try:
+            if self.current_exam and self.current_exam.get('snapshot') is not None:
+                # 离线快照：把题库中修正后的测试用例写回快照
+                self.engine.refresh_snapshot_questions(self.current_exam)
+                self.status_var.set(self.engine.test_case_index.describe())
+                return
+            self.status_var.set(self.engine.rebuild_test_case_index().describe())
+        except Exception as e:
+            messagebox.showerror("重建失败", f"重建测试用例索引时出错: {str(e)}")
             
     def start_batch_evaluation(self):
         """开始批量测评"""
@@ -339,307 +401,248 @@ class LocalJudgeApp:
             messagebox.showwarning("警告", "请先加载考试详情")
             return
             
+        self.engine.similarity = self.similarity_detector if self.check_similarity.get() else None
         # 在新线程中执行测评
-        threading.Thread(target=self.batch_evaluate, daemon=True).start()
+        threading.Thread(target=self.batch_evaluate, args=(self.worker_count.get(), self.compile_worker_count.get()), daemon=True).start()
         
-    def batch_evaluate(self):
-        """批量测评函数"""
-        try:
-            self.exam_details = self.current_exam['details']
+    def start_all_exams_evaluation(self):
+        """测评已同步的全部考试：所有考试共用一个任务队列和编译缓存，每场考试分别汇总"""
+        exams = self.engine.find_exams()
+        if not exams:
+            messagebox.showwarning("警告", "请先同步数据")
+            return
+        if not messagebox.askyesno("确认", f"确定要测评已同步的 {len(exams)} 场考试吗？\n"
+                                         "（学生答案边下载边测评，导出时每场考试一个文件）"):
+            return
+            
+        self.sync_engine_config()
+        self.engine.similarity = self.similarity_detector if self.check_similarity.get() else None
+        threading.Thread(target=self.batch_evaluate, args=(self.worker_count.get(), self.compile_worker_count.get(), exams), daemon=True).start()
+        
+    def batch_evaluate(self, workers=None, compile_workers=None, exams=None):
+        """批量测评函数（在后台线程中运行，界面操作通过ui_queue回到主线程）
 
-            results_data = self.current_exam['results']
+        exams 为None时测评当前考试，否则先加载再依次测评这些考试。
+        """
+        def on_result(row):
+            self.post_ui(self.update_result_display, row)
             
-            # 获取编程题
-            programming_questions = [q for q in self.exam_details.get('questions', []) if q.get('type') == 'PROGRAMMING']
+        meter = ThroughputMeter()
+        last_status = [0.0]
+
+        def on_progress(completed, total):
+            self.post_ui(self.progress_var.set, (completed / total) * 100)
+            meter.update(completed, total)
+            now = time.monotonic()
+            if now - last_status[0] >= PROGRESS_STATUS_INTERVAL:
+                last_status[0] = now
+                self.post_ui(self.status_var.set, f"正在测评 {meter.describe()}")
             
-            if not programming_questions:
-                messagebox.showinfo("提示", "该考试没有编程题")
+        try:
+            self.post_ui(self.progress_var.set, 0)
+            if exams is not None:
+                self.judge_exams(exams, workers, compile_workers, on_result, on_progress)
                 return
-                
-            total_tasks = len(results_data) * len(programming_questions)
-            completed_tasks = 0
+            self.post_ui(self.status_var.set, "开始批量测评...")
             
-            self.progress_var.set(0)
-            self.status_var.set("开始批量测评...")
+            summary = self.engine.judge_exam(self.current_exam, workers, compile_workers, on_result, on_progress)
+            self.post_ui(self.record_exam_summary, summary)
             
-            for result in results_data:
-                # 根据API返回的数据结构调整字段访问
-                if 'student' in result and isinstance(result['student'], dict):
-                    student_name = result['student'].get('name', '未知学生')
-                else:
-                    student_name = result.get('studentName', '未知学生')
-                
-                answers = result.get('answers', {})
-                # 确保answers是字典类型
-                if isinstance(answers, str):
-                    try:
-                        import json
-                        answers = json.loads(answers)
-                    except:
-                        answers = {}
-                elif not isinstance(answers, dict):
-                    answers = {}
-                
-                for question in programming_questions:
-                    question_id = question['_id']
-                    question_title = question.get('title', '未知题目')
-                    
-                    if question_id in answers:
-                        answer_data = answers[question_id]
-                        
-                        # 确保answer_data是字典类型
-                        if isinstance(answer_data, str):
-                            # 如果是字符串，尝试解析为JSON
-                            try:
-                                import json
-                                answer_data = json.loads(answer_data)
-                            except:
-                                # 解析失败，将字符串作为代码内容
-                                answer_data = {'code': answer_data, 'language': 'python'}
-                        elif not isinstance(answer_data, dict):
-                            # 如果不是字典类型，跳过这个答案
-                            continue
-                        
-                        code = answer_data.get('code', '')
-                        language = self.exam_details.get('language', 'cpp')
-                        
-                        if code.strip():
-                            # 执行代码测评
-                            result_data = self.evaluate_code(code, language, question_id)
-                            
-                            # 添加到结果列表
-                            self.student_results.append({
-                                'student': student_name,
-                                'question': question_title,
-                                'question_id': question_id,
-                                'language': language,
-                                'status': result_data['status'],
-                                'score': result_data['score'],
-                                'execution_time': result_data['execution_time'],
-                                'error': result_data.get('error', '')
-                            })
-                            
-                            # 更新UI
-                            self.root.after(0, self.update_result_display)
-                    
-                    completed_tasks += 1
-                    progress = (completed_tasks / total_tasks) * 100
-                    self.progress_var.set(progress)
-                    
-            self.status_var.set(f"批量测评完成，共处理 {completed_tasks} 个任务")
-            messagebox.showinfo("完成", "批量测评已完成")
+            dedup_text = format_dedup_summary(summary['dedup'])
+            cache_text = format_cache_summary(summary['cache'])
+            self.post_ui(self.status_var.set, f"批量测评完成，共处理 {summary['total_tasks']} 个任务；{dedup_text}；{cache_text}")
+            self.post_ui(messagebox.showinfo, "完成", f"批量测评已完成\n{dedup_text}\n{cache_text}")
+            if summary['similarity'] is not None:
+                self.post_ui(self.set_similarity_clusters, summary['similarity'])
             
+        except JudgeError as e:
+            self.post_ui(messagebox.showinfo, "提示", str(e))
         except Exception as e:
-            messagebox.showerror("测评失败", f"批量测评时出错: {str(e)}")
-            self.status_var.set("测评失败")
+            self.post_ui(messagebox.showerror, "测评失败", f"批量测评时出错: {str(e)}")
+            self.post_ui(self.status_var.set, "测评失败")
             
-    def evaluate_code(self, code, language, question_id):
-        """评测单个代码"""
+    def judge_exams(self, exams, workers, compile_workers, on_result, on_progress):
+        """加载并测评多场考试（在后台线程中运行），完成后列出各场考试的汇总"""
+        self.post_ui(self.status_var.set, f"正在加载 {len(exams)} 场考试...")
+        self.engine.load_exams(exams, lambda exam: self.post_ui(self.status_var.set, f"已加载考试: {exam['title']}"))
+        
+        def on_summary(summary):
+            self.post_ui(self.record_exam_summary, summary)
+            
+        summaries = self.engine.judge_exams(exams, workers, compile_workers, on_result, on_progress,
+                                            on_summary=on_summary)
+        lines = []
+        clusters = []
+        for summary in summaries:
+            if summary['error']:
+                lines.append(f"{summary['title']}: 出错（{summary['error']}）")
+            else:
+                lines.append(f"{summary['title']}: {summary['total_tasks']} 个任务，"
+                             f"{format_dedup_summary(summary['dedup'])}")
+            clusters.extend(summary['similarity'] or ())
+        tasks = sum(summary['total_tasks'] for summary in summaries)
+        self.post_ui(self.status_var.set, f"{len(summaries)} 场考试测评完成，共处理 {tasks} 个任务")
+        if len(lines) > SUMMARY_MAX_LINES:
+            lines = lines[:SUMMARY_MAX_LINES] + [f"……（共 {len(lines)} 场考试）"]
+        self.post_ui(messagebox.showinfo, "完成", f"{len(summaries)} 场考试测评完成\n\n" + "\n".join(lines))
+        if self.engine.similarity is not None:
+            self.post_ui(self.set_similarity_clusters, clusters)
+            
+    def record_exam_summary(self, summary):
+        """记录测评完成的考试（导出文件名使用考试标题）"""
+        self.exam_titles[summary['exam_id']] = summary['title']
+        self.status_var.set(f"考试 {summary['title']} 测评完成，{summary['total_tasks']} 个任务")
+        
+    def post_ui(self, func, *args):
+        """从后台线程提交界面操作，由 process_ui_queue 在主线程中执行"""
+        self.ui_queue.put((func, args))
+        
+    def process_ui_queue(self):
+        """按固定帧率处理后台线程提交的界面操作，新结果合并为一次表格更新"""
+        new_rows = []
+        processed = 0
+        start_time = time.perf_counter()
         try:
-            start_time = time.time()
-            
-            # 获取测试用例
-            questions_url = f"{self.server_url.get()}/api/teacher/questions/"
-            headers = {}
-            cookies = {'token': self.auth_token}
-            response = requests.get(questions_url, headers=headers, cookies=cookies, timeout=30)
-            
-            # 初始化测试用例变量
-            test_cases = []
-            test_score = 0
-            
-            # 遍历所有题目找到匹配的编程题
-            for question in response.json().get('questions', []):
-                if question.get('type') == 'PROGRAMMING' and question.get('_id') == question_id:
-                    test_cases_raw = question.get('testCases', [])
-                    test_score = question.get('points', 0)
-                    
-                    # 处理测试用例数据
-                    if isinstance(test_cases_raw, str):
-                        try:
-                            test_cases = json.loads(test_cases_raw)
-                            if not isinstance(test_cases, list):
-                                test_cases = []
-                        except json.JSONDecodeError:
-                            print(f"警告：无法解析testCases JSON: {test_cases_raw}")
-                    elif isinstance(test_cases_raw, list):
-                        test_cases = test_cases_raw
-                    break
-            
-            # 检查是否有有效的测试用例
-            if not test_cases:
-                return {
-                    'status': '无测试用例',
-                    'score': 0,
-                    'execution_time': 0,
-                    'error': '该题目没有配置测试用例，请检查题目配置。'
-                }
-            
-            # 执行测试用例
-            passed_cases = 0
-            total_cases = len(test_cases)
-            error_messages = []
-            
-            for i, test_case in enumerate(test_cases):
-                input_data = test_case.get('input', '')
-                expected_output = test_case.get('expectedOutput', '').strip()
-                
-                # 执行代码
-                execution_result = self.execute_code(code, language, input_data)
-                
-                if execution_result['success']:
-                    actual_output = execution_result['output'].strip()
-                    if actual_output == expected_output:
-                        passed_cases += 1
-                    else:
-                        error_messages.append(f"测试用例{i+1}失败: 输入'{input_data}'，期望'{expected_output}'，实际'{actual_output}'")
-                else:
-                    error_messages.append(f"测试用例{i+1}执行错误: 输入'{input_data}'，错误信息'{execution_result['error']}'")
-            
-            # 计算执行时间和得分
-            execution_time = time.time() - start_time
-            score = (passed_cases / total_cases) * test_score if total_cases > 0 else 0
-            
-            # 确定状态
-            status = "通过" if passed_cases == total_cases else f"部分通过({passed_cases}/{total_cases})"
-            if passed_cases == 0:
-                status = "失败"
-            
-            return {
-                'status': status,
-                'score': round(score, 1),
-                'execution_time': round(execution_time * 1000, 2),  # 转换为毫秒
-                'error': '; '.join(error_messages[:3])  # 只显示前3个错误
-            }
-            
-        except Exception as e:
-            return {
-                'status': '评测错误',
-                'score': 0,
-                'execution_time': 0,
-                'error': str(e)
-            }
+            for _ in range(UI_MAX_UPDATES_PER_FRAME):
+                func, args = self.ui_queue.get_nowait()
+                processed += 1
+                if func == self.update_result_display:
+                    new_rows.extend(args)
+                    continue
+                if new_rows:
+                    # 保持与其他界面操作的先后顺序
+                    self.update_result_display(*new_rows)
+                    new_rows = []
+                func(*args)
+        except queue.Empty:
+            pass
+        finally:
+            if new_rows:
+                self.update_result_display(*new_rows)
+            if processed:
+                observe_stage('ui', time.perf_counter() - start_time)
+            self.root.after(UI_REFRESH_MS, self.process_ui_queue)
+            
+    def evaluate_code(self, code, language, question_id, test_case_index=None):
+        """评测单个代码"""
+        return self.engine.evaluate_code(code, language, question_id, test_case_index)
             
     def execute_code(self, code, language, input_data):
-        """执行代码"""
-        try:
-            # 创建临时文件
-            with tempfile.NamedTemporaryFile(mode='w', suffix=self.get_file_extension(language), delete=False) as f:
-                f.write(code)
-                temp_file = f.name
+        """执行代码（构建并运行单个测试用例）"""
+        return self.engine.execute_code(code, language, input_data)
             
-            try:
-                # 根据语言选择执行命令
-                if language.lower() == 'python':
-                    cmd = ['python3', temp_file]
-                elif language.lower() == 'java':
-                    # Java需要编译
-                    compile_result = subprocess.run(['javac', temp_file], 
-                                                  capture_output=True, text=True, timeout=10)
-                    if compile_result.returncode != 0:
-                        return {
-                            'success': False,
-                            'error': f'编译错误: {compile_result.stderr}'
-                        }
-                    
-                    class_name = os.path.splitext(os.path.basename(temp_file))[0]
-                    cmd = ['java', '-cp', os.path.dirname(temp_file), class_name]
-                elif language.lower() in ['c', 'cpp', 'c++']:
-                    # C/C++需要编译
-                    exe_file = temp_file + '.exe' if os.name == 'nt' else temp_file + '.out'
-                    compiler = 'gcc' if language.lower() == 'c' else 'g++'
-                    
-                    compile_result = subprocess.run([compiler, temp_file, '-o', exe_file], 
-                                                  capture_output=True, text=True, timeout=10)
-                    if compile_result.returncode != 0:
-                        return {
-                            'success': False,
-                            'error': f'编译错误: {compile_result.stderr}'
-                        }
-                    
-                    cmd = [exe_file]
-                else:
-                    return {
-                        'success': False,
-                        'error': f'不支持的语言: {language}'
-                    }
-                
-                # 执行代码
-                result = subprocess.run(cmd, input=input_data, capture_output=True, 
-                                      text=True, timeout=5)
-                
-                if result.returncode == 0:
-                    return {
-                        'success': True,
-                        'output': result.stdout
-                    }
-                else:
-                    return {
-                        'success': False,
-                        'error': result.stderr or '程序执行失败'
-                    }
-                    
-            finally:
-                # 清理临时文件
-                try:
-                    os.unlink(temp_file)
-                    if language.lower() == 'java':
-                        class_file = temp_file.replace('.java', '.class')
-                        if os.path.exists(class_file):
-                            os.unlink(class_file)
-                    elif language.lower() in ['c', 'cpp', 'c++']:
-                        exe_file = temp_file + '.exe' if os.name == 'nt' else temp_file + '.out'
-                        if os.path.exists(exe_file):
-                            os.unlink(exe_file)
-                except:
-                    pass
-                    
-        except subprocess.TimeoutExpired:
-            return {
-                'success': False,
-                'error': '代码执行超时'
-            }
-        except Exception as e:
-            return {
-                'success': False,
-                'error': str(e)
-            }
-            
-    def get_file_extension(self, language):
-        """获取文件扩展名"""
-        extensions = {
-            'python': '.py',
-            'java': '.java',
-            'c': '.c',
-            'cpp': '.cpp',
-            'c++': '.cpp',
-            'javascript': '.js',
-            'js': '.js'
-        }
-        return extensions.get(language.lower(), '.txt')
-        
-    def update_result_display(self):
-        """更新结果显示"""
-        # 清空现有结果
-        for item in self.result_tree.get_children():
-            self.result_tree.delete(item)
-        
-        # 添加新结果
-        for result in self.student_results:
-            print(result)
-            # 直接使用结果中的题目标题，避免复杂的查找逻辑
-            self.result_tree.insert('', 'end', values=(
-                result['student'],
-                result['question'],
-                result['language'],
-                result['status'],
-                f"{result['score']}%",
-                f"{result['execution_time']}ms",
-                result['error']
-            ))
+    def update_result_display(self, *rows):
+        """追加新的测评结果，只向表格插入符合筛选条件的新行"""
+        added = self.student_results.extend(rows)
+        
+        titles = self.student_results.questions(added.start) - self.question_titles
+        if titles:
+            self.question_titles |= titles
+            self.question_filter_combo['values'] = [ALL_QUESTIONS, *sorted(self.question_titles)]
+        
+        if self.view_rebuilding:
+            # 正在分批重建表格，新结果等重建完成后再插入
+            self.deferred_results.extend(added)
+            return
+        self.insert_result_rows(added)
+        
+    def result_values(self, result):
+        """表格中一行的显示内容"""
+        # 直接使用结果中的题目标题，避免复杂的查找逻辑
+        return (
+            result.student,
+            result.question,
+            result.language,
+            result.status,
+            f"{result.score}%",
+            f"{result.execution_time}ms",
+            result.error
+        )
+        
+    def result_matcher(self):
+        """按当前筛选条件判断结果的函数（学生姓名包含、题目相同、状态前缀相同）"""
+        question = self.filter_question.get()
+        status = self.filter_status.get()
+        return self.student_results.matcher(
+            self.filter_student.get(),
+            question if question and question != ALL_QUESTIONS else None,
+            status if status != STATUS_FILTERS[0] else None,
+        )
+        
+    def sort_key(self, index):
+        """排序键：排序字段的值加上到达顺序，未排序时按到达顺序"""
+        if self.sort_column is None:
+            return (index,)
+        value = self.student_results.value(index, SORT_FIELDS[self.sort_column])
+        if not isinstance(value, (int, float)):
+            value = str(value if value is not None else '')
+        return (value, index)
+        
+    def insert_result_rows(self, indexes):
+        """按当前排序把符合筛选条件的结果插入表格"""
+        for index in self.student_results.select(self.result_matcher(), indexes):
+            result = self.student_results[index]
+            key = self.sort_key(index)
+            position = bisect.bisect(self.view_keys, key)
+            self.view_keys.insert(position, key)
+            if self.sort_descending:
+                position = len(self.view_keys) - 1 - position
+            self.result_tree.insert('', position, iid=str(index), values=self.result_values(result))
+        self.update_view_count()
+        
+    def update_view_count(self):
+        self.view_count_var.set(f"显示 {len(self.view_keys)} / {len(self.student_results)} 条")
+        
+    def on_filter_changed(self, *args):
+        """筛选条件变化后稍等片刻再刷新，避免输入时每个字符都重建表格"""
+        if self.filter_after_id is not None:
+            self.root.after_cancel(self.filter_after_id)
+        self.filter_after_id = self.root.after(FILTER_DELAY_MS, self.refresh_result_view)
+        
+    def sort_by(self, column):
+        """点击列标题：按该列升序，再次点击切换为降序"""
+        if self.sort_column == column:
+            self.sort_descending = not self.sort_descending
+        else:
+            self.sort_column = column
+            self.sort_descending = False
+        for col in SORT_FIELDS:
+            arrow = (' ▼' if self.sort_descending else ' ▲') if col == self.sort_column else ''
+            self.result_tree.heading(col, text=col + arrow)
+        self.refresh_result_view()
+        
+    def refresh_result_view(self):
+        """按当前筛选和排序重建表格，分批插入以保持界面响应"""
+        self.filter_after_id = None
+        self.view_generation += 1
+        generation = self.view_generation
+        
+        self.result_tree.delete(*self.result_tree.get_children())
+        indexes = self.student_results.select(self.result_matcher())
+        self.view_keys = sorted(self.sort_key(i) for i in indexes)
+        ordered = [key[-1] for key in self.view_keys]
+        if self.sort_descending:
+            ordered.reverse()
+        self.view_rebuilding = True
+        self.deferred_results = []
+        self.update_view_count()
+        
+        def insert_chunk(start):
+            if generation != self.view_generation:
+                return
+            for index in ordered[start:start + VIEW_REBUILD_CHUNK]:
+                self.result_tree.insert('', 'end', iid=str(index), values=self.result_values(self.student_results[index]))
+            if start + VIEW_REBUILD_CHUNK < len(ordered):
+                self.root.after(1, insert_chunk, start + VIEW_REBUILD_CHUNK)
+                return
+            self.view_rebuilding = False
+            deferred, self.deferred_results = self.deferred_results, []
+            self.insert_result_rows(deferred)
+        
+        insert_chunk(0)
             
     def export_results(self):
-        """导出结果"""
+        """导出每个学生的编程总分（学生,得分 两列，可在成绩页面导入）"""
         if not self.student_results:
             messagebox.showwarning("警告", "没有可导出的结果")
             return
@@ -651,33 +654,138 @@ class LocalJudgeApp:
         
         if filename:
             try:
-                import csv
-                with open(filename, 'w', newline='', encoding='utf-8') as f:
-                    writer = csv.writer(f)
-                    writer.writerow(['学生', '得分'])
-                    
-                    for result in self.student_results:
-                        writer.writerow([
-                            result['student'],
-                            f"{result['score']}"
-                        ])
-                        
-                messagebox.showinfo("导出成功", f"结果已导出到: {filename}")
+                exports = self.exam_exports(filename)
+                if len(exports) == 1:
+                    aggregator = self.student_results.aggregate(ScoreAggregator())
+                    aggregator.write_csv(filename)
+                    messagebox.showinfo("导出成功", f"{len(aggregator)} 名学生的成绩已导出到: {filename}")
+                    return
+                for exam_id, path, _ in exports:
+                    self.student_results.aggregate(ScoreAggregator(), exam_id).write_csv(path)
+                messagebox.showinfo("导出成功", f"{len(exports)} 场考试的成绩已分别导出到:\n"
+                                    + "\n".join(os.path.basename(path) for _, path, _ in exports))
+            except Exception as e:
+                messagebox.showerror("导出失败", f"导出时出错: {str(e)}")
+                
+    def export_details(self):
+        """导出完整的测评结果（CSV、JSON Lines 或 XLSX）"""
+        if not self.student_results:
+            messagebox.showwarning("警告", "没有可导出的结果")
+            return
+            
+        filename = filedialog.asksaveasfilename(
+            defaultextension=".csv",
+            filetypes=[("CSV files", "*.csv"), ("JSON Lines", "*.jsonl"), ("Excel", "*.xlsx"), ("All files", "*.*")]
+        )
+        
+        if filename:
+            try:
+                count = 0
+                exports = self.exam_exports(filename)
+                for _, path, indexes in exports:
+                    with ResultExporter(path) as exporter:
+                        for result in self.student_results.rows(indexes):
+                            exporter.write(result)
+                    count += exporter.count
+                if len(exports) == 1:
+                    messagebox.showinfo("导出成功", f"{count} 条测评结果已导出到: {filename}")
+                else:
+                    messagebox.showinfo("导出成功", f"{count} 条测评结果按考试分别导出到:\n"
+                                        + "\n".join(os.path.basename(path) for _, path, _ in exports))
             except Exception as e:
                 messagebox.showerror("导出失败", f"导出时出错: {str(e)}")
                 
+    def exam_exports(self, filename):
+        """导出文件：只有一场考试的结果时为 [(考试ID, filename, None)]，
+        有多场考试时每场考试一个文件（文件名后加上考试标题和ID），为 [(考试ID, 文件名, 结果下标)]"""
+        exams = self.student_results.exams()
+        if len(exams) <= 1:
+            return [(exam_id, filename, None) for exam_id in exams] or [(None, filename, None)]
+        return [(exam_id, exam_export_path(filename, exam_id, self.exam_titles.get(exam_id)), indexes)
+                for exam_id, indexes in exams.items()]
+                
+    def upload_scores(self):
+        """把当前考试每个学生的编程总分上传到服务器（只上传有变化的成绩）"""
+        if not self.current_exam:
+            messagebox.showwarning("警告", "请先选择一个考试")
+            return
+        exam_id = self.current_exam['_id']
+        aggregator = self.student_results.aggregate(ScoreAggregator(), exam_id)
+        if not len(aggregator):
+            messagebox.showwarning("警告", "当前考试没有测评结果")
+            return
+        if not messagebox.askyesno("确认", f"确定要上传 {len(aggregator)} 名学生的编程成绩吗？\n（与上次上传相同的成绩会跳过）"):
+            return
+            
+        self.sync_engine_config()
+        try:
+            self.status_var.set("正在上传成绩...")
+            self.root.update_idletasks()
+            summary = self.engine.upload_scores(exam_id, aggregator.scores())
+            message = (f"上传 {summary['uploaded']} 名学生，{summary['skipped']} 名未变化跳过，"
+                       f"{summary['failed']} 名失败")
+            if summary['errors']:
+                message += "\n\n" + "\n".join(summary['errors'][:10])
+            messagebox.showinfo("上传完成", message)
+            self.status_var.set(f"成绩上传完成：{message.splitlines()[0]}")
+        except JudgeError as e:
+            messagebox.showerror("上传失败", str(e))
+            self.status_var.set("上传成绩失败")
+                
+    def set_similarity_clusters(self, clusters):
+        self.similarity_clusters = clusters
+        if clusters:
+            self.show_similarity()
+        else:
+            self.status_var.set(self.status_var.get() + "；查重未发现相似提交")
+            
+    def show_similarity(self):
+        """在新窗口中列出最近一次测评的相似提交组"""
+        if not self.similarity_clusters:
+            messagebox.showinfo("相似提交", "没有相似提交（测评前勾选“查重”）")
+            return
+        window = tk.Toplevel(self.root)
+        window.title(f"相似提交（{len(self.similarity_clusters)} 组）")
+        window.geometry("900x400")
+        window.columnconfigure(0, weight=1)
+        window.rowconfigure(0, weight=1)
+        tree = ttk.Treeview(window, columns=SIMILARITY_COLUMNS, show='headings')
+        for col, width in zip(SIMILARITY_COLUMNS, (150, 90, 50, 600)):
+            tree.heading(col, text=col)
+            tree.column(col, width=width)
+        for cluster in self.similarity_clusters:
+            tree.insert('', 'end', values=(cluster['question'], format_similarity(cluster), len(cluster['students']),
+                                           '、'.join(member['student'] for member in cluster['students'])))
+        scrollbar = ttk.Scrollbar(window, orient=tk.VERTICAL, command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        ttk.Button(window, text="复制到剪贴板", command=lambda: self.copy_similarity(window)).grid(
+            row=1, column=0, pady=5)
+            
+    def copy_similarity(self, window):
+        window.clipboard_clear()
+        window.clipboard_append('\n'.join(format_cluster(cluster) for cluster in self.similarity_clusters))
+        
     def clear_results(self):
         """清空结果"""
         if messagebox.askyesno("确认", "确定要清空所有测评结果吗？"):
             self.student_results.clear()
-            self.update_result_display()
+            self.exam_titles.clear()
+            self.similarity_clusters = []
+            self.question_titles.clear()
+            self.question_filter_combo['values'] = [ALL_QUESTIONS]
+            self.refresh_result_view()
             self.progress_var.set(0)
             self.status_var.set("结果已清空")
 
 def main():
     root = tk.Tk()
     app = LocalJudgeApp(root)
-    root.mainloop()
+    try:
+        root.mainloop()
+    finally:
+        app.engine.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
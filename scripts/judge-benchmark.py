@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测评性能基准测试
+
+生成合成考试（见 mock_exam_server.py），启动本地模拟考试服务器，用 local_judge
+完成 登录 → 同步考试 → 加载考试 → 边下载边测评 的完整流程，报告：
+
+  - 每秒测评的提交数和测试用例数；
+  - 各阶段耗时的百分位数：加载考试、编译（构建）、运行单个测试用例、
+    单份提交从提交到出结果；
+  - 测评进程和学生程序子进程的峰值内存。
+
+默认使用临时的编译缓存且不使用结果存储，每次都是冷启动（预编译头属于工具链状态，
+保存在默认目录中，首次运行时生成）；--warm 先用同一份
+缓存完整测评一遍（不计入结果）。--output 把报告以一行 JSON 追加到文件中，
+便于长期对比、发现性能回退。
+
+用法：
+    python3 scripts/judge-benchmark.py --students 500 --languages python:2,cpp:1 --workers 4
+    python3 scripts/judge-benchmark.py --output benchmark-history.jsonl
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import resource
+import threading
+import subprocess
+from collections import Counter, defaultdict
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(SCRIPT_DIR))
+sys.path.insert(0, SCRIPT_DIR)
+
+import local_judge.scheduler as scheduler  # noqa: E402
+from local_judge import ArtifactCache, JudgeEngine  # noqa: E402
+from local_judge.policy import DEFAULT_SCORING_MODE, SCORING_MODES, ScoringPolicy  # noqa: E402
+from local_judge.calibrate import TimeLimitCalibrator  # noqa: E402
+from local_judge.metrics import STAGE_SECONDS  # noqa: E402
+from mock_exam_server import MockExamServer, add_dataset_arguments, dataset_from_args  # noqa: E402
+
+PERCENTILES = (50, 90, 99)
+
+
+class StageTimer:
+    """记录各阶段的耗时（毫秒）"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.samples[stage].append(seconds * 1000)
+
+    def wrap(self, stage, func):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(stage, time.perf_counter() - start)
+        return timed
+
+    def clear(self):
+        with self._lock:
+            self.samples.clear()
+
+    def summary(self):
+        report = {}
+        for stage, values in self.samples.items():
+            values = sorted(values)
+            stats = {'count': len(values), 'mean': round(sum(values) / len(values), 2), 'max': round(values[-1], 2)}
+            for p in PERCENTILES:
+                # 最近秩法
+                rank = max(0, min(len(values) - 1, int(len(values) * p / 100 + 0.5) - 1))
+                stats[f'p{p}'] = round(values[rank], 2)
+            report[stage] = stats
+        return report
+
+
+def instrument(timer):
+    """在调度器的编译、运行和提交入口记录耗时"""
+    scheduler.build_program = timer.wrap('build', scheduler.build_program)
+    scheduler.run_test_case = timer.wrap('run', scheduler.run_test_case)
+    submit = scheduler.JudgeScheduler.submit
+
+    def timed_submit(self, code, language, entry, tag=None):
+        start = time.perf_counter()
+        future = submit(self, code, language, entry, tag)
+        future.add_done_callback(lambda _: timer.add('submission', time.perf_counter() - start))
+        return future
+
+    scheduler.JudgeScheduler.submit = timed_submit
+
+
+def span_summary(before):
+    """本轮测评在 local_judge.metrics 中新增的各阶段次数和总耗时（秒）"""
+    spans = {}
+    for item in STAGE_SECONDS.snapshot():
+        previous = before.get(item['stage'], {'count': 0, 'sum': 0})
+        count = item['count'] - previous['count']
+        if count:
+            spans[item['stage']] = {'count': count, 'sum': round(item['sum'] - previous['sum'], 6)}
+    return spans
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=SCRIPT_DIR, capture_output=True,
+                              text=True, timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ''
+
+
+def judge_all(engine, server, args, timer):
+    """测评模拟服务器上的全部考试，返回 (提交数, 测试用例数, 状态统计, 判定统计, 用时)"""
+    statuses = Counter()
+    verdicts = Counter()
+    counts = [0, 0]
+
+    def on_result(row):
+        counts[0] += 1
+        counts[1] += len(row.get('tests', []))
+        statuses[row['status'].split('(')[0]] += 1
+        verdicts.update(test['verdict'] for test in row.get('tests', []))
+
+    start = time.perf_counter()
+    engine.login('benchmark@example.com', 'benchmark')
+    for exam in engine.sync_exams():
+        load_start = time.perf_counter()
+        engine.load_exam(exam, stream_results=True)
+        timer.add('load', time.perf_counter() - load_start)
+        engine.judge_exam(exam, args.workers, args.compile_workers, on_result)
+    return counts[0], counts[1], statuses, verdicts, time.perf_counter() - start
+
+
+def print_report(report):
+    print(f"提交数: {report['submissions']}，测试用例运行数: {report['test_runs']}，用时 {report['elapsed']:.2f} 秒")
+    print(f"吞吐量: {report['submissions_per_sec']:.1f} 提交/秒，{report['test_runs_per_sec']:.1f} 测试用例/秒")
+    print(f"峰值内存: 测评进程 {report['peak_rss_kb'] / 1024:.1f} MB，"
+          f"学生程序 {report['children_peak_rss_kb'] / 1024:.1f} MB")
+    print(f"状态: {dict(report['statuses'])}")
+    print(f"判定: {dict(report['verdicts'])}")
+    print(f"{'阶段':<12}{'次数':>8}{'平均':>10}" + ''.join(f"{'p' + str(p):>10}" for p in PERCENTILES) + f"{'最大':>10}")
+    for stage in ('load', 'build', 'run', 'submission'):
+        stats = report['stages'].get(stage)
+        if stats:
+            print(f"{stage:<12}{stats['count']:>8}{stats['mean']:>10.2f}"
+                  + ''.join(f"{stats['p' + str(p)]:>10.2f}" for p in PERCENTILES) + f"{stats['max']:>10.2f}")
+    print('（耗时单位：毫秒）')
+    spans = report['spans']
+    if spans:
+        print('各阶段合计: ' + '，'.join(f"{stage} {stats['sum'] * 1000:.0f}ms/{stats['count']}次"
+                                      for stage, stats in sorted(spans.items())))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='测评性能基准测试')
+    add_dataset_arguments(parser)
+    parser.add_argument('-j', '--workers', type=int, default=None, help='运行进程数，默认为CPU核心数')
+    parser.add_argument('--compile-workers', type=int, default=None, help='编译并发数')
+    parser.add_argument('--no-python-zygote', action='store_true', help='不使用Python预热解释器')
+    parser.add_argument('--no-java-runner', action='store_true', help='不使用常驻JVM')
+    parser.add_argument('--no-pch', action='store_true', help='C++提交不使用预编译头')
+    parser.add_argument('--scoring', choices=SCORING_MODES, default=DEFAULT_SCORING_MODE, help='评分策略')
+    parser.add_argument('--calibrate', action='store_true', help='按参考解法（正确程序的模板）校准时间限制')
+    parser.add_argument('--warm', action='store_true', help='先完整测评一遍预热编译缓存，只报告第二遍')
+    parser.add_argument('--output', help='把报告以一行JSON追加到该文件')
+    args = parser.parse_args()
+
+    dataset = dataset_from_args(args)
+    server = MockExamServer(dataset).start()
+    timer = StageTimer()
+    instrument(timer)
+
+    with tempfile.TemporaryDirectory(prefix='judge-benchmark-') as workdir:
+        engine = JudgeEngine(server.url, artifact_cache=ArtifactCache(os.path.join(workdir, 'artifacts')),
+                             python_zygote=not args.no_python_zygote, java_runner=not args.no_java_runner,
+                             result_store=False, precompiled_headers=not args.no_pch,
+                             scoring=ScoringPolicy(args.scoring),
+                             calibrator=TimeLimitCalibrator() if args.calibrate else None)
+        try:
+            if args.warm:
+                judge_all(engine, server, args, timer)
+                timer.clear()
+            spans_before = {item['stage']: item for item in STAGE_SECONDS.snapshot()}
+            submissions, test_runs, statuses, verdicts, elapsed = judge_all(engine, server, args, timer)
+        finally:
+            engine.close()
+            server.stop()
+
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'revision': git_revision(),
+        'config': {k: v for k, v in vars(args).items() if k != 'output'},
+        'cpu_count': os.cpu_count(),
+        'submissions': submissions,
+        'test_runs': test_runs,
+        'elapsed': round(elapsed, 3),
+        'submissions_per_sec': round(submissions / elapsed, 2) if elapsed else 0,
+        'test_runs_per_sec': round(test_runs / elapsed, 2) if elapsed else 0,
+        'stages': timer.summary(),
+        # local_judge.metrics 记录的各阶段耗时（fetch、parse、compile、spawn、run、compare、export）
+        'spans': span_summary(spans_before),
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'children_peak_rss_kb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+        'statuses': statuses,
+        'verdicts': verdicts,
+    }
+    print_report(report)
+    if args.output:
+        with open(args.output, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(report, ensure_ascii=False) + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地模拟考试服务器与合成考试生成器（用于测评性能基准测试）
+
+实现本地测评工具用到的接口：
+    POST /api/auth/login
+    GET  /api/auth/me
+    GET  /api/teacher/exams
+    GET  /api/teacher/exams/{id}
+    GET  /api/teacher/exams/{id}/results
+    GET  /api/teacher/questions
+    POST /api/teacher/exams/{id}/import-programming-scores（JSON 批量模式）
+
+生成的题目为"读入 n 个整数求和"，每个学生的代码末尾带有不同的注释，
+不会被去重合并（可用 --duplicates 指定重复提交的比例）。提交的结果类型
+（正确、答案错误、超时、编译错误）和语言按权重随机分配，同一个种子生成
+相同的考试。每种语言生成一场考试（考试的语言是整场考试统一的）。
+Python 没有编译步骤，"编译错误"的提交在运行时报告为运行错误。
+
+单独运行：
+    python3 scripts/mock_exam_server.py --port 8765 --students 200 --languages python:3,cpp:1
+"""
+
+import json
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+TOKEN = 'benchmark-token'
+
+# 各语言、各结果类型的代码模板
+PROGRAMS = {
+    'python': {
+        'ac': 'import sys\ndata = sys.stdin.read().split()\nn = int(data[0])\nprint(sum(map(int, data[1:n + 1])))\n',
+        'wa': 'import sys\ndata = sys.stdin.read().split()\nn = int(data[0])\nprint(sum(map(int, data[1:n + 1])) + 1)\n',
+        'tle': 'x = 0\nwhile True:\n    x += 1\n',
+        'ce': 'import sys\nprint(sum(map(int, sys.stdin.read().split()[1:]))\n',
+    },
+    'cpp': {
+        # 大多数C++提交以 bits/stdc++.h 开头（可使用预编译头）
+        'ac': '#include <bits/stdc++.h>\nusing namespace std;\nint main() {\n    long long n, x, s = 0;\n    cin >> n;\n'
+              '    for (long long i = 0; i < n; i++) { cin >> x; s += x; }\n    cout << s << endl;\n'
+              '    return 0;\n}\n',
+        'wa': '#include <bits/stdc++.h>\nusing namespace std;\nint main() {\n    long long n, x, s = 0;\n    cin >> n;\n'
+              '    for (long long i = 0; i < n; i++) { cin >> x; s += x; }\n    cout << s + 1 << endl;\n'
+              '    return 0;\n}\n',
+        'tle': 'int main() {\n    volatile unsigned long long x = 0;\n    while (true) x++;\n}\n',
+        'ce': '#include <cstdio>\nint main() {\n    printf("%d\\n", undefined_value)\n}\n',
+    },
+    'c': {
+        'ac': '#include <stdio.h>\nint main(void) {\n    long long n, x, s = 0;\n    scanf("%lld", &n);\n'
+              '    for (long long i = 0; i < n; i++) { scanf("%lld", &x); s += x; }\n    printf("%lld\\n", s);\n'
+              '    return 0;\n}\n',
+        'wa': '#include <stdio.h>\nint main(void) {\n    long long n, x, s = 0;\n    scanf("%lld", &n);\n'
+              '    for (long long i = 0; i < n; i++) { scanf("%lld", &x); s += x; }\n    printf("%lld\\n", s - 1);\n'
+              '    return 0;\n}\n',
+        'tle': 'int main(void) {\n    volatile unsigned long long x = 0;\n    for (;;) x++;\n}\n',
+        'ce': '#include <stdio.h>\nint main(void) {\n    printf("%d\\n", undefined_value)\n}\n',
+    },
+    'java': {
+        'ac': 'import java.util.*;\npublic class Main {\n    public static void main(String[] args) {\n'
+              '        Scanner in = new Scanner(System.in);\n        int n = in.nextInt();\n        long s = 0;\n'
+              '        for (int i = 0; i < n; i++) s += in.nextLong();\n        System.out.println(s);\n    }\n}\n',
+        'wa': 'import java.util.*;\npublic class Main {\n    public static void main(String[] args) {\n'
+              '        Scanner in = new Scanner(System.in);\n        int n = in.nextInt();\n        long s = 0;\n'
+              '        for (int i = 0; i < n; i++) s += in.nextLong();\n        System.out.println(s + 1);\n    }\n}\n',
+        'tle': 'public class Main {\n    public static void main(String[] args) {\n        long x = 0;\n'
+               '        while (true) x++;\n    }\n}\n',
+        'ce': 'public class Main {\n    public static void main(String[] args) {\n'
+              '        System.out.println(undefinedValue)\n    }\n}\n',
+    },
+}
+
+COMMENT_PREFIX = {'python': '#', 'cpp': '//', 'c': '//', 'java': '//'}
+
+OUTCOMES = ('ac', 'wa', 'tle', 'ce')
+
+
+def parse_weights(text, allowed):
+    """解析 "python:3,cpp:1" 形式的权重，返回 [(名称, 权重)]"""
+    weights = []
+    for part in text.split(','):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition(':')
+        name = name.strip().lower()
+        if name not in allowed:
+            raise ValueError(f'不支持的取值: {name}（可选 {", ".join(allowed)}）')
+        weights.append((name, float(weight or 1)))
+    if not weights or sum(weight for _, weight in weights) <= 0:
+        raise ValueError(f'权重无效: {text}')
+    return weights
+
+
+def _split_by_weight(total, weights):
+    """按权重把 total 分配给各项（余数给权重最大的项）"""
+    weight_sum = sum(weight for _, weight in weights)
+    counts = {name: int(total * weight / weight_sum) for name, weight in weights}
+    counts[max(weights, key=lambda item: item[1])[0]] += total - sum(counts.values())
+    return counts
+
+
+def generate_test_cases(rng, count, max_numbers):
+    test_cases = []
+    for _ in range(count):
+        numbers = [rng.randint(-10 ** 9, 10 ** 9) for _ in range(rng.randint(1, max_numbers))]
+        test_cases.append({
+            'input': f'{len(numbers)}\n{" ".join(map(str, numbers))}\n',
+            'expectedOutput': f'{sum(numbers)}\n'
+        })
+    return test_cases
+
+
+def generate_dataset(students=100, questions=2, test_cases=5, languages='python', outcomes='ac:70,wa:20,tle:2,ce:8',
+                     duplicates=0.0, max_numbers=1000, time_limit=1, seed=1):
+    """生成合成考试数据：{'exams': [...], 'details': {考试ID: 考试}, 'results': {考试ID: [答卷]}, 'questions': [...]}"""
+    rng = random.Random(seed)
+    language_counts = _split_by_weight(students, parse_weights(languages, PROGRAMS))
+    outcome_weights = parse_weights(outcomes, OUTCOMES)
+    outcome_names = [name for name, _ in outcome_weights]
+    outcome_values = [weight for _, weight in outcome_weights]
+
+    dataset = {'exams': [], 'details': {}, 'results': {}, 'questions': []}
+    student_index = 0
+    for language, count in language_counts.items():
+        if count <= 0:
+            continue
+        exam_id = f'{len(dataset["exams"]) + 1:024x}'
+        exam_questions = []
+        for q in range(questions):
+            question = {
+                '_id': f'{exam_id[-16:]}{q + 1:08x}',
+                'type': 'PROGRAMMING',
+                'title': f'求和 {q + 1}',
+                'points': 10,
+                # 参考答案为正确程序，可用于校准时间限制
+                'correctAnswer': PROGRAMS[language]['ac'],
+                'timeLimit': time_limit,
+                'memoryLimit': 256,
+                'updatedAt': '2024-01-01T00:00:00.000Z',
+                'testCases': json.dumps(generate_test_cases(rng, test_cases, max_numbers), ensure_ascii=False)
+            }
+            dataset['questions'].append(question)
+            exam_questions.append(question)
+
+        title = f'基准测试考试 ({language})'
+        dataset['exams'].append({'_id': exam_id, 'title': title})
+        dataset['details'][exam_id] = {
+            '_id': exam_id,
+            'title': title,
+            'language': language,
+            'questions': [{k: v for k, v in q.items() if k != 'testCases'} for q in exam_questions]
+        }
+
+        exam_results = []
+        previous = {}
+        for _ in range(count):
+            student_index += 1
+            answers = {}
+            for question in exam_questions:
+                if previous.get(question['_id']) and rng.random() < duplicates:
+                    # 与上一个学生的代码相同，测试去重
+                    code = previous[question['_id']]
+                else:
+                    outcome = rng.choices(outcome_names, outcome_values)[0]
+                    code = f'{PROGRAMS[language][outcome]}{COMMENT_PREFIX[language]} student {student_index}\n'
+                previous[question['_id']] = code
+                answers[question['_id']] = {'code': code, 'language': language}
+            exam_results.append({
+                '_id': f'{student_index:024x}',
+                'student': {'id': f'{student_index:024x}', 'name': f'学生{student_index:05d}',
+                            'email': f's{student_index}@example.com'},
+                'answers': answers,
+                'score': 0,
+                'isSubmitted': True
+            })
+        dataset['results'][exam_id] = exam_results
+    return dataset
+
+
+class MockExamServer(ThreadingHTTPServer):
+    """模拟考试服务器，在后台线程中运行"""
+
+    daemon_threads = True
+
+    def __init__(self, dataset, port=0, host='127.0.0.1'):
+        super().__init__((host, port), _Handler)
+        self.dataset = dataset
+        self.uploads = []
+        # 预先序列化，服务器本身的耗时不计入测评时间
+        self._bodies = {
+            '/api/teacher/exams': _encode({'exams': dataset['exams']}),
+            '/api/teacher/questions': _encode({'questions': dataset['questions']}),
+        }
+        for exam_id, details in dataset['details'].items():
+            self._bodies[f'/api/teacher/exams/{exam_id}'] = _encode({'exam': details})
+            self._bodies[f'/api/teacher/exams/{exam_id}/results'] = _encode(
+                {'exam': dict(details, examResults=dataset['results'][exam_id])})
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name='mock-exam-server', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def _encode(data):
+    return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, cookie=None):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if cookie:
+            self.send_header('Set-Cookie', cookie)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _authorized(self):
+        if f'token={TOKEN}' in self.headers.get('Cookie', ''):
+            return True
+        self._send(401, _encode({'error': '未登录'}))
+        return False
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        path = self.path.split('?')[0].rstrip('/')
+        if path == '/api/auth/login':
+            self._send(200, _encode({'user': {'role': 'TEACHER'}}), cookie=f'token={TOKEN}; Path=/; HttpOnly')
+        elif path.endswith('/import-programming-scores'):
+            if not self._authorized():
+                return
+            scores = json.loads(body or b'{}').get('scores', [])
+            self.server.uploads.append(scores)
+            self._send(200, _encode({'successCount': len(scores), 'errorCount': 0,
+                                     'imported': [item['studentId'] for item in scores], 'errors': []}))
+        else:
+            self._send(404, _encode({'error': 'not found'}))
+
+    def do_GET(self):
+        path = self.path.split('?')[0].rstrip('/')
+        if path == '/api/auth/me':
+            if self._authorized():
+                self._send(200, _encode({'user': {'role': 'TEACHER'}}))
+            return
+        body = self.server._bodies.get(path)
+        if body is None:
+            self._send(404, _encode({'error': 'not found'}))
+        elif self._authorized():
+            self._send(200, body)
+
+
+def add_dataset_arguments(parser):
+    """生成器参数，基准测试脚本共用"""
+    parser.add_argument('--students', type=int, default=100, help='学生总数（按语言权重分到各场考试）')
+    parser.add_argument('--questions', type=int, default=2, help='每场考试的编程题数')
+    parser.add_argument('--test-cases', type=int, default=5, help='每道题的测试用例数')
+    parser.add_argument('--max-numbers', type=int, default=1000, help='每个测试用例最多的整数个数')
+    parser.add_argument('--languages', default='python', help='语言及权重，如 python:3,cpp:1,c:1,java:1')
+    parser.add_argument('--outcomes', default='ac:70,wa:20,tle:2,ce:8',
+                        help='提交结果类型及权重（ac 正确、wa 答案错误、tle 超时、ce 编译错误）')
+    parser.add_argument('--duplicates', type=float, default=0.0, help='与上一个学生代码相同的提交比例（0~1）')
+    parser.add_argument('--time-limit', type=float, default=1, help='题目时间限制（秒）')
+    parser.add_argument('--seed', type=int, default=1, help='随机种子')
+
+
+def dataset_from_args(args):
+    return generate_dataset(args.students, args.questions, args.test_cases, args.languages, args.outcomes,
+                            args.duplicates, args.max_numbers, args.time_limit, args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地模拟考试服务器')
+    parser.add_argument('--port', type=int, default=8765, help='监听端口')
+    add_dataset_arguments(parser)
+    args = parser.parse_args()
+
+    server = MockExamServer(dataset_from_args(args), args.port)
+    print(f'模拟考试服务器: {server.url}（任意邮箱和密码均可登录）')
+    for exam in server.dataset['exams']:
+        print(f'  {exam["title"]} (ID: {exam["_id"]})')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Python 运行方式性能对比
+
+比较每个测试用例启动新 python3 进程（sandbox.run_limited）与
+预热解释器池（pyrunner.PythonRunnerPool）的每秒运行次数。
+
+用法：
+    python3 scripts/python-runner-benchmark.py [--runs 500] [--workers 4]
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from local_judge.sandbox import run_limited, VERDICT_OK  # noqa: E402
+from local_judge.pyrunner import PythonRunnerPool, zygote_supported  # noqa: E402
+
+# 典型的简单编程题：读入两个整数求和
+PROGRAM = 'a, b = map(int, input().split())\nprint(a + b)\n'
+
+
+def bench(run, runs, workers):
+    """并发执行 runs 次，返回 (每秒运行次数, 失败次数)"""
+    start_time = time.monotonic()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(lambda i: run(f'{i} {i}\n'), range(runs)))
+    elapsed = time.monotonic() - start_time
+    failures = sum(1 for result in results if result.verdict != VERDICT_OK)
+    return runs / elapsed, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Python 运行方式性能对比')
+    parser.add_argument('--runs', type=int, default=500, help='每种方式的运行次数')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='并发数')
+    args = parser.parse_args()
+
+    if not zygote_supported():
+        print('当前平台不支持预热解释器')
+        return 1
+
+    with tempfile.TemporaryDirectory() as workdir:
+        script = os.path.join(workdir, 'main.py')
+        with open(script, 'w', encoding='utf-8') as f:
+            f.write(PROGRAM)
+        cmd = ['python3', script]
+
+        cold_rate, cold_failures = bench(lambda data: run_limited(cmd, data, 1, 256), args.runs, args.workers)
+
+        pool = PythonRunnerPool(args.workers)
+        try:
+            # 先让每个 zygote 启动一次，不计入测量
+            bench(lambda data: pool.run(cmd, data, 1, 256), args.workers, args.workers)
+            warm_rate, warm_failures = bench(lambda data: pool.run(cmd, data, 1, 256), args.runs, args.workers)
+        finally:
+            pool.close()
+
+    print(f'运行次数: {args.runs}，并发数: {args.workers}')
+    print(f'新进程:     {cold_rate:8.1f} 次/秒（失败 {cold_failures}）')
+    print(f'预热解释器: {warm_rate:8.1f} 次/秒（失败 {warm_failures}）')
+    print(f'加速比:     {warm_rate / cold_rate:8.2f}x')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""JudgeScheduler 的调度行为"""
+
+import threading
+import unittest
+from unittest import mock
+
+from local_judge import scheduler
+from local_judge.policy import ScoringPolicy
+from local_judge.sandbox import VERDICT_SKIP
+from local_judge import testcases
+
+
+# 输入为 slow 时先等待再输出错误答案，其余输入立即输出正确答案
+SLOW_FAILURE = """
+import time
+if input() == 'slow':
+    time.sleep(0.5)
+    print('wrong')
+else:
+    print(1)
+"""
+
+
+def make_entry(inputs):
+    test_cases = tuple({'input': f'{value}\n', 'expectedOutput': '1'} for value in inputs)
+    return testcases.TestCaseEntry('q1', '题目', test_cases, 10, 2, 256, '')
+
+
+class CountingRuns:
+    """统计实际运行的测试用例数"""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+        self._run = scheduler.run_test_case
+
+    def __call__(self, *args, **kwargs):
+        with self._lock:
+            self.count += 1
+        return self._run(*args, **kwargs)
+
+
+class FailFastDispatchTest(unittest.TestCase):
+
+    def judge(self, workers, code, entry):
+        runs = CountingRuns()
+        judge = scheduler.JudgeScheduler(workers=workers, compile_workers=1,
+                                         policy=ScoringPolicy('fail-fast', reorder=False))
+        try:
+            with mock.patch.object(scheduler, 'run_test_case', runs):
+                result = judge.submit(code, 'python', entry).result(timeout=60)
+        finally:
+            judge.shutdown()
+        return result, runs.count
+
+    def test_parallel_fail_fast_stops_after_first_wave(self):
+        # 第一个测试用例较慢且失败，其余测试用例很快通过：不能趁它运行时把其余的都跑完
+        entry = make_entry(['slow'] + ['fast'] * 15)
+        result, runs = self.judge(4, SLOW_FAILURE, entry)
+        self.assertEqual(result['score'], 0)
+        self.assertEqual(runs, 4)
+        skipped = [test for test in result['tests'] if test['verdict'] == VERDICT_SKIP]
+        self.assertEqual(len(skipped), 12)
+
+    def test_parallel_fail_fast_runs_everything_when_passing(self):
+        entry = make_entry(['fast'] * 10)
+        result, runs = self.judge(4, SLOW_FAILURE, entry)
+        self.assertEqual(result['score'], 10)
+        self.assertEqual(runs, 10)
+
+    def test_partial_policy_runs_every_test_case(self):
+        entry = make_entry(['slow'] + ['fast'] * 7)
+        runs = CountingRuns()
+        judge = scheduler.JudgeScheduler(workers=4, compile_workers=1)
+        try:
+            with mock.patch.object(scheduler, 'run_test_case', runs):
+                result = judge.submit(SLOW_FAILURE, 'python', entry).result(timeout=60)
+        finally:
+            judge.shutdown()
+        self.assertEqual(runs.count, 8)
+        self.assertAlmostEqual(result['score'], 8.8, places=1)
+
+
+
+# 两份程序只有原始字符串字面量中的缩进不同
+RAW_STRING = """#include <cstdio>
+int main() {
+    std::puts(R"(x
+%sy)");
+}
+"""
+
+
+class DeduplicationTest(unittest.TestCase):
+
+    def test_string_literal_differences_are_judged_separately(self):
+        entry = testcases.TestCaseEntry('q1', '题目', ({'input': '', 'expectedOutput': 'x\n  y'},), 10, 2, 256, '')
+        indented, flush = RAW_STRING % '  ', RAW_STRING % ''
+        self.assertNotEqual(scheduler.submission_fingerprint('q1', 'cpp', indented),
+                            scheduler.submission_fingerprint('q1', 'cpp', flush))
+        judge = scheduler.JudgeScheduler(workers=2, compile_workers=2)
+        try:
+            first = judge.submit_deduplicated('q1', indented, 'cpp', entry)
+            second = judge.submit_deduplicated('q1', flush, 'cpp', entry)
+            self.assertIsNot(first, second)
+            self.assertEqual(first.result(timeout=120)['score'], 10)
+            self.assertEqual(second.result(timeout=120)['score'], 0)
+        finally:
+            judge.shutdown()
+
+    def test_line_endings_and_trailing_whitespace_are_merged(self):
+        code = 'print(1)\nprint(2)\n'
+        self.assertEqual(scheduler.submission_fingerprint('q1', 'python', code),
+                         scheduler.submission_fingerprint('q1', 'python', '\r\nprint(1)  \r\nprint(2)\r\n\r\n'))
+
+
+if __name__ == '__main__':
+    unittest.main()